@@ -0,0 +1,34 @@
+"""
+Запуск: pytest benchmarks --posts 100000 (пакеты pytest и pytest-benchmark - группа dev в pyproject.toml).
+
+По умолчанию используются настройки config.test_settings (SQLite), для PostgreSQL:
+DJANGO_SETTINGS_MODULE=config.settings pytest benchmarks
+"""
+import os
+
+import django
+import pytest
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.test_settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment, teardown_test_environment  # noqa: E402
+
+from blog.benchmarks import generate_dataset  # noqa: E402
+
+
+def pytest_addoption(parser):
+    parser.addoption('--posts', type=int, default=10_000, help='Количество статей в синтетических данных')
+
+
+@pytest.fixture(scope='session')
+def dataset(request):
+    """Тестовая база с синтетическими данными на все замеры"""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield generate_dataset(request.config.getoption('--posts'))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,30 @@
+import pytest
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from blog.benchmarks import SCENARIOS, load_baseline
+
+BASELINE = load_baseline(settings.BASE_DIR / 'benchmarks' / 'baseline.json')
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS, ids=[scenario.name for scenario in SCENARIOS])
+def test_view(benchmark, dataset, scenario):
+    """Задержка страницы и число запросов к базе не больше базового значения"""
+    client = Client()
+    if scenario.auth:
+        client.force_login(dataset[scenario.user])
+    url = scenario.url(dataset)
+    client.get(url)  # Прогрев кешей
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    benchmark.extra_info['queries'] = len(queries)
+    # Страница без базового значения не проверялась бы вовсе - требуем записать его
+    assert scenario.name in BASELINE, (f'Нет базового значения для {scenario.name}: '
+                                       'python manage.py benchmark_views --update-baseline')
+    assert len(queries) <= BASELINE[scenario.name], f'Число запросов к базе выросло: {len(queries)}'
+
+    benchmark(client.get, url)
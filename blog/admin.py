@@ -1,22 +1,25 @@
 from django.contrib import admin
+
 from blog.models import Blog, Category
+from config.admin import ScalableAdminMixin
 
 
 @admin.register(Blog)
-class BlogAdmin(admin.ModelAdmin):
+class BlogAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'title', 'author', 'category', 'is_published', 'views_count', 'created_at')
     list_filter = ('is_published', 'is_subscribed', 'category')
-    search_fields = ('title', 'content',)
+    list_select_related = ('author', 'category')
+    # Поиск по началу заголовка использует индекс UPPER(title) в PostgreSQL, поиск по тексту - страница поиска сайта
+    search_fields = ('^title',)
+    autocomplete_fields = ('author', 'category')
     exclude = ('slug',)
     readonly_fields = ('slug',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('content')
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name')
+    list_display = ('id', 'name', 'posts_count')
     search_fields = ('name',)
-
-
-
-
-
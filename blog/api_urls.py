@@ -0,0 +1,12 @@
+from django.urls import path
+
+from blog.api_views import BlogListAPIView, BlogDetailAPIView, BlogModerationAPIView, CategoryListAPIView
+
+app_name = 'api'
+
+urlpatterns = [
+    path('blogs/', BlogListAPIView.as_view(), name='blog_list'),
+    path('blogs/<int:pk>/', BlogDetailAPIView.as_view(), name='blog_detail'),
+    path('blogs/moderate/', BlogModerationAPIView.as_view(), name='blog_moderate'),
+    path('categories/', CategoryListAPIView.as_view(), name='category_list'),
+]
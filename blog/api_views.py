@@ -0,0 +1,131 @@
+import hashlib
+
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import generics, permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from blog.catalogue import get_catalogue
+from blog.models import Blog
+from blog.page_cache import get_pages_version
+from blog.serializers import BLOG_DETAIL_FIELDS, BLOG_LIST_FIELDS, CATEGORY_FIELDS, BlogDetailSerializer, \
+    BlogListSerializer, BlogModerationSerializer, CategorySerializer
+from blog.services import moderate_blogs
+from users.entitlements import get_entitlement
+
+
+class BlogCursorPagination(CursorPagination):
+    """Курсорная пагинация статей по (created_at, id) без COUNT(*) и OFFSET"""
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ConditionalGetMixin:
+    """Миксин условных GET-запросов: сильный ETag и Last-Modified, ответ 304 без формирования данных.
+
+    Наследник возвращает из get_validators() строку, однозначно описывающую данные ответа,
+    и дату их последнего изменения (или None).
+    """
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        state, last_modified = self.get_validators()
+        # Ответ зависит также от параметров запроса, формата и доступа к платным статьям (автору доступны свои)
+        entitlement = get_entitlement(request.user)
+        raw = '|'.join([state, request.get_full_path(), request.accepted_renderer.format,
+                        str(int(entitlement.reads_all)), str(entitlement.user_id)])
+        etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+
+class BlogListAPIView(ConditionalGetMixin, generics.ListAPIView):
+    """Список опубликованных статей, фильтр по категории: ?category=<id>"""
+    serializer_class = BlogListSerializer
+    pagination_class = BlogCursorPagination
+
+    def get_queryset(self):
+        queryset = Blog.objects.published()
+        category_id = self.request.query_params.get('category')
+        if category_id is not None:
+            if not category_id.isdigit():
+                raise ValidationError({'category': 'Ожидается ID категории.'})
+            queryset = queryset.filter(category_id=category_id)
+        return queryset
+
+    def get_validators(self):
+        # Версия группы страниц статей меняется при сохранении, удалении и массовом изменении статей,
+        # поэтому ответ 304 обходится без запросов к базе
+        return get_pages_version('blogs'), None
+
+    def filter_queryset(self, queryset):
+        return queryset.values(*BLOG_LIST_FIELDS)
+
+
+class BlogDetailAPIView(ConditionalGetMixin, generics.RetrieveAPIView):
+    """Опубликованная статья, текст платной статьи только для подписчиков"""
+    serializer_class = BlogDetailSerializer
+
+    def get_object(self):
+        if not hasattr(self, '_blog'):
+            queryset = get_entitlement(self.request.user).with_body(Blog.objects.published())
+            self._blog = queryset.filter(pk=self.kwargs['pk']).values(*BLOG_DETAIL_FIELDS).first()
+            if self._blog is None:
+                raise Http404('Статья не найдена.')
+        return self._blog
+
+    def get_validators(self):
+        blog = self.get_object()
+        return f'{blog["id"]}|{blog["updated_at"]}', blog['updated_at']
+
+
+class CategoryListAPIView(ConditionalGetMixin, generics.ListAPIView):
+    """Список категорий из каталога категорий, без запросов к базе"""
+    serializer_class = CategorySerializer
+
+    def get_queryset(self):
+        return get_catalogue().categories
+
+    def get_validators(self):
+        # У категорий нет даты изменения - ETag считается по самим данным, их немного
+        self._categories = [{field: getattr(category, field) for field in CATEGORY_FIELDS}
+                            for category in self.get_queryset()]
+        return repr(self._categories), None
+
+    def list(self, request, *args, **kwargs):
+        return Response(self.get_serializer(self._categories, many=True).data)
+
+
+class CanModerateBlogs(permissions.BasePermission):
+    """Доступ для пользователей с правом изменения статей"""
+
+    def has_permission(self, request, view):
+        return request.user.has_perm('blog.can_change_blog')
+
+
+class BlogModerationAPIView(generics.GenericAPIView):
+    """Массовая модерация статей: {"ids": [...], "action": "publish"} одним запросом UPDATE"""
+    serializer_class = BlogModerationSerializer
+    permission_classes = (CanModerateBlogs,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = moderate_blogs(serializer.validated_data['ids'], serializer.validated_data['action'])
+        return Response({'updated': updated})
@@ -0,0 +1,168 @@
+import json
+import time
+from collections import Counter
+from datetime import timedelta
+from statistics import median, quantiles
+
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+
+from blog.models import Blog, Category
+from blog.catalogue import recount_posts
+from blog.page_cache import invalidate_pages
+from blog.search import reset_inverted_index
+from blog.services import invalidate_random_pool, reconcile_site_stats
+from blog.utils import preserved_timestamps, unchecked_slugs
+from users.models import User
+
+CONTENT = ' '.join(['Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt '
+                    'ut labore et dolore magna aliqua.'] * 12)
+
+
+class Scenario:
+    """Страница для замера: маршрут, аргументы из набора данных, параметры запроса и вход пользователя.
+
+    user - ключ пользователя в наборе данных, от имени которого открывается страница при auth.
+    """
+
+    def __init__(self, url_name, args=(), query='', auth=True, name=None, user='reader'):
+        self.url_name = url_name
+        self.args = args
+        self.query = query
+        self.auth = auth
+        self.user = user
+        self.name = name or url_name + (f'?{query}' if query else '') + ('' if auth else ' (anonymous)')
+
+    def url(self, dataset):
+        url = reverse(self.url_name, args=[dataset[arg] for arg in self.args])
+        return f'{url}?{self.query}' if self.query else url
+
+
+# Страницы blog/urls.py и users/urls.py, открываемые GET-запросом. Не замеряются маршруты, которые меняют данные
+# или обращаются к внешним сервисам: toggle_activity, toggle_subscription, logout, create_payment, stripe_webhook
+SCENARIOS = [
+    Scenario('blog:index'),
+    Scenario('blog:index', auth=False),
+    Scenario('blog:contacts'),
+    Scenario('blog:create'),
+    Scenario('blog:blog_list'),
+    Scenario('blog:blog_list', query='page=2'),
+    Scenario('blog:blog_list', auth=False),
+    Scenario('blog:detail', args=('blog',)),
+    Scenario('blog:update', args=('blog',)),
+    Scenario('blog:delete', args=('blog',)),
+    Scenario('blog:toggle', user='moderator'),
+    Scenario('blog:toggle', query='status=draft&access=paid', user='moderator'),
+    Scenario('blog:category_list'),
+    Scenario('blog:category_detail', args=('category',)),
+    Scenario('blog:search', query='q=lorem'),
+    Scenario('users:login', auth=False),
+    Scenario('users:register', auth=False),
+    Scenario('users:password_reset_request', auth=False),
+    Scenario('users:otp_verify', args=('action', 'reader_id'), auth=False),
+    Scenario('users:new_password', args=('reader_id',), auth=False),
+    Scenario('users:profile'),
+    Scenario('users:user_delete', args=('reader_id',)),
+    Scenario('users:user_confirm_delete', args=('reader_id',)),
+    Scenario('users:subscribe'),
+    Scenario('users:subscribe_success'),
+    Scenario('users:subscribe_cancel'),
+]
+
+
+def generate_dataset(posts, authors=50, categories=20, batch_size=5000):
+    """Создаем синтетические данные bulk_create: авторов, категории и статьи с разными датами создания.
+
+    Каждая десятая статья не опубликована, каждая пятая - платная. Возвращает объекты и ID для адресов страниц.
+    """
+    reader = User.objects.create(phone='+79990000000', name='Benchmark reader')
+    moderator = User.objects.create(phone='+79989999999', name='Benchmark moderator')
+    moderator.user_permissions.set(Permission.objects.filter(content_type__app_label='blog',
+                                                             codename__in=['can_change_blog', 'can_delete_blog']))
+    author_ids = [user.pk for user in User.objects.bulk_create(
+        User(phone=f'+7999{i + 1:07d}', name=f'Benchmark author {i}') for i in range(authors)
+    )]
+    category_ids = [category.pk for category in Category.objects.bulk_create(
+        Category(name=f'Benchmark {i}') for i in range(categories)
+    )]
+
+    created_at = now()
+    excerpt = Blog.make_excerpt(CONTENT)
+    with unchecked_slugs(Blog), preserved_timestamps(Blog):
+        for start in range(0, posts, batch_size):
+            Blog.objects.bulk_create(
+                Blog(title=f'Benchmark post {i}', slug=f'benchmark-post-{i}', content=CONTENT, excerpt=excerpt,
+                     author_id=author_ids[i % authors], category_id=category_ids[i % categories],
+                     is_published=i % 10 != 0, is_subscribed=i % 5 == 0,
+                     created_at=created_at - timedelta(minutes=i), updated_at=created_at - timedelta(minutes=i))
+                for i in range(start, min(start + batch_size, posts))
+            )
+
+    # Массовая вставка идет без сигналов - пересчитываем то, что они поддерживают
+    reconcile_site_stats()
+    recount_posts()
+    invalidate_random_pool()
+    reset_inverted_index()
+    invalidate_pages('blogs', 'categories')
+    return {
+        'posts': posts,
+        'reader': reader,
+        'moderator': moderator,
+        'reader_id': reader.pk,
+        'action': 'register',
+        'blog': Blog.objects.filter(is_published=True).values_list('pk', flat=True).first(),
+        'category': category_ids[0],
+    }
+
+
+def measure(client, dataset, scenario, repeat=20, warmup=2):
+    """Замеряем страницу: медиана и 95-й процентиль задержки в мс, число запросов к базе и код ответа.
+
+    Прогрев заполняет кеши, поэтому число запросов к базе - установившееся значение для повторных открытий.
+    """
+    if scenario.auth:
+        client.force_login(dataset[scenario.user])
+    else:
+        client.logout()
+    url = scenario.url(dataset)
+    for _ in range(warmup):
+        client.get(url)
+
+    timings, query_counts = [], Counter()
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        query_counts[len(queries)] += 1
+    return {
+        'status': response.status_code,
+        'p50': median(timings),
+        'p95': quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0],
+        'queries': query_counts.most_common(1)[0][0],
+    }
+
+
+def load_baseline(path):
+    """Базовые значения числа запросов к базе по страницам"""
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)['queries']
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'queries': {name: result['queries'] for name, result in results.items()}}, file,
+                  ensure_ascii=False, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def find_regressions(results, baseline):
+    """Страницы, которым нужно больше запросов к базе, чем в базовых значениях: (имя, было, стало)"""
+    return [(name, baseline[name], result['queries']) for name, result in results.items()
+            if name in baseline and result['queries'] > baseline[name]]
@@ -0,0 +1,71 @@
+import threading
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from blog.models import Blog, Category
+from blog.page_cache import invalidate_pages
+from blog.services import bump_versions, get_versions
+
+CATALOGUE_VERSION_KEY = 'blog:categories:version'
+
+
+class CategoryCatalogue:
+    """Все категории с числом опубликованных статей в памяти процесса.
+
+    Категорий немного и меняются они редко, поэтому набор загружается целиком одним запросом. Актуальность
+    проверяется по версии в общем кеше: ее смена в любом процессе перезагружает набор при следующем обращении.
+    """
+
+    def __init__(self, categories, version):
+        self.categories = categories
+        self.by_id = {category.pk: category for category in categories}
+        self.version = version
+
+    def __iter__(self):
+        return iter(self.categories)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def get(self, category_id):
+        """Категория по ID, None - категории нет"""
+        return self.by_id.get(category_id)
+
+
+_catalogue_lock = threading.Lock()
+_catalogue = None
+
+
+def get_catalogue():
+    """Каталог категорий процесса, перезагружается после смены версии в кеше"""
+    global _catalogue
+    version = get_versions(CATALOGUE_VERSION_KEY)[CATALOGUE_VERSION_KEY]
+    with _catalogue_lock:
+        if _catalogue is None or _catalogue.version != version:
+            # Версия прочитана до загрузки: изменение во время загрузки снова сменит ее и вызовет перезагрузку
+            _catalogue = CategoryCatalogue(list(Category.objects.order_by('id')), version)
+        return _catalogue
+
+
+def invalidate_catalogue():
+    """Сбрасываем каталог категорий во всех процессах и закешированные страницы категорий"""
+    bump_versions(CATALOGUE_VERSION_KEY)
+    invalidate_pages('categories')
+
+
+def adjust_posts_count(category_id, delta):
+    """Изменяем число опубликованных статей категории на delta одним UPDATE"""
+    Category.objects.filter(pk=category_id).update(posts_count=Greatest(F('posts_count') + delta, 0))
+    invalidate_catalogue()
+
+
+def recount_posts(category_ids=None):
+    """Пересчитываем число опубликованных статей указанных (по умолчанию - всех) категорий одним UPDATE"""
+    published = Blog.objects.published().filter(category=OuterRef('pk')).order_by().values('category')
+    categories = Category.objects.all() if category_ids is None else Category.objects.filter(pk__in=category_ids)
+    updated = categories.update(
+        posts_count=Coalesce(Subquery(published.annotate(count=Count('pk')).values('count')), Value(0))
+    )
+    invalidate_catalogue()
+    return updated
@@ -0,0 +1,130 @@
+import codecs
+import json
+from collections import Counter
+
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from blog.models import Blog
+from blog.catalogue import recount_posts
+from blog.page_cache import invalidate_pages
+from blog.search import reset_inverted_index
+from blog.services import invalidate_random_pool, reconcile_site_stats
+from blog.utils import preserved_timestamps, unchecked_slugs
+
+READ_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+# BOM UTF-32 проверяется раньше UTF-16, так как начинается с тех же байтов
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def detect_encoding(path):
+    """Кодировка файла по BOM, без BOM - UTF-8"""
+    with open(path, 'rb') as file:
+        head = file.read(4)
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    return 'utf-8'
+
+
+def iter_json_array(stream, read_size=READ_SIZE):
+    """Элементы JSON-массива из текстового потока без чтения всего файла в память"""
+    decoder = json.JSONDecoder()
+    buffer, pos, opened, eof = '', 0, False, False
+    while True:
+        while pos < len(buffer) and (buffer[pos].isspace() or (opened and buffer[pos] == ',')):
+            pos += 1
+        if pos < len(buffer):
+            if not opened:
+                if buffer[pos] != '[':
+                    raise ValueError('Выгрузка должна содержать JSON-массив')
+                opened = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Элемент прочитан не полностью - дочитываем следующий фрагмент файла
+                if eof:
+                    raise
+            else:
+                yield item
+                continue
+        elif eof:
+            raise ValueError('Неожиданный конец выгрузки')
+        chunk = stream.read(read_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def _insert_batch(batch, using):
+    """Вставляем пачку объектов одной модели и их связи многие-ко-многим"""
+    model = type(batch[0].object)
+    objects = [deserialized.object for deserialized in batch]
+    if model is Blog:
+        for blog in objects:
+            blog.excerpt = Blog.make_excerpt(blog.content)
+    with unchecked_slugs(model), preserved_timestamps(model):
+        model._base_manager.using(using).bulk_create(objects)
+
+    rows = 0
+    for name in {name for deserialized in batch for name in deserialized.m2m_data}:
+        field = model._meta.get_field(name)
+        through = field.remote_field.through
+        links = [
+            through(**{f'{field.m2m_field_name()}_id': deserialized.object.pk,
+                       f'{field.m2m_reverse_field_name()}_id': related_pk})
+            for deserialized in batch
+            for related_pk in deserialized.m2m_data.get(name, ())
+        ]
+        through._base_manager.using(using).bulk_create(links)
+        rows += len(links)
+    return model, len(objects) + rows
+
+
+def load_dump(path, batch_size=BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+    """Загружаем выгрузку dumpdata пачками bulk_create в одной транзакции.
+
+    Сигналы post_save при массовой вставке не отправляются, поэтому после загрузки
+    пересчитываем статистику сайта и сбрасываем зависящие от статей кеши.
+    Возвращает количество вставленных строк по моделям.
+    """
+    counts = Counter()
+    models = set()
+    batch = []
+
+    def flush():
+        model, rows = _insert_batch(batch, using)
+        models.add(model)
+        counts[model._meta.label] += rows
+        batch.clear()
+
+    with open(path, encoding=detect_encoding(path)) as stream, transaction.atomic(using=using):
+        for deserialized in Deserializer(iter_json_array(stream), using=using, ignorenonexistent=True):
+            if batch and (type(deserialized.object) is not type(batch[0].object) or len(batch) >= batch_size):
+                flush()
+            batch.append(deserialized)
+        if batch:
+            flush()
+
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), list(models)):
+                cursor.execute(sql)
+
+    reconcile_site_stats()
+    recount_posts()
+    invalidate_random_pool()
+    reset_inverted_index()
+    invalidate_pages('blogs', 'categories')
+    return counts
@@ -0,0 +1,79 @@
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Ошибки чтения изображения: поврежденный файл, неизвестный формат, слишком большое изображение
+IMAGE_ERRORS = (OSError, Image.DecompressionBombError)
+
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+
+
+def variant_name(name, width, extension):
+    """Имя уменьшенной копии рядом с оригиналом: blog/photo.png -> blog/photo_320w.webp"""
+    root, _ = os.path.splitext(name)
+    return f'{root}_{width}w.{extension}'
+
+
+def has_variants(name, storage=default_storage):
+    """Созданы ли уменьшенные копии изображения"""
+    return bool(name) and storage.exists(variant_name(name, settings.RESPONSIVE_IMAGE_WIDTHS[0], 'webp'))
+
+
+def generate_variants(name, storage=default_storage):
+    """Создаем уменьшенные копии изображения в форматах WebP и JPEG для всех ширин из настроек.
+
+    Изображения не увеличиваются: если оригинал уже, копия сохраняется в исходном размере,
+    чтобы набор файлов был одинаковым для всех изображений.
+    """
+    with storage.open(name, 'rb') as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image.load()
+
+    for width in settings.RESPONSIVE_IMAGE_WIDTHS:
+        resized = image
+        if image.width > width:
+            resized = image.resize((width, max(round(image.height * width / image.width), 1)), Image.LANCZOS)
+        for extension, (image_format, _) in VARIANT_FORMATS.items():
+            converted = resized
+            if image_format == 'JPEG' and converted.mode not in ('RGB', 'L'):
+                converted = converted.convert('RGB')
+            elif image_format == 'WEBP' and converted.mode not in ('RGB', 'RGBA'):
+                converted = converted.convert('RGBA' if 'A' in converted.getbands() else 'RGB')
+            buffer = BytesIO()
+            converted.save(buffer, image_format, quality=settings.RESPONSIVE_IMAGE_QUALITY, optimize=True)
+            path = variant_name(name, width, extension)
+            if storage.exists(path):
+                storage.delete(path)
+            storage.save(path, ContentFile(buffer.getvalue()))
+    return name
+
+
+def generate_variants_on_save(name, storage=default_storage):
+    """Создаем копии изображения после сохранения модели.
+
+    Ошибка обработки изображения не должна превращать уже выполненное сохранение в ответ 500: она записывается
+    в журнал, а копии можно создать позже командой generate_thumbnails.
+    """
+    try:
+        return generate_variants(name, storage)
+    except IMAGE_ERRORS:
+        logger.exception('Не удалось создать уменьшенные копии изображения %s', name)
+        return None
+
+
+def build_srcset(name, extension, storage=default_storage):
+    """Значение атрибута srcset для уменьшенных копий в указанном формате"""
+    return ', '.join(
+        f'{storage.url(variant_name(name, width, extension))} {width}w'
+        for width in settings.RESPONSIVE_IMAGE_WIDTHS
+    )
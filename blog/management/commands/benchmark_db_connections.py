@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from io import BytesIO
+from statistics import median, quantiles
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.urls import reverse
+
+from config.db import CONN_MODES, connection_settings
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Команда сравнения задержки запросов при разных режимах подключения к PostgreSQL.
+
+    Запросы проходят через WSGI-обработчик целиком, вместе с сигналами начала и конца запроса,
+    которые закрывают или возвращают в пул подключение так же, как в рабочем сервере.
+    Запросы идут от имени временного пользователя, чтобы страница читала сессию и пользователя из базы.
+    """
+    help = 'Сравнение задержки запросов без постоянных подключений, с постоянными подключениями и с пулом'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=CONN_MODES, default=list(CONN_MODES),
+                            help='Режимы подключений для сравнения')
+        parser.add_argument('--path', default=None, help='Адрес страницы (по умолчанию - страница контактов)')
+        parser.add_argument('--requests', type=int, default=500, help='Количество запросов для каждого режима')
+        parser.add_argument('--concurrency', type=int, default=1, help='Количество параллельных потоков')
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'postgresql':
+            self.stderr.write('Сравнение режимов подключений выполняется только на PostgreSQL')
+            return
+        modes = options['modes']
+        if 'pool' in modes and find_spec('psycopg_pool') is None:
+            self.stderr.write('Режим pool пропущен: нужен пакет psycopg[binary,pool]')
+            modes = [mode for mode in modes if mode != 'pool']
+        path = options['path'] or reverse('blog:contacts')
+        user = User.objects.create(phone='+70000000000', name='Connections benchmark')
+        session = SessionStore()
+        session.update({SESSION_KEY: str(user.pk), BACKEND_SESSION_KEY: settings.AUTHENTICATION_BACKENDS[0],
+                        HASH_SESSION_KEY: user.get_session_auth_hash()})
+        session.create()
+        handler = WSGIHandler()
+        self.stdout.write(f'{"Режим":>10} | {"медиана, мс":>11} | {"p95, мс":>8} | {"запросов/с":>10}')
+        try:
+            for mode in modes:
+                self.use_mode(mode)
+                self.report(mode, handler, path, session.session_key, options['requests'], options['concurrency'])
+        finally:
+            self.use_mode(settings.DB_CONN_MODE)
+            session.delete()
+            user.delete()
+
+    @staticmethod
+    def use_mode(mode):
+        """Переключаем подключение по умолчанию в указанный режим"""
+        connection = connections[DEFAULT_DB_ALIAS]
+        connection.close()
+        connection.close_pool()
+        connections.settings[DEFAULT_DB_ALIAS].update(connection_settings(
+            mode, settings.DB_CONN_MAX_AGE, settings.DB_POOL_MIN_SIZE, settings.DB_POOL_MAX_SIZE,
+            settings.DB_POOL_TIMEOUT,
+        ))
+        del connections[DEFAULT_DB_ALIAS]
+
+    def report(self, mode, handler, path, session_key, count, concurrency):
+        """Выполняем запросы в режиме и выводим медиану, 95-й процентиль задержки и пропускную способность"""
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_COOKIE': f'{settings.SESSION_COOKIE_NAME}={session_key}',
+            'wsgi.url_scheme': 'http',
+        }
+
+        def request(_):
+            start = time.perf_counter()
+            response = handler({**environ, 'wsgi.input': BytesIO()}, lambda status, headers: None)
+            b''.join(response)
+            response.close()  # Сигнал конца запроса закрывает подключение или возвращает его в пул
+            return (time.perf_counter() - start) * 1000
+
+        # Прогрев: первый запрос загружает шаблоны и открывает подключения пула
+        request(None)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            timings = list(executor.map(request, range(count)))
+        elapsed = time.perf_counter() - start
+        p95 = quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        self.stdout.write(f'{mode:>10} | {median(timings):>11.2f} | {p95:>8.2f} | {count / elapsed:>10.0f}')
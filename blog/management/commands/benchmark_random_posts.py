@@ -0,0 +1,73 @@
+import time
+from statistics import median
+
+from django.core.cache import cache
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from blog.models import Blog, Category
+from blog.services import get_random_posts, RANDOM_POOL_KEY, STATS_KEYS
+from blog.utils import unchecked_slugs
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Команда сравнения выборки случайных статей через ORDER BY RANDOM() и через пул ID.
+
+    Тестовые данные создаются внутри транзакции, которая откатывается по завершении.
+    """
+    help = 'Сравнение задержки выборки случайных статей на таблицах разного размера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000],
+                            help='Размеры таблицы статей')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество замеров для каждого способа')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки при создании данных')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"Строк":>10} | {"ORDER BY ?, мс":>15} | {"пул (холодный), мс":>19} | '
+                          f'{"пул (теплый), мс":>17}')
+        with transaction.atomic():
+            author = User.objects.create(phone='+70000000000', name='Benchmark')
+            category = Category.objects.create(name='Benchmark')
+            created = 0
+            for size in sorted(options['sizes']):
+                self.create_posts(author, category, created, size, options['batch_size'])
+                created = size
+                self.report(size, options['repeat'])
+            transaction.set_rollback(True)
+        # Сигналы успели учесть тестового автора в статистике - сбрасываем ее вместе с пулом
+        cache.delete_many([RANDOM_POOL_KEY, *STATS_KEYS.values()])
+
+    def create_posts(self, author, category, start, stop, batch_size):
+        """Создаем опубликованные статьи с номерами от start до stop пачками"""
+        with unchecked_slugs(Blog):
+            for batch_start in range(start, stop, batch_size):
+                Blog.objects.bulk_create(
+                    Blog(title=f'Benchmark {i}', slug=f'benchmark-{i}', content='Lorem ipsum', excerpt='Lorem ipsum',
+                         author=author, category=category, is_published=True)
+                    for i in range(batch_start, min(batch_start + batch_size, stop))
+                )
+
+    def report(self, size, repeat):
+        """Замеряем оба способа выборки и выводим медианы"""
+        order_by_random = self.measure(lambda: list(Blog.objects.filter(is_published=True).order_by('?')[:4]),
+                                       repeat)
+
+        def cold_pool():
+            cache.delete(RANDOM_POOL_KEY)
+            get_random_posts(4)
+
+        pool_cold = self.measure(cold_pool, repeat)
+        pool_warm = self.measure(lambda: get_random_posts(4), repeat)
+        self.stdout.write(f'{size:>10} | {order_by_random:>15.2f} | {pool_cold:>19.2f} | {pool_warm:>17.2f}')
+
+    @staticmethod
+    def measure(func, repeat):
+        """Медиана времени выполнения функции в миллисекундах"""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return median(timings)
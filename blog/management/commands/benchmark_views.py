@@ -0,0 +1,77 @@
+import logging
+import os
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+
+from blog.benchmarks import SCENARIOS, generate_dataset, measure, load_baseline, save_baseline, find_regressions
+from blog.catalogue import recount_posts
+from blog.page_cache import invalidate_pages
+from blog.search import reset_inverted_index
+from blog.services import invalidate_random_pool, reconcile_site_stats
+
+
+class Command(BaseCommand):
+    """Команда замера задержки и числа запросов к базе страниц blog и users на синтетических данных.
+
+    Данные создаются внутри транзакции, которая откатывается по завершении. Если странице нужно больше
+    запросов к базе, чем записано в файле базовых значений, команда завершается с ошибкой.
+    """
+    help = 'Замер p50/p95 задержки и числа запросов к базе страниц на синтетических данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10_000, help='Количество статей')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество замеров каждой страницы')
+        parser.add_argument('--warmup', type=int, default=2, help='Количество запросов для прогрева')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки при создании данных')
+        parser.add_argument('--only', nargs='+', default=None, help='Замерять только страницы с этими именами')
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'),
+                            help='Файл базовых значений числа запросов')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Записать число запросов в файл базовых значений вместо проверки')
+
+    def handle(self, *args, **options):
+        scenarios = [scenario for scenario in SCENARIOS if not options['only'] or scenario.name in options['only']]
+        client = Client(raise_request_exception=False)
+        # Журнал каждого запроса в консоли смешался бы с таблицей результатов
+        request_logger = logging.getLogger('config.requests')
+        level = request_logger.level
+        request_logger.setLevel(logging.WARNING)
+        results = {}
+        try:
+            with transaction.atomic():
+                dataset = generate_dataset(options['posts'], batch_size=options['batch_size'])
+                self.stdout.write(f'{"Страница":<45} | {"код":>3} | {"p50, мс":>8} | {"p95, мс":>8} | {"запросов":>8}')
+                for scenario in scenarios:
+                    result = results[scenario.name] = measure(client, dataset, scenario, options['repeat'],
+                                                              options['warmup'])
+                    self.stdout.write(f'{scenario.name:<45} | {result["status"]:>3} | {result["p50"]:>8.2f} | '
+                                      f'{result["p95"]:>8.2f} | {result["queries"]:>8}')
+                transaction.set_rollback(True)
+        finally:
+            request_logger.setLevel(level)
+            # Кеши успели заполниться тестовыми статьями - пересобираем их по данным после отката
+            reconcile_site_stats()
+            recount_posts()
+            invalidate_random_pool()
+            reset_inverted_index()
+            invalidate_pages('blogs', 'categories')
+
+        if options['update_baseline']:
+            save_baseline(options['baseline'], {**self.baseline_results(options['baseline']), **results})
+            self.stdout.write(self.style.SUCCESS(f'Базовые значения записаны в {options["baseline"]}'))
+            return
+
+        regressions = find_regressions(results, load_baseline(options['baseline']))
+        if regressions:
+            raise CommandError('Число запросов к базе выросло: ' + ', '.join(
+                f'{name} ({before} -> {after})' for name, before, after in regressions
+            ))
+        self.stdout.write(self.style.SUCCESS('Число запросов к базе не превышает базовых значений'))
+
+    @staticmethod
+    def baseline_results(path):
+        """Прежние базовые значения в виде результатов, чтобы --only не стирал значения других страниц"""
+        return {name: {'queries': queries} for name, queries in load_baseline(path).items()}
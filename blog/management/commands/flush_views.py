@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from blog.services import flush_views
+
+
+class Command(BaseCommand):
+    """Команда принудительной записи накопленных просмотров статей в БД"""
+
+    def handle(self, *args, **options):
+        flushed = flush_views()
+        self.stdout.write(self.style.SUCCESS(f'Записано просмотров: {flushed}'))
@@ -0,0 +1,53 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management import BaseCommand
+from django.db import connections
+
+from blog.images import IMAGE_ERRORS, generate_variants, has_variants
+from blog.models import Blog
+from users.models import User
+
+
+def _generate(name):
+    """Создание копий одного изображения в дочернем процессе"""
+    try:
+        generate_variants(name)
+    except IMAGE_ERRORS as e:
+        return name, str(e)
+    return name, None
+
+
+class Command(BaseCommand):
+    """Команда создания уменьшенных копий уже загруженных изображений статей и аватаров"""
+    help = 'Создание уменьшенных копий WebP/JPEG для загруженных изображений в нескольких процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Количество процессов')
+        parser.add_argument('--force', action='store_true', help='Пересоздать уже существующие копии')
+
+    def handle(self, *args, **options):
+        names = {
+            *Blog.objects.exclude(image='').exclude(image=None).values_list('image', flat=True),
+            *User.objects.exclude(avatar='').exclude(avatar=None).values_list('avatar', flat=True),
+        }
+        if not options['force']:
+            names = {name for name in names if not has_variants(name)}
+        if not names:
+            self.stdout.write('Все изображения уже обработаны')
+            return
+
+        # Дочерние процессы работают только с файлами, соединения с БД им не нужны
+        connections.close_all()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            futures = [executor.submit(_generate, name) for name in sorted(names)]
+            for future in as_completed(futures):
+                name, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                else:
+                    done += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {done}, с ошибками: {failed}'))
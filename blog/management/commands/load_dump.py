@@ -0,0 +1,27 @@
+import time
+
+from django.core.management import BaseCommand
+
+from blog.dumps import BATCH_SIZE, load_dump
+
+
+class Command(BaseCommand):
+    """Команда потоковой загрузки выгрузок dumpdata (например, data_json/*.json) пачками bulk_create"""
+    help = 'Быстрая загрузка выгрузок dumpdata в любой кодировке без отправки сигналов для каждой записи'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Файлы выгрузки в порядке загрузки')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Размер пачки bulk_create')
+        parser.add_argument('--database', default='default', help='База данных для загрузки')
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            start = time.perf_counter()
+            counts = load_dump(path, batch_size=options['batch_size'], using=options['database'])
+            elapsed = time.perf_counter() - start
+            total = sum(counts.values())
+            for label, rows in counts.items():
+                self.stdout.write(f'  {label}: {rows}')
+            self.stdout.write(self.style.SUCCESS(
+                f'{path}: {total} строк за {elapsed:.2f} с ({total / elapsed if elapsed else 0:.0f} строк/с)'
+            ))
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from blog.page_cache import get_page_cache_stats
+
+
+class Command(BaseCommand):
+    """Команда вывода счетчиков попаданий и промахов кеша страниц"""
+
+    def handle(self, *args, **options):
+        stats = get_page_cache_stats()
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, доля попаданий: {stats["hit_ratio"]:.1%}'
+        )
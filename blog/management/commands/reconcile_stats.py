@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from blog.catalogue import recount_posts
+from blog.services import reconcile_site_stats
+
+
+class Command(BaseCommand):
+    """Команда пересчета статистики сайта для главной страницы и счетчиков статей категорий"""
+
+    def handle(self, *args, **options):
+        stats = reconcile_site_stats()
+        categories = recount_posts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Статей: {stats["total_posts"]}, авторов: {stats["unique_authors"]}, '
+            f'читателей: {stats["unique_members"]}, категорий пересчитано: {categories}'
+        ))
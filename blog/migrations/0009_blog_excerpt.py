@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:29
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def fill_excerpt(apps, schema_editor):
+    """Заполняем анонс для существующих статей"""
+    Blog = apps.get_model('blog', 'Blog')
+    batch = []
+    for blog in Blog.objects.only('id', 'content').iterator(chunk_size=500):
+        blog.excerpt = Truncator(blog.content).chars(200)
+        batch.append(blog)
+        if len(batch) >= 500:
+            Blog.objects.bulk_update(batch, ['excerpt'])
+            batch = []
+    if batch:
+        Blog.objects.bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_blog_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, help_text='Начало текста статьи для списков', max_length=200, verbose_name='Анонс'),
+        ),
+        migrations.RunPython(fill_excerpt, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:31
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = """
+CREATE OR REPLACE FUNCTION blog_blog_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.content, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blog_blog_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content, search_vector ON blog_blog
+    FOR EACH ROW EXECUTE FUNCTION blog_blog_search_vector_update();
+
+UPDATE blog_blog SET search_vector = NULL;
+
+CREATE INDEX blog_blog_search_vector_gin ON blog_blog USING gin (search_vector);
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP INDEX IF EXISTS blog_blog_search_vector_gin;
+DROP TRIGGER IF EXISTS blog_blog_search_vector_trigger ON blog_blog;
+DROP FUNCTION IF EXISTS blog_blog_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    """Триггер заполнения поискового вектора и GIN-индекс (только для PostgreSQL)"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_VECTOR_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_blog_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# Поиск в админке по началу заголовка: Django сравнивает UPPER(title::text) LIKE UPPER('...%')
+CREATE_INDEX_SQL = """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS blog_blog_title_upper_prefix_idx
+    ON blog_blog (UPPER(title::text) text_pattern_ops);
+"""
+
+DROP_INDEX_SQL = 'DROP INDEX CONCURRENTLY IF EXISTS blog_blog_title_upper_prefix_idx;'
+
+
+def create_search_indexes(apps, schema_editor):
+    """Индекс для поиска по началу заголовка (только для PostgreSQL, без блокировки записи в таблицу)"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX_SQL)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('blog', '0010_blog_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_posts_count(apps, schema_editor):
+    """Заполняем число опубликованных статей существующих категорий"""
+    Blog = apps.get_model('blog', 'Blog')
+    Category = apps.get_model('blog', 'Category')
+    published = Blog.objects.filter(category=OuterRef('pk'), is_published=True).order_by().values('category')
+    Category.objects.update(
+        posts_count=Coalesce(Subquery(published.annotate(count=Count('pk')).values('count')), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Поддерживается сигналами статей, см. blog/catalogue.py', verbose_name='Опубликовано статей'),
+        ),
+        migrations.RunPython(fill_posts_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = """
+CREATE OR REPLACE FUNCTION blog_blog_search_vector_update() RETURNS trigger AS $$
+DECLARE
+    body text := CASE WHEN NEW.is_subscribed THEN NEW.excerpt ELSE NEW.content END;
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(body, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(body, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS blog_blog_search_vector_trigger ON blog_blog;
+CREATE TRIGGER blog_blog_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content, excerpt, is_subscribed, search_vector ON blog_blog
+    FOR EACH ROW EXECUTE FUNCTION blog_blog_search_vector_update();
+
+UPDATE blog_blog SET search_vector = NULL WHERE is_subscribed;
+"""
+
+PREVIOUS_SEARCH_VECTOR_SQL = """
+CREATE OR REPLACE FUNCTION blog_blog_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.content, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS blog_blog_search_vector_trigger ON blog_blog;
+CREATE TRIGGER blog_blog_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content, search_vector ON blog_blog
+    FOR EACH ROW EXECUTE FUNCTION blog_blog_search_vector_update();
+
+UPDATE blog_blog SET search_vector = NULL WHERE is_subscribed;
+"""
+
+
+def index_paid_excerpt(apps, schema_editor):
+    """Платные статьи попадают в поисковый вектор анонсом, а не полным текстом (только для PostgreSQL)"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_VECTOR_SQL)
+
+
+def index_paid_content(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(PREVIOUS_SEARCH_VECTOR_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_category_posts_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_paid_excerpt, index_paid_content),
+    ]
@@ -1,10 +1,16 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.utils.text import Truncator
 from autoslug import AutoSlugField
 from users.models import NULLABLE, User
 
+EXCERPT_LENGTH = 200
+
 
 class Category(models.Model):
     name = models.CharField(max_length=50, verbose_name='Категория', help_text='Введите название категории')
+    posts_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Опубликовано статей',
+                                              help_text='Поддерживается сигналами статей, см. blog/catalogue.py')
 
     class Meta:
         verbose_name = 'Категория'
@@ -14,9 +20,30 @@ class Category(models.Model):
         return self.name
 
 
+class BlogQuerySet(models.QuerySet):
+    """Запросы для статей"""
+
+    def published(self):
+        """Только опубликованные статьи"""
+        return self.filter(is_published=True)
+
+    def for_listing(self):
+        """Статьи для списков: без полного текста, с автором и категорией в одном запросе"""
+        return self.select_related('author', 'category').defer('content', 'search_vector')
+
+
+class BlogManager(models.Manager.from_queryset(BlogQuerySet)):
+    """Менеджер статей: поисковый вектор заполняется триггером в БД и в моделях не загружается"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
 class Blog(models.Model):
     title = models.CharField(max_length=200, verbose_name='Заголовок', help_text='Введите заголовок')
     content = models.TextField(verbose_name='Содержание', help_text='Введите текст статьи')
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, editable=False, verbose_name='Анонс',
+                               help_text='Начало текста статьи для списков')
     image = models.ImageField(upload_to='blog/', verbose_name='Изображение', help_text='Выберите изображение',
                               **NULLABLE)
     slug = AutoSlugField(populate_from='title', unique=True, verbose_name='Slug', **NULLABLE)
@@ -29,13 +56,38 @@ class Blog(models.Model):
     is_published = models.BooleanField(default=True, verbose_name='Опубликовано')
     views_count = models.PositiveIntegerField(default=0, verbose_name='Количество просмотров')
     is_subscribed = models.BooleanField(default=False, verbose_name='Подписка', help_text='Доступ после оплаты')
+    search_vector = SearchVectorField(editable=False, verbose_name='Поисковый вектор', **NULLABLE)
+
+    objects = BlogManager()
 
     def __str__(self):
         return self.title
 
+    @staticmethod
+    def make_excerpt(content):
+        """Анонс статьи по ее тексту"""
+        return Truncator(content).chars(EXCERPT_LENGTH)
+
+    def save(self, *args, **kwargs):
+        """Сохраняем статью, обновляя анонс по тексту.
+
+        Сигнал post_save обрабатывается в той же транзакции, что и запись статьи, поэтому счетчик статей
+        категории не расходится с таблицей статей.
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.excerpt = self.make_excerpt(self.content)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'excerpt'}
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Статья'
         verbose_name_plural = 'Статьи'
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='blog_created_at_id_idx'),
+        ]
         permissions = [
             ('can_change_blog', 'Can change blog'),
             ('can_delete_blog', 'Can delete blog'),
@@ -0,0 +1,136 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from blog.services import bump_versions, get_versions, incr_counter
+from blog.utils import aresolve_user
+
+PAGE_KEY = 'page_cache:page:{}'
+VERSION_KEY = 'page_cache:version:{}'
+HITS_KEY = 'page_cache:hits'
+MISSES_KEY = 'page_cache:misses'
+
+
+def invalidate_pages(*namespaces):
+    """Сбрасываем закешированные страницы указанных групп сменой их версии"""
+    bump_versions(*(VERSION_KEY.format(namespace) for namespace in namespaces))
+
+
+def get_pages_version(namespace):
+    """Версия группы страниц: меняется при каждом изменении данных, от которых зависят ее страницы"""
+    key = VERSION_KEY.format(namespace)
+    return get_versions(key)[key]
+
+
+def get_page_cache_stats():
+    """Счетчики попаданий и промахов кеша страниц"""
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = stats.get(HITS_KEY, 0), stats.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def page_cache_key(request, namespaces, is_subscribed):
+    """Ключ страницы: адрес с параметрами, статус подписки и версии групп, от которых зависит страница"""
+    version_keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    versions = get_versions(*version_keys)
+    raw = '|'.join([
+        request.get_full_path(),
+        str(int(is_subscribed)),
+        *(f'{key}={versions[key]}' for key in version_keys),
+    ])
+    return PAGE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+class AnonymousPageCacheMixin:
+    """Миксин кеширования готовых страниц для анонимных пользователей.
+
+    Страница сбрасывается при изменении любой из групп page_cache_namespaces (см. invalidate_pages).
+    Работает и с асинхронными контроллерами: обращения к кешу тогда выполняются вне цикла событий.
+    """
+    page_cache_namespaces = ()
+    page_cache_timeout = None
+
+    def get_page_cache_namespaces(self):
+        return self.page_cache_namespaces
+
+    def get_page_cache_timeout(self):
+        return self.page_cache_timeout or settings.PAGE_CACHE_TIMEOUT
+
+    def is_page_cacheable(self, request):
+        """Кешируем только GET-запросы анонимных пользователей без flash-сообщений"""
+        return (
+            request.method == 'GET'
+            and not request.user.is_authenticated
+            and 'messages' not in request.COOKIES
+        )
+
+    def page_cache_hit(self, request, *args, **kwargs):
+        """Действия при отдаче страницы из кеша"""
+
+    def prepare_cached_content(self, content):
+        """Содержимое страницы для сохранения в кеш: изменчивые значения можно заменить метками"""
+        return content
+
+    def render_cached_content(self, content, *args, **kwargs):
+        """Содержимое страницы из кеша для ответа: метки заменяются актуальными значениями"""
+        return content
+
+    def get_cached_page(self, request, *args, **kwargs):
+        """Ключ страницы и готовый ответ из кеша (None при промахе), учитываем попадание или промах"""
+        key = page_cache_key(request, self.get_page_cache_namespaces(), is_subscribed=False)
+        cached = cache.get(key)
+        if cached is None:
+            incr_counter(MISSES_KEY)
+            return key, None
+        incr_counter(HITS_KEY)
+        self.page_cache_hit(request, *args, **kwargs)
+        content, content_type = cached
+        return key, HttpResponse(self.render_cached_content(content, *args, **kwargs), content_type=content_type)
+
+    def store_page(self, key, response):
+        """Сохраняем успешный ответ в кеш после отрисовки шаблона"""
+        if response.status_code != 200:
+            return
+
+        def store(rendered):
+            cache.set(key, (self.prepare_cached_content(rendered.content), rendered['Content-Type']),
+                      self.get_page_cache_timeout())
+
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.adispatch(request, *args, **kwargs)
+        if not self.is_page_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key, cached = self.get_cached_page(request, *args, **kwargs)
+        if cached is not None:
+            return cached
+        response = super().dispatch(request, *args, **kwargs)
+        self.store_page(key, response)
+        return response
+
+    async def adispatch(self, request, *args, **kwargs):
+        await aresolve_user(request)
+        if not self.is_page_cacheable(request):
+            return await super().dispatch(request, *args, **kwargs)
+
+        key, cached = await sync_to_async(self.get_cached_page)(request, *args, **kwargs)
+        if cached is not None:
+            return cached
+        response = await super().dispatch(request, *args, **kwargs)
+        self.store_page(key, response)
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page_cache_timeout'] = self.get_page_cache_timeout()
+        return context
@@ -0,0 +1,157 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.http import Http404
+
+
+def encode_cursor(direction, obj):
+    """Кодируем позицию статьи в непрозрачный курсор"""
+    raw = f'{direction}|{obj.created_at.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Раскодируем курсор в направление, дату создания и ID статьи"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, created_at, pk = raw.split('|')
+        if direction not in ('n', 'p'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise Http404('Неверный курсор страницы.') from e
+
+
+class CursorPage:
+    """Страница курсорной пагинации"""
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    @property
+    def next_cursor(self):
+        if self.has_next_page and self.object_list:
+            return encode_cursor('n', self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous_page and self.object_list:
+            return encode_cursor('p', self.object_list[0])
+        return None
+
+
+class CursorPaginator:
+    """Курсорная (keyset) пагинация по (created_at, id) без COUNT(*) и OFFSET"""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def get_slice(self, cursor=None):
+        """Запрос страницы после (или перед) позицией в курсоре и направление курсора"""
+        if not cursor:
+            return self.queryset.order_by('-created_at', '-id')[:self.per_page + 1], None
+
+        direction, created_at, pk = decode_cursor(cursor)
+        # Избыточная граница по created_at дает индексу (created_at, id) точку входа: без нее условие с OR
+        # не превращается в поиск по индексу, и каждая следующая страница просматривает все предыдущие
+        if direction == 'n':
+            return (
+                self.queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+                                     created_at__lte=created_at)
+                .order_by('-created_at', '-id')[:self.per_page + 1]
+            ), direction
+        return (
+            self.queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk),
+                                 created_at__gte=created_at)
+            .order_by('created_at', 'id')[:self.per_page + 1]
+        ), direction
+
+    def make_page(self, items, direction):
+        """Страница из загруженных статей: лишняя статья показывает, есть ли страница дальше"""
+        has_more = len(items) > self.per_page
+        if direction is None:
+            return CursorPage(items[:self.per_page], has_more, False)
+        if direction == 'n':
+            return CursorPage(items[:self.per_page], has_more, True)
+        return CursorPage(items[:self.per_page][::-1], True, has_more)
+
+    def page(self, cursor=None):
+        """Страница после (или перед) позицией, закодированной в курсоре"""
+        queryset, direction = self.get_slice(cursor)
+        return self.make_page(list(queryset), direction)
+
+    async def apage(self, cursor=None):
+        """Страница после (или перед) позицией в курсоре через асинхронный ORM"""
+        queryset, direction = self.get_slice(cursor)
+        return self.make_page([obj async for obj in queryset], direction)
+
+
+class CursorPaginationMixin:
+    """Миксин для ListView с включаемым режимом курсорной пагинации.
+
+    Режим задается атрибутом pagination_mode или настройкой BLOG_PAGINATION_MODE ('page' или 'cursor').
+    """
+    pagination_mode = None
+    cursor_kwarg = 'cursor'
+    page_data = None
+
+    def get_pagination_mode(self):
+        return self.pagination_mode or settings.BLOG_PAGINATION_MODE
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.page_data is not None:
+            # Страница уже загружена асинхронным контроллером в apaginate_queryset
+            return self.page_data
+        if self.get_pagination_mode() != 'cursor':
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size)
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """Загружаем страницу асинхронным ORM, результат используется при сборке контекста"""
+        if self.get_pagination_mode() == 'cursor':
+            paginator = CursorPaginator(queryset, page_size)
+            page = await paginator.apage(self.request.GET.get(self.cursor_kwarg))
+        else:
+            paginator = self.get_paginator(queryset, page_size, orphans=self.get_paginate_orphans(),
+                                           allow_empty_first_page=self.get_allow_empty())
+            paginator.count = await queryset.acount()
+            page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+            if page_number == 'last':
+                page_number = paginator.num_pages
+            try:
+                page = paginator.page(page_number)
+            except InvalidPage as e:
+                raise Http404(f'Неверная страница ({page_number}): {e}') from e
+            page.object_list = [obj async for obj in page.object_list]
+        self.page_data = paginator, page, page.object_list, page.has_other_pages()
+        return self.page_data
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['pagination_mode'] = self.get_pagination_mode()
+        return context
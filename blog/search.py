@@ -0,0 +1,221 @@
+import math
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, When
+from django.utils.html import escape
+
+from blog.models import Blog
+from blog.services import bump_versions, get_versions
+
+SEARCH_CONFIGS = ('russian', 'english')
+SNIPPET_WORDS = 30
+TITLE_WEIGHT = 2
+# Маркеры подсветки, которые не встречаются в тексте статей - заменяются на <mark> после экранирования HTML
+START_SEL = '\x02'
+STOP_SEL = '\x03'
+
+# Версия индекса в общем кеше: меняется при изменении статей, индекс процесса с другой версией строится заново
+INDEX_VERSION_KEY = 'search:index:version'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+SUFFIXES = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ая', 'яя', 'ое', 'ее', 'ой', 'ей', 'ий', 'ый', 'ые',
+    'ие', 'ов', 'ев', 'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ую', 'юю', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь',
+    'ing', 'ed', 'es', 's',
+), key=len, reverse=True)
+
+
+def normalize(word):
+    """Приводим слово к упрощенной основе: нижний регистр без типичных окончаний"""
+    word = word.lower()
+    for suffix in SUFFIXES:
+        if len(word) - len(suffix) >= 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """Основы слов текста"""
+    return [normalize(word) for word in TOKEN_RE.findall(text or '')]
+
+
+def highlight(text, terms):
+    """Фрагмент текста вокруг первого совпадения с подсветкой найденных слов"""
+    words = (text or '').split()
+    positions = [i for i, word in enumerate(words) if set(tokenize(word)) & terms]
+    start = max(positions[0] - SNIPPET_WORDS // 3, 0) if positions else 0
+    fragment = words[start:start + SNIPPET_WORDS]
+    marked = [
+        f'{START_SEL}{word}{STOP_SEL}' if set(tokenize(word)) & terms else word
+        for word in fragment
+    ]
+    snippet = ' '.join(marked)
+    if start > 0:
+        snippet = '… ' + snippet
+    if start + SNIPPET_WORDS < len(words):
+        snippet += ' …'
+    return snippet
+
+
+def render_snippet(snippet):
+    """Экранируем фрагмент и заменяем маркеры подсветки на теги <mark>"""
+    return escape(snippet or '').replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>')
+
+
+def snippet_source(blog):
+    """Текст для фрагмента: полный текст бесплатной статьи или анонс платной"""
+    return blog.excerpt if blog.is_subscribed else blog.content
+
+
+class InvertedIndex:
+    """Инвертированный индекс статей в памяти процесса для баз данных без полнотекстового поиска"""
+
+    def __init__(self):
+        self.postings = {}
+        self.categories = {}
+
+    def add(self, blog_id, category_id, title, content):
+        """Добавляем статью в индекс, слова заголовка весят больше слов текста"""
+        self.categories[blog_id] = category_id
+        for weight, text in ((TITLE_WEIGHT, title), (1, content)):
+            for term in tokenize(text):
+                entries = self.postings.setdefault(term, {})
+                entries[blog_id] = entries.get(blog_id, 0) + weight
+
+    def search(self, query, category_id=None):
+        """ID статей, содержащих все слова запроса, по убыванию релевантности (TF-IDF)"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        total = len(self.categories) or 1
+        scores = None
+        for term in terms:
+            entries = self.postings.get(term, {})
+            idf = math.log(total / len(entries)) + 1 if entries else 0
+            term_scores = {blog_id: tf * idf for blog_id, tf in entries.items()}
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {blog_id: score + term_scores[blog_id] for blog_id, score in scores.items()
+                          if blog_id in term_scores}
+        if category_id is not None:
+            scores = {blog_id: score for blog_id, score in scores.items()
+                      if self.categories[blog_id] == category_id}
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_inverted_index():
+    """Индекс опубликованных статей, строится заново, если версия в общем кеше изменилась.
+
+    Платные статьи индексируются по анонсу: иначе поиск находил бы их по словам закрытого текста.
+    """
+    global _index, _index_version
+    # Версию читаем до чтения статей: изменение во время построения оставит индекс устаревшим по версии
+    version = get_versions(INDEX_VERSION_KEY)[INDEX_VERSION_KEY]
+    with _index_lock:
+        if _index is None or _index_version != version:
+            index = InvertedIndex()
+            rows = Blog.objects.published().values_list('id', 'category_id', 'title', 'content', 'excerpt',
+                                                        'is_subscribed')
+            for blog_id, category_id, title, content, excerpt, is_subscribed in rows.iterator(chunk_size=500):
+                index.add(blog_id, category_id, title, excerpt if is_subscribed else content)
+            _index, _index_version = index, version
+        return _index
+
+
+def reset_inverted_index():
+    """Сбрасываем индекс во всех процессах сменой версии, он будет построен заново при следующем поиске"""
+    bump_versions(INDEX_VERSION_KEY)
+
+
+def get_search_backend():
+    """Движок поиска: 'postgres' (tsvector и GIN-индекс) или 'python' (инвертированный индекс в памяти)"""
+    backend = settings.BLOG_SEARCH_BACKEND
+    if backend:
+        return backend
+    return 'postgres' if connection.vendor == 'postgresql' else 'python'
+
+
+def postgres_search(query, category_id=None):
+    """Поиск по колонке search_vector с ранжированием и подсветкой средствами PostgreSQL"""
+    search_query = None
+    for config in SEARCH_CONFIGS:
+        config_query = SearchQuery(query, config=config, search_type='websearch')
+        search_query = config_query if search_query is None else search_query | config_query
+
+    queryset = Blog.objects.published().for_listing().filter(search_vector=search_query)
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+    return queryset.annotate(
+        rank=SearchRank(F('search_vector'), search_query),
+        snippet=SearchHeadline(
+            Case(When(is_subscribed=True, then=F('excerpt')), default=F('content')),
+            search_query,
+            config=SEARCH_CONFIGS[0],
+            start_sel=START_SEL,
+            stop_sel=STOP_SEL,
+            max_words=SNIPPET_WORDS,
+            min_words=SNIPPET_WORDS // 2,
+        ),
+    ).order_by('-rank', '-created_at')
+
+
+class RankedResults:
+    """Результаты поиска по инвертированному индексу, статьи загружаются только для запрошенного среза"""
+
+    def __init__(self, ranked, terms):
+        self.ranked = ranked
+        self.terms = terms
+
+    def __len__(self):
+        return len(self.ranked)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.load(self.ranked[index])
+        return self.load([self.ranked[index]])[0]
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def load(self, ranked):
+        """Загружаем статьи и заполняем ранг и фрагмент с подсветкой"""
+        blogs = Blog.objects.published().select_related('author', 'category').in_bulk(
+            [blog_id for blog_id, _ in ranked]
+        )
+        results = []
+        for blog_id, rank in ranked:
+            blog = blogs.get(blog_id)
+            if blog is None:
+                continue
+            blog.rank = rank
+            blog.snippet = highlight(snippet_source(blog), self.terms)
+            results.append(blog)
+        return results
+
+
+def python_search(query, category_id=None):
+    """Поиск по инвертированному индексу в памяти процесса"""
+    return RankedResults(get_inverted_index().search(query, category_id), set(tokenize(query)))
+
+
+def search_blogs(query, category_id=None):
+    """Опубликованные статьи по поисковому запросу, отсортированные по релевантности.
+
+    У каждой статьи заполнены атрибуты rank и snippet (фрагмент текста с маркерами подсветки).
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+    if get_search_backend() == 'postgres':
+        return postgres_search(query, category_id)
+    return python_search(query, category_id)
@@ -0,0 +1,57 @@
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from blog.services import MODERATION_ACTIONS, MODERATION_MAX_IDS
+
+# Поля статей, выбираемые через values() без создания экземпляров моделей
+BLOG_LIST_FIELDS = ('id', 'title', 'slug', 'excerpt', 'image', 'category_id', 'is_subscribed', 'created_at',
+                    'updated_at')
+# Текст статьи: полный или анонс для пользователей без доступа (см. Entitlement.with_body)
+BLOG_DETAIL_FIELDS = (*BLOG_LIST_FIELDS, 'body', 'is_teaser')
+CATEGORY_FIELDS = ('id', 'name')
+
+
+class MediaURLField(serializers.Field):
+    """Абсолютная ссылка на загруженный файл по его имени в хранилище"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = default_storage.url(value)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class CategorySerializer(serializers.Serializer):
+    """Категория статей"""
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(read_only=True)
+
+
+class BlogListSerializer(serializers.Serializer):
+    """Статья в списке: анонс вместо полного текста"""
+    id = serializers.IntegerField(read_only=True)
+    title = serializers.CharField(read_only=True)
+    slug = serializers.CharField(read_only=True)
+    excerpt = serializers.CharField(read_only=True)
+    image = MediaURLField(read_only=True)
+    category = serializers.IntegerField(source='category_id', read_only=True)
+    is_subscribed = serializers.BooleanField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
+    updated_at = serializers.DateTimeField(read_only=True)
+
+
+class BlogDetailSerializer(BlogListSerializer):
+    """Статья целиком: текст платной статьи доступен только подписчикам"""
+    content = serializers.SerializerMethodField()
+    is_locked = serializers.BooleanField(source='is_teaser', read_only=True)
+
+    def get_content(self, blog):
+        return None if blog['is_teaser'] else blog['body']
+
+
+class BlogModerationSerializer(serializers.Serializer):
+    """Массовое действие модерации: ID статей и действие"""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                max_length=MODERATION_MAX_IDS)
+    action = serializers.ChoiceField(choices=list(MODERATION_ACTIONS))
@@ -0,0 +1,272 @@
+import random
+import time
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.db.models import Case, F, Min, Max, Value, When
+from django.dispatch import Signal
+from django.utils.connection import ConnectionProxy
+from django.utils.timezone import now
+
+from blog.models import Blog
+from users.models import User
+
+VIEWS_KEY = 'blog:views:{}'
+VIEWS_SLOTS_KEY = 'blog:views:slots'
+VIEWS_SLOT_KEY = 'blog:views:slot:{}'
+VIEWS_FLUSHED_SLOT_KEY = 'blog:views:flushed_slot'
+VIEWS_TOTAL_KEY = 'blog:views:total'
+VIEWS_LAST_FLUSH_KEY = 'blog:views:last_flush'
+VIEWS_FLUSH_LOCK_KEY = 'blog:views:flush_lock'
+VIEWS_GAPS_KEY = 'blog:views:gaps'
+
+RANDOM_POOL_KEY = 'blog:random_pool'
+
+# Действия модерации: значения полей, которые выставляются статьям
+MODERATION_ACTIONS = {
+    'publish': {'is_published': True},
+    'unpublish': {'is_published': False},
+    'paywall': {'is_subscribed': True},
+    'free': {'is_subscribed': False},
+}
+# Наибольшее количество статей в одном массовом действии
+MODERATION_MAX_IDS = 1000
+
+# Статьи изменены через QuerySet.update без сигналов post_save, аргументы: ids - ID измененных статей,
+# fields - измененные поля
+blogs_updated = Signal()
+
+# Буфер просмотров хранится в отдельном кеше, записи которого не вытесняются (см. CACHES в настройках)
+counters = ConnectionProxy(caches, 'counters')
+
+STATS_KEYS = {
+    'total_posts': 'blog:stats:total_posts',
+    'unique_authors': 'blog:stats:unique_authors',
+    'unique_members': 'blog:stats:unique_members',
+}
+
+
+def incr_counter(key, store=cache):
+    """Атомарное увеличение счетчика в кеше, создает ключ при его отсутствии"""
+    try:
+        return store.incr(key)
+    except ValueError:
+        if store.add(key, 1, None):
+            return 1
+        return store.incr(key)
+
+
+def get_versions(*keys):
+    """Версии данных по ключам кеша.
+
+    Версия - случайная строка, а не счетчик: после вытеснения или очистки кеша создается новая версия,
+    которая не совпадет ни с одной выданной ранее, поэтому данные по старой версии не будут отданы.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = uuid.uuid4().hex
+            versions[key] = version if cache.add(key, version, None) else cache.get(key, version)
+    return versions
+
+
+def _set_new_versions(*keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+
+def bump_versions(*keys):
+    """Меняем версии данных сразу и еще раз после фиксации транзакции: процесс, прочитавший данные
+    до фиксации, иначе сохранил бы прежние данные под новой версией"""
+    _set_new_versions(*keys)
+    transaction.on_commit(partial(_set_new_versions, *keys))
+
+
+def _enqueue_blog(blog_id):
+    """Ставим статью в очередь на запись просмотров"""
+    slot = incr_counter(VIEWS_SLOTS_KEY, counters)
+    counters.set(VIEWS_SLOT_KEY.format(slot), blog_id, None)
+
+
+def register_view(blog_id):
+    """Учитываем просмотр статьи в буфере, при необходимости сбрасываем буфер в БД"""
+    if incr_counter(VIEWS_KEY.format(blog_id), counters) == 1:
+        # Первый просмотр с момента последней записи - статья попадает в очередь
+        _enqueue_blog(blog_id)
+
+    total = incr_counter(VIEWS_TOTAL_KEY, counters)
+    last_flush = counters.get(VIEWS_LAST_FLUSH_KEY)
+    if last_flush is None:
+        counters.add(VIEWS_LAST_FLUSH_KEY, time.time(), None)
+    elif time.time() - last_flush >= settings.VIEWS_FLUSH_INTERVAL:
+        flush_views()
+        return
+    if total >= settings.VIEWS_FLUSH_THRESHOLD:
+        flush_views()
+
+
+def get_pending_views(blog_id):
+    """Количество просмотров статьи, еще не записанных в БД"""
+    return counters.get(VIEWS_KEY.format(blog_id), 0)
+
+
+def get_views_count(blog_id):
+    """Количество просмотров статьи: записанные в БД (одно чтение поля по ID) и еще не записанные, None - статьи нет"""
+    views_count = Blog.objects.filter(pk=blog_id).values_list('views_count', flat=True).first()
+    if views_count is None:
+        return None
+    return views_count + get_pending_views(blog_id)
+
+
+def flush_views():
+    """Записываем накопленные просмотры в БД атомарными UPDATE ... SET views_count = views_count + N"""
+    if not counters.add(VIEWS_FLUSH_LOCK_KEY, 1, 60):
+        return 0
+    try:
+        counters.set(VIEWS_LAST_FLUSH_KEY, time.time(), None)
+        last_slot = counters.get(VIEWS_SLOTS_KEY, 0)
+        flushed_slot = counters.get(VIEWS_FLUSHED_SLOT_KEY, 0)
+        slots = [*counters.get(VIEWS_GAPS_KEY, []), *range(flushed_slot + 1, last_slot + 1)]
+        if not slots:
+            return 0
+
+        slot_keys = {slot: VIEWS_SLOT_KEY.format(slot) for slot in slots}
+        found = counters.get_many(slot_keys.values())
+        # Номер слота выдается раньше, чем в слот записывается ID статьи: незаписанные слоты
+        # не пропускаются, а проверяются снова при следующей записи
+        gaps = [slot for slot, key in slot_keys.items() if key not in found]
+        blog_ids = set(found.values())
+        pending = counters.get_many([VIEWS_KEY.format(blog_id) for blog_id in blog_ids])
+
+        # Группируем статьи по приросту, чтобы обойтись одним UPDATE на каждое значение
+        by_delta = {}
+        for blog_id in blog_ids:
+            delta = pending.get(VIEWS_KEY.format(blog_id))
+            if delta:
+                by_delta.setdefault(delta, []).append(blog_id)
+
+        flushed = 0
+        for delta, ids in by_delta.items():
+            Blog.objects.filter(pk__in=ids).update(views_count=F('views_count') + delta)
+            for blog_id in ids:
+                if counters.decr(VIEWS_KEY.format(blog_id), delta) > 0:
+                    # Пока шла запись, статью успели просмотреть - оставляем ее в очереди
+                    _enqueue_blog(blog_id)
+            flushed += delta * len(ids)
+
+        counters.set_many({VIEWS_FLUSHED_SLOT_KEY: max(last_slot, flushed_slot), VIEWS_GAPS_KEY: gaps}, None)
+        counters.delete_many(list(found))
+        try:
+            counters.decr(VIEWS_TOTAL_KEY, min(flushed, counters.get(VIEWS_TOTAL_KEY, 0)))
+        except ValueError:
+            pass
+        return flushed
+    finally:
+        counters.delete(VIEWS_FLUSH_LOCK_KEY)
+
+
+def reconcile_site_stats():
+    """Пересчитываем статистику сайта по БД и сохраняем ее в кеш"""
+    stats = {
+        'total_posts': Blog.objects.count(),
+        'unique_authors': Blog.objects.values('author').distinct().count(),
+        'unique_members': User.objects.filter(is_active=True).count(),
+    }
+    cache.set_many({STATS_KEYS[name]: value for name, value in stats.items()}, None)
+    return stats
+
+
+def get_site_stats():
+    """Статистика сайта из кеша, при отсутствии в кеше - пересчитывается"""
+    cached = cache.get_many(STATS_KEYS.values())
+    if len(cached) < len(STATS_KEYS):
+        return reconcile_site_stats()
+    return {name: cached[key] for name, key in STATS_KEYS.items()}
+
+
+def adjust_site_stat(name, delta):
+    """Изменяем счетчик статистики сайта на delta"""
+    try:
+        if delta > 0:
+            cache.incr(STATS_KEYS[name], delta)
+        elif delta < 0:
+            cache.decr(STATS_KEYS[name], -delta)
+    except ValueError:
+        # Счетчика нет в кеше - он будет пересчитан при следующем обращении
+        pass
+
+
+def invalidate_site_stat(name):
+    """Сбрасываем счетчик статистики сайта, он будет пересчитан при следующем обращении"""
+    cache.delete(STATS_KEYS[name])
+
+
+def build_random_pool(size):
+    """Собираем пул ID опубликованных статей выборкой случайных диапазонов первичного ключа.
+
+    Каждый диапазон читается по индексу первичного ключа, поэтому стоимость не зависит от размера таблицы.
+    """
+    published = Blog.objects.filter(is_published=True)
+    bounds = published.aggregate(min_id=Min('pk'), max_id=Max('pk'))
+    if bounds['min_id'] is None:
+        return []
+
+    chunk = max(size // settings.RANDOM_POSTS_POOL_CHUNKS, 1)
+    pool = set()
+    for _ in range(settings.RANDOM_POSTS_POOL_CHUNKS):
+        start = random.randint(bounds['min_id'], bounds['max_id'])
+        ids = list(published.filter(pk__gte=start).order_by('pk').values_list('pk', flat=True)[:chunk])
+        if len(ids) < chunk:
+            # Дошли до конца таблицы - продолжаем с начала
+            ids += published.filter(pk__lt=start).order_by('pk').values_list('pk', flat=True)[:chunk - len(ids)]
+        pool.update(ids)
+        if len(ids) < chunk:
+            # В таблице меньше записей, чем в одном диапазоне - все они уже в пуле
+            break
+    return list(pool)
+
+
+def get_random_posts(count):
+    """Случайные опубликованные статьи из заранее собранного пула"""
+    pool = cache.get(RANDOM_POOL_KEY)
+    if pool is None:
+        pool = build_random_pool(settings.RANDOM_POSTS_POOL_SIZE)
+        cache.set(RANDOM_POOL_KEY, pool, settings.RANDOM_POSTS_POOL_TTL)
+
+    sample = random.sample(pool, min(count, len(pool)))
+    if not sample:
+        return []
+    posts = Blog.objects.for_listing().in_bulk(sample)
+    return [posts[pk] for pk in sample if pk in posts and posts[pk].is_published]
+
+
+def invalidate_random_pool():
+    """Сбрасываем пул случайных статей, он будет собран заново при следующем обращении"""
+    cache.delete(RANDOM_POOL_KEY)
+
+
+def moderate_blogs(ids, action):
+    """Применяем действие модерации к статьям одним UPDATE ... WHERE id IN (...), возвращаем число измененных.
+
+    Статьи, уже находящиеся в нужном состоянии, не изменяются и не получают новую дату изменения.
+    Сигнал blogs_updated обрабатывается в той же транзакции, что и UPDATE (пересчет счетчиков категорий).
+    """
+    values = MODERATION_ACTIONS[action]
+    ids = list(ids)
+    with transaction.atomic():
+        updated = Blog.objects.filter(pk__in=ids).exclude(**values).update(**values, updated_at=now())
+        if updated:
+            blogs_updated.send(sender=Blog, ids=ids, fields=tuple(values))
+    return updated
+
+
+def toggle_blog_field(pk, field):
+    """Переключаем признак статьи одним UPDATE без загрузки статьи, возвращаем False, если статьи нет"""
+    flipped = Case(When(**{field: True}, then=Value(False)), default=Value(True))
+    with transaction.atomic():
+        updated = Blog.objects.filter(pk=pk).update(**{field: flipped, 'updated_at': now()})
+        if updated:
+            blogs_updated.send(sender=Blog, ids=[pk], fields=(field,))
+    return bool(updated)
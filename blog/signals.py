@@ -0,0 +1,172 @@
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from blog.catalogue import adjust_posts_count, invalidate_catalogue, recount_posts
+from blog.images import generate_variants_on_save
+from blog.models import Blog, Category
+from blog.page_cache import invalidate_pages
+from blog.search import reset_inverted_index
+from blog.services import adjust_site_stat, invalidate_site_stat, invalidate_random_pool, blogs_updated
+from users.models import User
+
+# Признак статьи, загруженной без полей публикации и категории
+DEFERRED = object()
+
+
+def _has_other_blogs(author_id, blog_id):
+    """Есть ли у автора другие статьи, кроме указанной"""
+    return Blog.objects.filter(author_id=author_id).exclude(pk=blog_id).exists()
+
+
+@receiver(post_init, sender=Blog)
+def remember_blog_author(sender, instance, **kwargs):
+    """Запоминаем автора статьи на момент загрузки для отслеживания его смены"""
+    instance._stats_author_id = instance.__dict__.get('author_id')
+
+
+@receiver(post_save, sender=Blog)
+def update_stats_on_blog_save(sender, instance, created, **kwargs):
+    """Обновляем счетчики статей и авторов после сохранения статьи"""
+    old_author_id = instance._stats_author_id
+    if created:
+        adjust_site_stat('total_posts', 1)
+        if not _has_other_blogs(instance.author_id, instance.pk):
+            adjust_site_stat('unique_authors', 1)
+    elif old_author_id is not None and old_author_id != instance.author_id:
+        invalidate_site_stat('unique_authors')
+    instance._stats_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=Blog)
+def update_stats_on_blog_delete(sender, instance, **kwargs):
+    """Обновляем счетчики статей и авторов после удаления статьи"""
+    adjust_site_stat('total_posts', -1)
+    if not _has_other_blogs(instance.author_id, instance.pk):
+        # При каскадном удалении сигнал приходит уже после удаления всех статей автора,
+        # поэтому счетчик авторов не уменьшаем, а пересчитываем при следующем обращении
+        invalidate_site_stat('unique_authors')
+
+
+def _counted_category_id(instance):
+    """Категория, в счетчике которой учтена статья: None - статья не опубликована"""
+    return instance.category_id if instance.is_published else None
+
+
+@receiver(post_init, sender=Blog)
+def remember_blog_category(sender, instance, **kwargs):
+    """Запоминаем категорию опубликованной статьи на момент загрузки для счетчиков статей категорий"""
+    if 'is_published' in instance.__dict__ and 'category_id' in instance.__dict__:
+        instance._counted_category_id = _counted_category_id(instance)
+    else:
+        # Статья загружена без этих полей - прежнее состояние неизвестно
+        instance._counted_category_id = DEFERRED
+
+
+@receiver(post_save, sender=Blog)
+def update_category_counts_on_blog_save(sender, instance, created, raw=False, **kwargs):
+    """Обновляем счетчики опубликованных статей категорий после публикации, снятия или смены категории"""
+    if raw:
+        return
+    old_category_id = None if created else instance._counted_category_id
+    new_category_id = _counted_category_id(instance)
+    if old_category_id is DEFERRED:
+        if new_category_id is not None:
+            recount_posts([new_category_id])
+    elif old_category_id != new_category_id:
+        if old_category_id is not None:
+            adjust_posts_count(old_category_id, -1)
+        if new_category_id is not None:
+            adjust_posts_count(new_category_id, 1)
+    instance._counted_category_id = new_category_id
+
+
+@receiver(post_delete, sender=Blog)
+def update_category_counts_on_blog_delete(sender, instance, **kwargs):
+    """Уменьшаем счетчик опубликованных статей категории после удаления статьи"""
+    if instance.is_published:
+        adjust_posts_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def reset_random_pool(sender, instance, **kwargs):
+    """Сбрасываем пул случайных статей при изменении или удалении статьи"""
+    invalidate_random_pool()
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def reset_search_index(sender, instance, **kwargs):
+    """Сбрасываем инвертированный индекс поиска при изменении или удалении статьи"""
+    reset_inverted_index()
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def reset_blog_pages(sender, instance, **kwargs):
+    """Сбрасываем закешированные списки статей и страницу самой статьи"""
+    invalidate_pages('blogs', f'blog:{instance.pk}')
+
+
+@receiver(blogs_updated)
+def reset_caches_on_bulk_update(sender, ids, fields=None, **kwargs):
+    """Сбрасываем кеши, которые при сохранении статьи сбрасывают сигналы post_save, после массового изменения"""
+    invalidate_random_pool()
+    reset_inverted_index()
+    invalidate_pages('blogs', *(f'blog:{pk}' for pk in ids))
+    if fields is None or 'is_published' in fields:
+        recount_posts(Blog.objects.filter(pk__in=ids).values('category_id'))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reset_category_pages(sender, instance, **kwargs):
+    """Сбрасываем каталог и закешированные страницы категорий"""
+    invalidate_catalogue()
+    invalidate_pages('blogs')
+
+
+@receiver(post_init, sender=Blog)
+def remember_image(sender, instance, **kwargs):
+    """Запоминаем изображение на момент загрузки, чтобы не пересоздавать копии без его замены"""
+    value = instance.__dict__.get('image')
+    instance._variants_image = value if isinstance(value, str) else None
+
+
+@receiver(post_save, sender=Blog)
+def create_image_variants(sender, instance, raw=False, **kwargs):
+    """Создаем уменьшенные копии загруженного изображения статьи"""
+    if raw or 'image' in instance.get_deferred_fields():
+        return
+    if instance.image and instance.image.name != instance._variants_image:
+        generate_variants_on_save(instance.image.name, instance.image.storage)
+    instance._variants_image = instance.image.name or None
+
+
+@receiver(post_init, sender=User)
+def remember_user_activity(sender, instance, **kwargs):
+    """Запоминаем активность пользователя на момент загрузки"""
+    instance._stats_is_active = instance.__dict__.get('is_active')
+
+
+@receiver(pre_save, sender=User)
+def reset_new_user_activity(sender, instance, **kwargs):
+    """Новый пользователь до сохранения не учитывается в счетчике активных"""
+    if instance._state.adding:
+        instance._stats_is_active = False
+
+
+@receiver(post_save, sender=User)
+def update_stats_on_user_save(sender, instance, created, **kwargs):
+    """Обновляем счетчик активных пользователей после сохранения пользователя"""
+    was_active = instance._stats_is_active
+    if was_active is not None and was_active != instance.is_active:
+        adjust_site_stat('unique_members', 1 if instance.is_active else -1)
+    instance._stats_is_active = instance.is_active
+
+
+@receiver(post_delete, sender=User)
+def update_stats_on_user_delete(sender, instance, **kwargs):
+    """Обновляем счетчик активных пользователей после удаления пользователя"""
+    if instance.is_active:
+        adjust_site_stat('unique_members', -1)
@@ -1,10 +1,30 @@
 from django import template
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from blog.images import VARIANT_FORMATS, build_srcset, has_variants
+from blog.search import render_snippet
 
 register = template.Library()
 
 
+@register.simple_tag()
+def responsive_image(image, sizes='100vw', alt='', width=None, height=None):
+    """Изображение с уменьшенными копиями WebP/JPEG в srcset, пока копий нет - оригинал"""
+    if not image:
+        return ''
+    size_attrs = format_html(' width="{}" height="{}"', width, height) if width and height else ''
+    if not has_variants(image.name, image.storage):
+        return format_html('<img src="{}" alt="{}"{} loading="lazy">', image.url, alt, size_attrs)
+    return format_html(
+        '<picture><source type="{}" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}"{} loading="lazy"></picture>',
+        VARIANT_FORMATS['webp'][1], build_srcset(image.name, 'webp', image.storage), sizes,
+        image.url, build_srcset(image.name, 'jpg', image.storage), sizes, alt, size_attrs,
+    )
+
+
 @register.filter()
-def media_filter(path):
-    if path:
-        return f'/media/{path}'
-    return '#'
+def highlight_snippet(snippet):
+    """Фрагмент найденной статьи с подсветкой совпадений"""
+    return mark_safe(render_snippet(snippet))
@@ -1,7 +1,42 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.template import Context, Template
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.test import TestCase
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from blog.catalogue import CATALOGUE_VERSION_KEY, get_catalogue, recount_posts
+from blog.benchmarks import SCENARIOS, generate_dataset, measure, find_regressions
+from blog.dumps import detect_encoding, iter_json_array, load_dump
+from blog.images import variant_name
 from blog.models import Category, Blog
-from users.models import User
+from blog.page_cache import get_page_cache_stats
+from blog.pagination import CursorPaginator
+from blog.search import INDEX_VERSION_KEY, InvertedIndex, highlight, render_snippet, search_blogs
+from blog.services import register_view, get_pending_views, flush_views, get_site_stats, reconcile_site_stats, \
+    get_random_posts, build_random_pool, moderate_blogs, toggle_blog_field
+from config.admin import EstimatedCountPaginator
+from config.db import connection_settings
+from config.metrics import JsonFormatter, buffer as metrics_buffer
+from config.middleware import RequestMetricsMiddleware
+from users.models import User, SmsOutbox
 
 
 class CategoryTests(TestCase):
@@ -72,15 +107,1007 @@ class BlogModelTests(TestCase):
         self.assertIsNotNone(self.blog.created_at)
         self.assertLessEqual(self.blog.created_at, self.blog.updated_at)
 
+    def test_blog_excerpt(self):
+        """Тест на обновление анонса при сохранении статьи."""
+        self.assertEqual(self.blog.excerpt, 'Test Content')
+        self.blog.content = 'x' * 500
+        self.blog.save(update_fields=['content'])
+        self.blog.refresh_from_db()
+        self.assertEqual(len(self.blog.excerpt), 200)
+        self.assertTrue(self.blog.excerpt.endswith('…'))
+
+    def test_for_listing_defers_content(self):
+        """Тест на то, что списки не загружают полный текст статьи."""
+        blog = Blog.objects.for_listing().get(pk=self.blog.pk)
+        self.assertIn('content', blog.get_deferred_fields())
+        with self.assertNumQueries(0):
+            self.assertEqual(blog.author.name, 'Test User')
+            self.assertEqual(blog.category.name, 'Test Category')
+
     def test_blog_str(self):
         """Тест на строковое представление блога."""
         self.assertEqual(str(self.blog), 'Test Blog')
 
 
+@override_settings(VIEWS_FLUSH_THRESHOLD=1000, VIEWS_FLUSH_INTERVAL=3600)
+class ViewsCounterTests(TestCase):
+    """Тесты для буфера просмотров статей."""
+
+    def setUp(self):
+        cache.clear()
+        caches['counters'].clear()
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.category = Category.objects.create(name='Test Category')
+        self.blog1 = Blog.objects.create(title='Blog 1', content='Content', author=self.user, category=self.category)
+        self.blog2 = Blog.objects.create(title='Blog 2', content='Content', author=self.user, category=self.category)
+
+    def test_views_are_buffered(self):
+        """Тест на накопление просмотров без записи в БД"""
+        register_view(self.blog1.pk)
+        register_view(self.blog1.pk)
+        self.assertEqual(get_pending_views(self.blog1.pk), 2)
+        self.blog1.refresh_from_db()
+        self.assertEqual(self.blog1.views_count, 0)
+
+    def test_flush_views(self):
+        """Тест на запись накопленных просмотров в БД"""
+        for _ in range(3):
+            register_view(self.blog1.pk)
+        register_view(self.blog2.pk)
+        self.assertEqual(flush_views(), 4)
+        self.blog1.refresh_from_db()
+        self.blog2.refresh_from_db()
+        self.assertEqual(self.blog1.views_count, 3)
+        self.assertEqual(self.blog2.views_count, 1)
+        self.assertEqual(get_pending_views(self.blog1.pk), 0)
+        self.assertEqual(flush_views(), 0)
+
+    def test_views_after_flush_are_queued_again(self):
+        """Тест на повторную постановку статьи в очередь после записи"""
+        register_view(self.blog1.pk)
+        flush_views()
+        register_view(self.blog1.pk)
+        flush_views()
+        self.blog1.refresh_from_db()
+        self.assertEqual(self.blog1.views_count, 2)
+
+    def test_flush_between_slot_and_blog_id(self):
+        """Тест на просмотры статьи, очередь которой записывается во время сброса буфера"""
+        register_view(self.blog1.pk)
+        # Номер слота уже выдан, но ID статьи в слот еще не записан
+        counters = caches['counters']
+        slot = counters.incr('blog:views:slots')
+        counters.set(f'blog:views:{self.blog2.pk}', 2, None)
+        self.assertEqual(flush_views(), 1)
+        counters.set(f'blog:views:slot:{slot}', self.blog2.pk, None)
+        self.assertEqual(flush_views(), 2)
+        self.blog2.refresh_from_db()
+        self.assertEqual(self.blog2.views_count, 2)
+
+    def test_buffer_survives_cache_culling(self):
+        """Тест на то, что вытеснение записей основного кеша не затрагивает буфер просмотров"""
+        register_view(self.blog1.pk)
+        for i in range(400):
+            cache.set(f'unrelated:{i}', i)
+        self.assertEqual(flush_views(), 1)
+
+    @override_settings(VIEWS_FLUSH_THRESHOLD=2)
+    def test_flush_on_threshold(self):
+        """Тест на автоматическую запись по достижении порога"""
+        register_view(self.blog1.pk)
+        register_view(self.blog2.pk)
+        self.blog1.refresh_from_db()
+        self.assertEqual(self.blog1.views_count, 1)
+        self.assertEqual(get_pending_views(self.blog1.pk), 0)
+
+
+class SiteStatsTests(TestCase):
+    """Тесты для статистики сайта на главной странице."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.category = Category.objects.create(name='Test Category')
+        Blog.objects.create(title='Blog 1', content='Content', author=self.user, category=self.category)
+        reconcile_site_stats()
+
+    def test_stats_are_maintained_by_signals(self):
+        """Тест на обновление счетчиков при создании и удалении записей"""
+        author = User.objects.create(phone='+71234567891', name='Author')
+        blog = Blog.objects.create(title='Blog 2', content='Content', author=author, category=self.category)
+        Blog.objects.create(title='Blog 3', content='Content', author=author, category=self.category)
+        self.assertEqual(get_site_stats(), {'total_posts': 3, 'unique_authors': 2, 'unique_members': 2})
+
+        blog.delete()
+        self.assertEqual(get_site_stats(), {'total_posts': 2, 'unique_authors': 2, 'unique_members': 2})
+
+        author.delete()
+        self.assertEqual(get_site_stats(), {'total_posts': 1, 'unique_authors': 1, 'unique_members': 1})
+
+    def test_active_members_follow_activation(self):
+        """Тест на учет только активных пользователей"""
+        user = User.objects.create(phone='+71234567891', name='New User', is_active=False)
+        self.assertEqual(get_site_stats()['unique_members'], 1)
+        user.is_active = True
+        user.save()
+        self.assertEqual(get_site_stats()['unique_members'], 2)
+
+    def test_index_view_without_aggregate_queries(self):
+        """Тест на то, что главная страница берет статистику из кеша"""
+        get_site_stats()
+        get_random_posts(4)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('blog:index'))
+        self.assertEqual(response.context['total_posts'], 1)
+        self.assertEqual(response.context['unique_authors'], 1)
+
+
+class RandomPostsTests(TestCase):
+    """Тесты для пула случайных статей."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.category = Category.objects.create(name='Test Category')
+        self.published = [
+            Blog.objects.create(title=f'Blog {i}', content='Content', author=self.user, category=self.category)
+            for i in range(6)
+        ]
+        self.unpublished = Blog.objects.create(title='Draft', content='Content', author=self.user,
+                                               category=self.category, is_published=False)
+
+    def test_pool_contains_only_published(self):
+        """Тест на то, что в пул попадают только опубликованные статьи"""
+        pool = build_random_pool(100)
+        self.assertCountEqual(pool, [blog.pk for blog in self.published])
+
+    def test_random_posts(self):
+        """Тест на выборку случайных статей из пула"""
+        posts = get_random_posts(4)
+        self.assertEqual(len(posts), 4)
+        self.assertEqual(len({post.pk for post in posts}), 4)
+        self.assertNotIn(self.unpublished, posts)
+
+    def test_pool_is_cached(self):
+        """Тест на то, что повторная выборка обходится одним запросом"""
+        get_random_posts(4)
+        with self.assertNumQueries(1):
+            get_random_posts(4)
+
+    def test_pool_is_reset_on_unpublish(self):
+        """Тест на сброс пула при снятии статьи с публикации"""
+        get_random_posts(4)
+        for blog in self.published[1:]:
+            blog.is_published = False
+            blog.save()
+        self.assertEqual(get_random_posts(4), [self.published[0]])
+
+
+class CursorPaginationTests(TestCase):
+    """Тесты для курсорной пагинации."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.category = Category.objects.create(name='Test Category')
+        self.blogs = [
+            Blog.objects.create(title=f'Blog {i}', content='Content', author=self.user, category=self.category)
+            for i in range(5)
+        ]
+        # Одинаковая дата создания у части статей проверяет упорядочивание по ID
+        Blog.objects.filter(pk__in=[blog.pk for blog in self.blogs[:3]]).update(created_at=self.blogs[0].created_at)
+        self.expected = list(Blog.objects.order_by('-created_at', '-id'))
+
+    def test_pages_forward_and_backward(self):
+        """Тест на переходы по курсорам вперед и назад"""
+        paginator = CursorPaginator(Blog.objects.all(), 2)
+        first = paginator.page()
+        self.assertEqual(first.object_list, self.expected[:2])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(second.object_list, self.expected[2:4])
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(third.object_list, self.expected[4:])
+        self.assertFalse(third.has_next())
+
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual(back.object_list, self.expected[2:4])
+        self.assertEqual(paginator.page(back.previous_cursor).object_list, self.expected[:2])
+
+    def test_slice_bounded_by_index(self):
+        """Тест на границу по created_at в запросе страницы, по которой индекс начинает просмотр с курсора"""
+        paginator = CursorPaginator(Blog.objects.all(), 2)
+        first = paginator.page()
+        queryset, _ = paginator.get_slice(first.next_cursor)
+        self.assertIn('"blog_blog"."created_at" <= ', str(queryset.query))
+        queryset, _ = paginator.get_slice(paginator.page(first.next_cursor).previous_cursor)
+        self.assertIn('"blog_blog"."created_at" >= ', str(queryset.query))
+
+    @override_settings(BLOG_PAGINATION_MODE='cursor')
+    def test_blog_list_cursor_mode(self):
+        """Тест на список статей в режиме курсорной пагинации без COUNT(*)"""
+        for i in range(5, 12):
+            Blog.objects.create(title=f'Blog {i}', content='Content', author=self.user, category=self.category)
+        self.expected = list(Blog.objects.order_by('-created_at', '-id'))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('blog:blog_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '?cursor=')
+        response = self.client.get(reverse('blog:blog_list'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(list(response.context['object_list']), self.expected[9:])
+
+    @override_settings(BLOG_PAGINATION_MODE='cursor')
+    def test_invalid_cursor(self):
+        """Тест на ответ 404 при неверном курсоре"""
+        response = self.client.get(reverse('blog:blog_list'), {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+
+class InvertedIndexTests(TestCase):
+    """Тесты для инвертированного индекса поиска."""
+
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.add(1, 10, 'Путешествие по Турции', 'Рассказ о горах и морях')
+        self.index.add(2, 20, 'Изучение языков', 'Как выучить английский язык за год')
+        self.index.add(3, 10, 'Горы Кавказа', 'Походы в горы летом')
+
+    def test_search_matches_word_forms(self):
+        """Тест на поиск по разным формам слова"""
+        self.assertEqual([blog_id for blog_id, _ in self.index.search('язык')], [2])
+        self.assertCountEqual([blog_id for blog_id, _ in self.index.search('горы')], [1, 3])
+
+    def test_title_ranks_higher(self):
+        """Тест на более высокий ранг совпадений в заголовке"""
+        self.assertEqual(self.index.search('горы')[0][0], 3)
+
+    def test_all_terms_required(self):
+        """Тест на то, что статья должна содержать все слова запроса"""
+        self.assertEqual([blog_id for blog_id, _ in self.index.search('горы турции')], [1])
+
+    def test_category_filter(self):
+        """Тест на фильтрацию по категории"""
+        self.assertEqual(self.index.search('язык', category_id=10), [])
+
+    def test_highlight_is_escaped(self):
+        """Тест на подсветку совпадений и экранирование HTML во фрагменте"""
+        snippet = render_snippet(highlight('<b>Горы</b> и море', {'гор'}))
+        self.assertEqual(snippet, '<mark>&lt;b&gt;Горы&lt;/b&gt;</mark> и море')
+
+
+class SearchViewTests(TestCase):
+    """Тесты для страницы поиска."""
+
+    def setUp(self):
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.travel = Category.objects.create(name='Travel')
+        self.languages = Category.objects.create(name='Languages')
+        self.free = Blog.objects.create(title='Горы Кавказа', content='Походы в горы летом', author=self.user,
+                                        category=self.travel)
+        self.paid = Blog.objects.create(title='Секретные горы', content='Платный текст про горы', author=self.user,
+                                        category=self.languages, is_subscribed=True)
+        Blog.objects.create(title='Черновик про горы', content='Горы', author=self.user, category=self.travel,
+                            is_published=False)
+
+    def test_search_results(self):
+        """Тест на поиск только по опубликованным статьям"""
+        response = self.client.get(reverse('blog:search'), {'q': 'горы'})
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual(response.context['results'], [self.free, self.paid])
+        self.assertContains(response, '<mark>горы</mark>')
+        self.assertNotContains(response, 'Черновик')
+
+    def test_search_by_category(self):
+        """Тест на фильтрацию результатов по категории"""
+        response = self.client.get(reverse('blog:search'), {'q': 'горы', 'category': self.travel.pk})
+        self.assertEqual(list(response.context['results']), [self.free])
+
+    def test_paid_snippet_uses_excerpt(self):
+        """Тест на то, что фрагмент платной статьи берется из анонса"""
+        self.paid.content = 'Вступление. ' + 'слово ' * 100 + 'горы в самом конце'
+        self.paid.save()
+        result = search_blogs('горы', category_id=self.languages.pk)[0]
+        self.assertEqual(result, self.paid)
+        self.assertNotIn('конце', result.snippet)
+
+    def test_paid_content_not_indexed(self):
+        """Тест на то, что платная статья не находится по словам закрытого текста"""
+        self.paid.content = 'Вступление. ' + 'слово ' * 100 + 'горы в самом конце'
+        self.paid.save()
+        self.assertEqual(len(search_blogs('конце')), 0)
+        self.assertEqual(list(search_blogs('вступление')), [self.paid])
+
+    def test_index_rebuilt_on_version_change(self):
+        """Тест на перестроение индекса процесса после смены версии другим процессом"""
+        self.assertEqual(len(search_blogs('озера')), 0)
+        Blog.objects.filter(pk=self.free.pk).update(title='Горные озера')
+        self.assertEqual(len(search_blogs('озера')), 0)
+        # Другой процесс изменил статью и сменил версию индекса в общем кеше
+        cache.set(INDEX_VERSION_KEY, 'other', None)
+        self.assertEqual(list(search_blogs('озера')), [self.free])
+
+    def test_empty_query(self):
+        """Тест на пустой поисковый запрос"""
+        response = self.client.get(reverse('blog:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['results']), [])
+
+
+class PageCacheTests(TestCase):
+    """Тесты для кеширования страниц анонимным пользователям."""
+
+    def setUp(self):
+        cache.clear()
+        caches['counters'].clear()
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.category = Category.objects.create(name='Test Category')
+        self.blog = Blog.objects.create(title='Cached Blog', content='Content', author=self.user,
+                                        category=self.category)
+
+    def test_anonymous_page_served_from_cache(self):
+        """Тест на отдачу повторного запроса из кеша без обращений к БД"""
+        first = self.client.get(reverse('blog:blog_list'))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('blog:blog_list'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(get_page_cache_stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_page_number_is_part_of_key(self):
+        """Тест на раздельное кеширование страниц списка"""
+        self.client.get(reverse('blog:blog_list'))
+        self.client.get(reverse('blog:blog_list'), {'page': 1})
+        self.assertEqual(get_page_cache_stats()['misses'], 2)
+
+    def test_blog_save_invalidates_pages(self):
+        """Тест на сброс кеша списка и страницы статьи при ее изменении"""
+        self.client.get(reverse('blog:blog_list'))
+        self.client.get(reverse('blog:detail', args=[self.blog.pk]))
+        self.blog.title = 'Renamed Blog'
+        self.blog.save()
+        self.assertContains(self.client.get(reverse('blog:blog_list')), 'Renamed Blog')
+        self.assertContains(self.client.get(reverse('blog:detail', args=[self.blog.pk])), 'Renamed Blog')
+
+    def test_other_blog_detail_stays_cached(self):
+        """Тест на то, что изменение одной статьи не сбрасывает страницы других статей"""
+        other = Blog.objects.create(title='Other', content='Content', author=self.user, category=self.category)
+        self.client.get(reverse('blog:detail', args=[self.blog.pk]))
+        other.save()
+        self.client.get(reverse('blog:detail', args=[self.blog.pk]))
+        self.assertEqual(get_page_cache_stats()['hits'], 1)
+
+    def test_category_save_invalidates_category_list(self):
+        """Тест на сброс кеша списка категорий при изменении категории"""
+        self.client.get(reverse('blog:category_list'))
+        Category.objects.create(name='New Category')
+        self.assertContains(self.client.get(reverse('blog:category_list')), 'New Category')
+
+    def test_cached_detail_counts_views(self):
+        """Тест на учет просмотров при отдаче статьи из кеша"""
+        self.client.get(reverse('blog:detail', args=[self.blog.pk]))
+        self.client.get(reverse('blog:detail', args=[self.blog.pk]))
+        self.assertEqual(get_pending_views(self.blog.pk), 2)
+
+    def test_cached_detail_shows_current_views_count(self):
+        """Тест на актуальное число просмотров в странице статьи из кеша, в том числе после записи в БД"""
+        url = reverse('blog:detail', args=[self.blog.pk])
+        self.assertContains(self.client.get(url), '<span class="views-count">1</span>')
+        self.assertContains(self.client.get(url), '<span class="views-count">2</span>')
+        self.assertEqual(get_page_cache_stats()['hits'], 1)
+        flush_views()
+        self.assertContains(self.client.get(url), '<span class="views-count">3</span>')
+
+    def test_list_card_shows_current_views_count(self):
+        """Тест на число просмотров в карточке списка вне кешируемых фрагментов"""
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('blog:blog_list')), 'Количество просмотров 0')
+        Blog.objects.filter(pk=self.blog.pk).update(views_count=5)
+        self.assertContains(self.client.get(reverse('blog:blog_list')), 'Количество просмотров 5')
+
+    def test_authenticated_pages_are_not_cached(self):
+        """Тест на то, что страницы авторизованных пользователей не кешируются целиком"""
+        self.client.force_login(self.user)
+        self.client.get(reverse('blog:blog_list'))
+        self.client.get(reverse('blog:blog_list'))
+        self.assertEqual(get_page_cache_stats()['hits'], 0)
+
+
+def make_image(name='photo.png', size=(1200, 800)):
+    """Загружаемое изображение указанного размера"""
+    buffer = BytesIO()
+    Image.new('RGBA', size, (255, 0, 0, 128)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ResponsiveImageTests(TestCase):
+    """Тесты уменьшенных копий изображений."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, RESPONSIVE_IMAGE_WIDTHS=[320, 640])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.category = Category.objects.create(name='Test Category')
+
+    def test_variants_created_on_upload(self):
+        """Тест на создание копий всех ширин и форматов при загрузке изображения"""
+        blog = Blog.objects.create(title='Test Blog', content='Test Content', author=self.user,
+                                   category=self.category, image=make_image())
+        for width in (320, 640):
+            for extension, image_format in (('webp', 'WEBP'), ('jpg', 'JPEG')):
+                with default_storage.open(variant_name(blog.image.name, width, extension)) as file:
+                    image = Image.open(file)
+                    self.assertEqual(image.format, image_format)
+                    self.assertEqual(image.width, width)
+
+    def test_small_image_not_upscaled(self):
+        """Тест на то, что маленькое изображение не увеличивается"""
+        self.user.avatar = make_image('avatar.png', size=(100, 100))
+        self.user.save()
+        with default_storage.open(variant_name(self.user.avatar.name, 640, 'jpg')) as file:
+            self.assertEqual(Image.open(file).size, (100, 100))
+
+    def test_responsive_image_tag(self):
+        """Тест на вывод srcset для изображения с копиями и оригинала для изображения без копий"""
+        blog = Blog.objects.create(title='Test Blog', content='Test Content', author=self.user,
+                                   category=self.category, image=make_image())
+        template = Template('{% load my_tags %}{% responsive_image image sizes="250px" %}')
+        html = template.render(Context({'image': blog.image}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f'{default_storage.url(variant_name(blog.image.name, 320, "webp"))} 320w', html)
+        self.assertIn(f'{default_storage.url(variant_name(blog.image.name, 640, "jpg"))} 640w', html)
+
+        name = default_storage.save('blog/plain.png', make_image())
+        Blog.objects.filter(pk=blog.pk).update(image=name)
+        blog.refresh_from_db()
+        html = template.render(Context({'image': blog.image}))
+        self.assertNotIn('srcset', html)
+        self.assertIn(f'src="{blog.image.url}"', html)
+
+    def test_broken_image_does_not_fail_save(self):
+        """Тест на сохранение модели с изображением, которое не удается обработать"""
+        with self.assertLogs('blog.images', 'ERROR'):
+            self.user.avatar = SimpleUploadedFile('avatar.png', b'not an image')
+            self.user.save()
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exclude(avatar='').exists())
+        with patch('blog.images.generate_variants', side_effect=Image.DecompressionBombError('bomb')), \
+                self.assertLogs('blog.images', 'ERROR'):
+            Blog.objects.create(title='Test Blog', content='Test Content', author=self.user,
+                                category=self.category, image=make_image())
+
+    def test_generate_thumbnails_command(self):
+        """Тест на создание копий для ранее загруженных изображений"""
+        name = default_storage.save('blog/plain.png', make_image())
+        Blog.objects.create(title='Test Blog', content='Test Content', author=self.user,
+                            category=self.category, image=name)
+        self.assertFalse(default_storage.exists(variant_name(name, 320, 'webp')))
+        call_command('generate_thumbnails', workers=2, stdout=StringIO())
+        self.assertTrue(default_storage.exists(variant_name(name, 640, 'jpg')))
+
+
+class DumpLoaderTests(TestCase):
+    """Тесты потоковой загрузки выгрузок."""
+
+    def test_iter_json_array(self):
+        """Тест на разбор массива фрагментами меньше одного элемента"""
+        stream = StringIO(' [ {"a": "x, ]"}, {"b": [1, 2]} ,\n{"c": {}} ] ')
+        self.assertEqual(list(iter_json_array(stream, read_size=3)), [{'a': 'x, ]'}, {'b': [1, 2]}, {'c': {}}])
+
+    def test_iter_json_array_truncated(self):
+        """Тест на ошибку при обрезанной выгрузке"""
+        with self.assertRaises(ValueError):
+            list(iter_json_array(StringIO('[{"a": 1}, {"b"'), read_size=4))
+
+    def test_detect_encoding(self):
+        """Тест на определение кодировки по BOM"""
+        self.assertEqual(detect_encoding('data_json/blog_data.json'), 'utf-16')
+        with tempfile.NamedTemporaryFile(suffix='.json') as file:
+            file.write('[]'.encode('utf-8-sig'))
+            file.flush()
+            self.assertEqual(detect_encoding(file.name), 'utf-8-sig')
+
+    def test_load_dump(self):
+        """Тест на загрузку выгрузок пачками без сигналов с сохранением дат и анонсов"""
+        users = load_dump('data_json/users_data.json', batch_size=2)
+        blogs = load_dump('data_json/blog_data.json', batch_size=3)
+        self.assertEqual(users['users.User'], User.objects.count())
+        self.assertEqual(blogs['blog.Blog'], Blog.objects.count())
+        # Загрузка идет без сигналов и не ставит SMS с кодами в очередь
+        self.assertFalse(SmsOutbox.objects.exists())
+        blog = Blog.objects.order_by('pk').first()
+        self.assertNotEqual(blog.created_at.date(), blog.updated_at.date())
+        self.assertEqual(blog.excerpt, Blog.make_excerpt(blog.content))
+        self.assertEqual(get_site_stats()['total_posts'], Blog.objects.count())
+        # Последовательности сброшены - новые записи не конфликтуют с загруженными ID
+        self.assertGreater(Category.objects.create(name='New').pk, Category.objects.exclude(name='New').latest('pk').pk)
+
+
+class ApiTests(TestCase):
+    """Тесты API статей и категорий."""
+
+    def setUp(self):
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.category = Category.objects.create(name='Test Category')
+        self.free = Blog.objects.create(title='Free', content='Free content', author=self.user,
+                                        category=self.category)
+        self.paid = Blog.objects.create(title='Paid', content='Paid content', author=self.user,
+                                        category=self.category, is_subscribed=True)
+
+    def test_blog_list(self):
+        """Тест на список статей с курсорной пагинацией"""
+        response = self.client.get(reverse('api:blog_list'), {'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([blog['id'] for blog in data['results']], [self.paid.pk])
+        self.assertNotIn('content', data['results'][0])
+        response = self.client.get(data['next'])
+        self.assertEqual([blog['id'] for blog in response.json()['results']], [self.free.pk])
+
+    def test_blog_list_invalid_category(self):
+        """Тест на ошибку при неверном фильтре категории"""
+        response = self.client.get(reverse('api:blog_list'), {'category': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_paid_blog_detail(self):
+        """Тест на скрытие текста платной статьи от пользователя без подписки"""
+        url = reverse('api:blog_detail', args=[self.paid.pk])
+        data = self.client.get(url).json()
+        self.assertTrue(data['is_locked'])
+        self.assertIsNone(data['content'])
+
+        self.user.is_subscribed = True
+        self.user.save()
+        token = str(RefreshToken.for_user(self.user).access_token)
+        data = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}').json()
+        self.assertFalse(data['is_locked'])
+        self.assertEqual(data['content'], 'Paid content')
+
+    def test_conditional_get(self):
+        """Тест на ответ 304 для неизмененной статьи и 200 после изменения"""
+        url = reverse('api:blog_detail', args=[self.free.pk])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.free.title = 'Changed'
+        self.free.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_changes_on_unpublish(self):
+        """Тест на ответ 304 без запросов к базе и смену ETag списка при снятии статьи с публикации и удалении"""
+        url = reverse('api:blog_list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        moderate_blogs([self.free.pk], 'unpublish')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.paid.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        # После очистки кеша версия создается заново и не совпадает с прежней
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_category_list(self):
+        """Тест на список категорий"""
+        response = self.client.get(reverse('api:category_list'))
+        self.assertEqual(response.json(), [{'id': self.category.pk, 'name': 'Test Category'}])
+        self.assertEqual(self.client.get(reverse('api:category_list'),
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class ConnectionSettingsTests(TestCase):
+    """Тесты режимов подключения к базе данных."""
+
+    def test_modes(self):
+        """Тест на параметры постоянных подключений и пула"""
+        self.assertEqual(connection_settings('none')['CONN_MAX_AGE'], 0)
+        persistent = connection_settings('persistent', max_age=120)
+        self.assertEqual((persistent['CONN_MAX_AGE'], persistent['CONN_HEALTH_CHECKS']), (120, True))
+        with patch('config.db.find_spec', return_value=object()):
+            pool = connection_settings('pool', pool_min_size=1, pool_max_size=4)
+        self.assertEqual(pool['CONN_MAX_AGE'], 0)
+        self.assertEqual(pool['OPTIONS']['pool'], {'min_size': 1, 'max_size': 4, 'timeout': 10})
+
+    def test_pool_without_psycopg3(self):
+        """Тест на понятную ошибку настройки пула без драйвера psycopg 3"""
+        with patch('config.db.find_spec', return_value=None), \
+                self.assertRaisesMessage(ImproperlyConfigured, 'psycopg[binary,pool]'):
+            connection_settings('pool')
+
+    def test_unknown_mode(self):
+        """Тест на ошибку настройки при неизвестном режиме"""
+        with self.assertRaises(ImproperlyConfigured):
+            connection_settings('pgbouncer')
+
+
+class SettingsTests(TestCase):
+    """Тесты значений настроек по умолчанию."""
+
+    def run_settings(self, env, *names):
+        """Загрузка настроек и конфигурации gunicorn в отдельном процессе с переменными окружения env"""
+        code = ('import json, runpy, config.settings as s; g = runpy.run_path("gunicorn.conf.py"); '
+                f'print(json.dumps([g[name] if name in g else getattr(s, name) for name in {list(names)!r}]))')
+        return subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                              env={**os.environ, **env})
+
+    def load_settings(self, env, *names):
+        """Значения настроек и конфигурации gunicorn (workers и т.п.), загруженные с переменными окружения env"""
+        result = self.run_settings(env, *names)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return json.loads(result.stdout)
+
+    def test_blank_env_sample_keys_use_defaults(self):
+        """Тест на загрузку настроек и конфигурации gunicorn, когда все ключи .env.sample пустые"""
+        with open(settings.BASE_DIR / '.env.sample', encoding='utf-8') as file:
+            keys = [line.split('=', 1)[0] for line in file if '=' in line]
+        values = self.load_settings(dict.fromkeys(keys, ''), 'VIEWS_FLUSH_THRESHOLD', 'RESPONSIVE_IMAGE_WIDTHS',
+                                    'CACHES')
+        self.assertEqual(values[:2], [100, [320, 640, 1024]])
+        self.assertEqual(values[2]['default']['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+
+    def test_defaults_depend_on_shared_cache(self):
+        """Тест на хранилище кодов подтверждения и доверие утверждениям токена в зависимости от кеша"""
+        names = ('SHARED_CACHE', 'OTP_STORE', 'JWT_TRUST_CLAIMS')
+        local = self.load_settings({'CACHE_BACKEND': '', 'OTP_STORE': '', 'JWT_TRUST_CLAIMS': ''}, *names)
+        self.assertEqual(local, [False, 'users.otp.DatabaseOTPStore', False])
+        shared = self.load_settings({'CACHE_BACKEND': 'django.core.cache.backends.redis.RedisCache', 'OTP_STORE': '',
+                                     'JWT_TRUST_CLAIMS': ''}, *names)
+        self.assertEqual(shared, [True, 'users.otp.CacheOTPStore', True])
+        memcached = self.load_settings({'CACHE_BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+                                        'JWT_TRUST_CLAIMS': 'True'}, 'JWT_TRUST_CLAIMS')
+        self.assertEqual(memcached, [False])
+
+    def test_gunicorn_workers_need_shared_cache(self):
+        """Тест на один воркер gunicorn по умолчанию при кеше процесса и отказ запускать несколько"""
+        self.assertEqual(self.load_settings({'CACHE_BACKEND': '', 'WEB_CONCURRENCY': ''}, 'workers'), [1])
+        result = self.run_settings({'CACHE_BACKEND': '', 'WEB_CONCURRENCY': '3'}, 'workers')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('WEB_CONCURRENCY=3', result.stderr)
+        shared = self.load_settings({'CACHE_BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                     'WEB_CONCURRENCY': '3'}, 'workers')
+        self.assertEqual(shared, [3])
+
+
+class BenchmarkTests(TestCase):
+    """Тесты набора замеров страниц."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_measure(self):
+        """Тест на замер страницы на синтетических данных"""
+        dataset = generate_dataset(30, authors=3, categories=2, batch_size=10)
+        self.assertEqual(Blog.objects.count(), 30)
+        scenario = next(scenario for scenario in SCENARIOS if scenario.name == 'blog:blog_list')
+        result = measure(self.client, dataset, scenario, repeat=3, warmup=1)
+        self.assertEqual(result['status'], 200)
+        self.assertGreater(result['queries'], 0)
+        self.assertLessEqual(result['p50'], result['p95'])
+
+    def test_find_regressions(self):
+        """Тест на сравнение числа запросов с базовыми значениями"""
+        results = {'a': {'queries': 3}, 'b': {'queries': 5}, 'c': {'queries': 1}}
+        self.assertEqual(find_regressions(results, {'a': 3, 'b': 4}), [('b', 4, 5)])
+
+    def test_command(self):
+        """Тест на ошибку команды при росте числа запросов"""
+        baseline = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, baseline, ignore_errors=True)
+        baseline += '/baseline.json'
+        with open(baseline, 'w', encoding='utf-8') as file:
+            json.dump({'queries': {'blog:contacts': 0}}, file)
+        with self.assertRaisesMessage(CommandError, 'blog:contacts'):
+            call_command('benchmark_views', posts=10, repeat=1, warmup=0, only=['blog:contacts'],
+                         baseline=baseline, stdout=StringIO())
+        self.assertFalse(Blog.objects.exists())
+
+
+class RequestMetricsTests(TestCase):
+    """Тесты метрик запросов."""
+
+    def setUp(self):
+        cache.clear()
+        metrics_buffer.flush()
+        cache.clear()
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.category = Category.objects.create(name='Category')
+        Blog.objects.create(title='Title', content='Content', author=self.user, category=self.category,
+                            is_published=True)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        """Тест на показатели запроса страницы в формате Prometheus"""
+        self.client.get(reverse('blog:blog_list'))
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        lines = dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines()
+                     if not line.startswith('#'))
+        self.assertEqual(lines['http_requests_total{view="blog:blog_list",method="GET",status="200"}'], '1')
+        self.assertEqual(lines['http_request_duration_seconds_bucket{le="+Inf",view="blog:blog_list"}'], '1')
+        self.assertGreater(int(lines['db_queries_total{view="blog:blog_list"}']), 0)
+        self.assertGreater(float(lines['template_render_duration_seconds_total{view="blog:blog_list"}']), 0)
+        self.assertGreater(int(lines['http_response_size_bytes_total{view="blog:blog_list"}']), 0)
+        self.assertNotIn('view="metrics"', response.content.decode())
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_access(self):
+        """Тест на доступ к метрикам только по токену или с явно разрешенных адресов"""
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 404)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.1']):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code, 200)
+
+    @override_settings(METRICS_DETECT_N_PLUS_ONE=True, METRICS_N_PLUS_ONE_THRESHOLD=2)
+    def test_n_plus_one(self):
+        """Тест на отметку повторяющегося SQL и запись запроса в журнал JSON"""
+        def get_response(request):
+            for pk in range(3):
+                User.objects.filter(pk=pk).exists()
+            return HttpResponse('ok')
+
+        middleware = RequestMetricsMiddleware(get_response)
+        with self.assertLogs('config.requests', 'INFO') as logs:
+            middleware(RequestFactory().get('/n-plus-one/'))
+        warning, info = logs.records
+        self.assertEqual(warning.count, 3)
+        self.assertIn('FROM "users_user"', warning.sql)
+        record = json.loads(JsonFormatter().format(info))
+        self.assertEqual((record['db_queries'], record['response_bytes'], record['view']), (3, 2, 'unmatched'))
+
+
+class AsyncViewsTests(TestCase):
+    """Тесты асинхронных контроллеров чтения под ASGI."""
+
+    def setUp(self):
+        cache.clear()
+        caches['counters'].clear()
+        self.user = User.objects.create(phone='+71234567890', name='Test User', is_subscribed=True)
+        self.category = Category.objects.create(name='Category')
+        self.blog = Blog.objects.create(title='Async Title', content='Content', author=self.user,
+                                        category=self.category, is_published=True)
+
+    async def test_read_views(self):
+        """Тест на страницы чтения без синхронных запросов к базе из цикла событий"""
+        await self.async_client.aforce_login(self.user)
+        urls = [
+            reverse('blog:index'),
+            reverse('blog:blog_list'),
+            reverse('blog:detail', args=[self.blog.pk]),
+            reverse('blog:category_detail', args=[self.category.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Async Title')
+
+    async def test_anonymous_page_cache(self):
+        """Тест на отдачу страницы из кеша асинхронным контроллером"""
+        url = reverse('blog:detail', args=[self.blog.pk])
+        await self.async_client.get(url)
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'Async Title')
+        self.assertEqual(get_page_cache_stats()['hits'], 1)
+        self.assertEqual(get_pending_views(self.blog.pk), 2)
+
+    async def test_missing_pages(self):
+        """Тест на ответ 404 для несуществующих статьи, категории и страницы списка"""
+        for url in [reverse('blog:detail', args=[0]), reverse('blog:category_detail', args=[0]),
+                    reverse('blog:blog_list') + '?page=100']:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 404)
+
+
+class ModerationTests(TestCase):
+    """Тесты модерации статей."""
+
+    def setUp(self):
+        cache.clear()
+        self.moderator = User.objects.create(phone='+79161234567', name='Moderator')
+        self.moderator.user_permissions.add(Permission.objects.get(codename='can_change_blog'))
+        self.category = Category.objects.create(name='Category')
+        self.blogs = [Blog.objects.create(title=f'Post {i}', content='Content', author=self.moderator,
+                                          category=self.category) for i in range(3)]
+        self.client.force_login(self.moderator)
+
+    def test_moderate_blogs_single_update(self):
+        """Тест на массовое действие одним запросом UPDATE и сброс кеша страниц"""
+        ids = [blog.pk for blog in self.blogs]
+        self.client.logout()
+        self.client.get(reverse('blog:blog_list'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(moderate_blogs(ids, 'unpublish'), 3)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "blog_blog"')]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(Blog.objects.filter(is_published=True).exists())
+        self.assertEqual(moderate_blogs(ids, 'unpublish'), 0)
+        response = self.client.get(reverse('blog:blog_list'))
+        self.assertNotContains(response, 'Post 0')
+
+    def test_list_filters_and_bulk_action(self):
+        """Тест на фильтры списка модерации и массовое действие формой"""
+        Blog.objects.filter(pk=self.blogs[0].pk).update(is_subscribed=True)
+        response = self.client.get(reverse('blog:toggle'), {'access': 'paid'})
+        self.assertEqual(list(response.context['object_list']), [self.blogs[0]])
+
+        url = reverse('blog:toggle') + '?q=Post'
+        response = self.client.post(url, {'action': 'paywall', 'ids': [self.blogs[1].pk, self.blogs[2].pk]})
+        self.assertRedirects(response, url)
+        self.assertEqual(Blog.objects.filter(is_subscribed=True).count(), 3)
+
+    def test_toggle_activity(self):
+        """Тест на переключение публикации статьи и возврат к странице модерации"""
+        response = self.client.post(reverse('blog:toggle_activity', args=[self.blogs[0].pk]))
+        self.assertRedirects(response, reverse('blog:toggle'))
+        self.blogs[0].refresh_from_db()
+        self.assertFalse(self.blogs[0].is_published)
+        self.assertEqual(self.client.post(reverse('blog:toggle_subscription', args=[0])).status_code, 404)
+
+    def test_permission_required(self):
+        """Тест на запрет модерации без права изменения статей"""
+        self.client.force_login(User.objects.create(phone='+79161234568', name='Reader'))
+        self.assertEqual(self.client.get(reverse('blog:toggle')).status_code, 403)
+        response = self.client.post(reverse('blog:toggle_activity', args=[self.blogs[0].pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_api(self):
+        """Тест на массовую модерацию через API"""
+        token = str(RefreshToken.for_user(self.moderator).access_token)
+        response = self.client.post(reverse('api:blog_moderate'),
+                                    {'ids': [blog.pk for blog in self.blogs], 'action': 'paywall'},
+                                    content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.json(), {'updated': 3})
+        response = self.client.post(reverse('api:blog_moderate'), {'ids': [], 'action': 'delete'},
+                                    content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 400)
+
+
+class AdminTests(TestCase):
+    """Тесты админки статей."""
+
+    def setUp(self):
+        self.admin = User.objects.create(phone='+79161234567', name='Admin', is_staff=True, is_superuser=True)
+        self.category = Category.objects.create(name='Category')
+        self.client.force_login(self.admin)
+
+    def create_blogs(self, count):
+        for i in range(count):
+            author = User.objects.create(phone=f'+7916200{Blog.objects.count():04d}', name='Author')
+            Blog.objects.create(title=f'Post {i}', content='Content', author=author, category=self.category)
+
+    def test_changelist_without_n_plus_one(self):
+        """Тест на число запросов списка статей, не зависящее от числа авторов"""
+        self.create_blogs(2)
+        with CaptureQueriesContext(connection) as few_rows:
+            self.client.get(reverse('admin:blog_blog_changelist'))
+        self.create_blogs(5)
+        with CaptureQueriesContext(connection) as more_rows:
+            response = self.client.get(reverse('admin:blog_blog_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(few_rows), len(more_rows))
+
+    def test_prefix_search_and_autocomplete(self):
+        """Тест на поиск по началу заголовка и автодополнение автора и категории"""
+        self.create_blogs(2)
+        response = self.client.get(reverse('admin:blog_blog_changelist'), {'q': '"post 1"'})
+        self.assertEqual([blog.title for blog in response.context['cl'].result_list], ['Post 1'])
+        response = self.client.get(reverse('admin:blog_blog_changelist'), {'q': 'ost'})
+        self.assertEqual(len(response.context['cl'].result_list), 0)
+        response = self.client.get(reverse('admin:blog_blog_add'))
+        self.assertContains(response, 'data-field-name="author"')
+        self.assertContains(response, 'data-field-name="category"')
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'blog', 'model_name': 'blog', 'field_name': 'author', 'term': '+7916200',
+        })
+        self.assertEqual(len(response.json()['results']), 2)
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1000)
+    def test_estimated_count(self):
+        """Тест на оценку числа записей большой таблицы и точный подсчет для маленькой"""
+        queryset = Blog.objects.order_by('pk')
+        self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 0)
+        with patch('config.admin.estimate_count', return_value=5000):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 5000)
+        with patch('config.admin.estimate_count', return_value=500):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 0)
+
+
+class CategoryCatalogueTests(TestCase):
+    """Тесты счетчиков статей и каталога категорий."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone='+79161234567', name='Author')
+        self.category = Category.objects.create(name='Category')
+        self.other = Category.objects.create(name='Other')
+
+    def create_blog(self, **kwargs):
+        return Blog.objects.create(title='Post', content='Content', author=self.user, category=self.category,
+                                   **kwargs)
+
+    def assertCounts(self, category_count, other_count):
+        self.assertEqual(Category.objects.get(pk=self.category.pk).posts_count, category_count)
+        self.assertEqual(Category.objects.get(pk=self.other.pk).posts_count, other_count)
+
+    def test_counts_follow_blog_changes(self):
+        """Тест на счетчики при создании, публикации, смене категории и удалении статьи"""
+        blog = self.create_blog()
+        draft = self.create_blog(is_published=False)
+        self.assertCounts(1, 0)
+        draft.is_published = True
+        draft.save()
+        self.assertCounts(2, 0)
+        blog.category = self.other
+        blog.save()
+        self.assertCounts(1, 1)
+        blog.delete()
+        self.assertCounts(1, 0)
+
+        # Статья загружена без полей публикации и категории - счетчик пересчитывается
+        deferred = Blog.objects.only('title').get(pk=draft.pk)
+        deferred.title = 'Renamed'
+        deferred.save()
+        self.assertCounts(1, 0)
+
+    def test_counts_follow_bulk_moderation(self):
+        """Тест на пересчет счетчиков после массовой модерации и переключения публикации"""
+        blogs = [self.create_blog() for _ in range(3)]
+        moderate_blogs([blog.pk for blog in blogs[:2]], 'unpublish')
+        self.assertCounts(1, 0)
+        toggle_blog_field(blogs[0].pk, 'is_published')
+        self.assertCounts(2, 0)
+        Blog.objects.update(is_published=True)
+        recount_posts()
+        self.assertCounts(3, 0)
+
+    def test_catalogue_cached_in_process(self):
+        """Тест на каталог без запросов до смены версии в кеше"""
+        self.create_blog()
+        self.assertEqual(get_catalogue().get(self.category.pk).posts_count, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual([category.name for category in get_catalogue()], ['Category', 'Other'])
+        # Изменение в другом процессе видно по новой версии, очистка кеша тоже перезагружает каталог
+        Category.objects.filter(pk=self.other.pk).update(name='Renamed')
+        cache.set(CATALOGUE_VERSION_KEY, 'other process')
+        self.assertEqual(get_catalogue().get(self.other.pk).name, 'Renamed')
+        Category.objects.filter(pk=self.other.pk).update(name='Cleared')
+        cache.clear()
+        self.assertEqual(get_catalogue().get(self.other.pk).name, 'Cleared')
+
+    def test_category_pages_without_category_queries(self):
+        """Тест на число статей в списке категорий и страницу категории без запросов к таблице категорий"""
+        self.create_blog()
+        get_catalogue()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('blog:category_list'))
+        self.assertContains(response, '<span class="badge text-bg-light">1</span>', html=True)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blog:category_detail', args=[self.category.pk]))
+        self.assertContains(response, 'Post')
+        self.assertFalse([query for query in queries if 'FROM "blog_category"' in query['sql']])
+        self.assertEqual(self.client.get(reverse('blog:category_detail', args=[0])).status_code, 404)
+
+
 class BlogViewsTests(TestCase):
     """Тесты для представлений, связанных с блогами."""
 
     def setUp(self):
+        cache.clear()
+        caches['counters'].clear()
         self.user = User.objects.create(phone='+71234567890', name='Test User')
         self.category1 = Category.objects.create(name='Category')
         self.category2 = Category.objects.create(name='Category 1')
@@ -127,9 +1154,19 @@ class BlogViewsTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'Test Title 1')
         self.assertTemplateUsed(response, 'blog/blog_detail.html')
+        self.assertEqual(response.context['object'].views_count, 1)
+        flush_views()
         self.blog1.refresh_from_db()
         self.assertEqual(self.blog1.views_count, 1)
 
+    def test_blog_detail_view_does_not_touch_updated_at(self):
+        """Тест на то, что просмотр статьи не меняет дату ее изменения"""
+        updated_at = self.blog1.updated_at
+        self.client.get(reverse('blog:detail', args=[self.blog1.id]))
+        flush_views()
+        self.blog1.refresh_from_db()
+        self.assertEqual(self.blog1.updated_at, updated_at)
+
     def test_blog_create_view(self):
         """Тест на создание блога"""
         response = self.client.post(reverse('blog:create'), {
@@ -172,6 +1209,16 @@ class BlogViewsTests(TestCase):
         self.assertIn('random_posts', response.context)
         self.assertIn('is_subscribed', response.context)
 
+    def test_blog_list_query_count_does_not_depend_on_rows(self):
+        """Тест на отсутствие N+1 запросов в списке статей"""
+        with CaptureQueriesContext(connection) as few_rows:
+            self.client.get(reverse('blog:blog_list'))
+        for i in range(5):
+            Blog.objects.create(title=f'Extra {i}', content='Content', author=self.user, category=self.category1)
+        with CaptureQueriesContext(connection) as more_rows:
+            self.client.get(reverse('blog:blog_list'))
+        self.assertEqual(len(few_rows), len(more_rows))
+
     def test_contacts_view_get(self):
         response = self.client.get(reverse('blog:contacts'))
         self.assertEqual(response.status_code, 200)
@@ -4,7 +4,8 @@ from django.urls import path
 
 from blog.apps import BlogConfig
 from blog.views import IndexView, ContactsView, BlogCreateView, BlogListView, BlogDetailView, BlogUpdateView, \
-    toggle_activity, BlogDeleteView, toggle_subscription, CreateBlogList, CategoryListView, CategoryDetailView
+    toggle_activity, BlogDeleteView, toggle_subscription, ModerationView, CategoryListView, CategoryDetailView, \
+    SearchView
 
 
 app_name = BlogConfig.name
@@ -19,9 +20,10 @@ urlpatterns = [
                   path('delete/<int:pk>/', BlogDeleteView.as_view(), name='delete'),
                   path('activity/<int:pk>/', toggle_activity, name='toggle_activity'),
                   path('subscription/<int:pk>/', toggle_subscription, name='toggle_subscription'),
-                  path('toggle/', CreateBlogList, name='toggle'),
+                  path('toggle/', ModerationView.as_view(), name='toggle'),
                   path('categories/', CategoryListView.as_view(), name='category_list'),
                   path('categories/<int:pk>/', CategoryDetailView.as_view(), name='category_detail'),
+                  path('search/', SearchView.as_view(), name='search'),
 
 
               ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+
+from autoslug import AutoSlugField
+
+
+@contextmanager
+def unchecked_slugs(model):
+    """Отключаем автозаполнение и проверку уникальности slug на время массовой вставки.
+
+    AutoSlugField выполняет запрос на проверку уникальности для каждой записи, в том числе при bulk_create.
+    Внутри контекста slug сохраняется как есть, поэтому уникальные значения должен задать вызывающий код.
+    """
+    fields = [field for field in model._meta.fields if isinstance(field, AutoSlugField)]
+    saved = [(field.populate_from, field._unique, field.unique_with) for field in fields]
+    for field in fields:
+        field.populate_from, field._unique, field.unique_with = None, False, ()
+    try:
+        yield
+    finally:
+        for field, (populate_from, unique, unique_with) in zip(fields, saved):
+            field.populate_from, field._unique, field.unique_with = populate_from, unique, unique_with
+
+
+@contextmanager
+def preserved_timestamps(model):
+    """Отключаем auto_now и auto_now_add на время массовой вставки, чтобы сохранить даты из выгрузки"""
+    fields = [field for field in model._meta.fields if getattr(field, 'auto_now', False)
+              or getattr(field, 'auto_now_add', False)]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+async def aresolve_user(request):
+    """Загружаем пользователя запроса асинхронно.
+
+    request.user - ленивый объект, который при первом обращении читает сессию и пользователя синхронным ORM,
+    что запрещено в асинхронном контроллере. После загрузки обращения к request.user не идут в базу.
+    """
+    request.user = await request.auser()
+    return request.user
@@ -1,29 +1,51 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required, permission_required
+from django.http import Http404
+from django.shortcuts import render, redirect, aget_object_or_404
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 from django.views.generic import TemplateView, CreateView, ListView, DetailView, UpdateView, DeleteView
 from django.views import View
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.urls import reverse_lazy, reverse
-from blog.models import Blog, Category
-from users.models import User
+from blog.catalogue import get_catalogue
+from blog.models import Blog
+from blog.page_cache import AnonymousPageCacheMixin
+from blog.pagination import CursorPaginationMixin
+from blog.search import search_blogs
+from blog.services import register_view, get_pending_views, get_views_count, get_site_stats, get_random_posts, \
+    moderate_blogs, toggle_blog_field, MODERATION_ACTIONS, MODERATION_MAX_IDS
+from blog.utils import aresolve_user
+from users.entitlements import EntitlementMixin
 
 
-class IndexView(TemplateView):
+logger = logging.getLogger(__name__)
+
+EDIT_PERMS = ['blog.can_change_blog', 'blog.can_delete_blog']
+# Разметка числа просмотров на странице статьи и метка, которой она заменяется в кеше страниц
+VIEWS_COUNT_MARKUP = '<span class="views-count">{}</span>'
+VIEWS_COUNT_PLACEHOLDER = VIEWS_COUNT_MARKUP.format('__views_count__').encode()
+
+
+class IndexView(EntitlementMixin, TemplateView):
     """Контроллер главной страницы"""
     template_name = 'blog/index.html'
     extra_context = {'title': 'Главная страница'}
 
+    async def get(self, request, *args, **kwargs):
+        await aresolve_user(request)
+        # Статистика и пул случайных статей берутся из кеша, база читается только при их пересборке
+        self.site_stats = await sync_to_async(get_site_stats)()
+        self.random_posts = await sync_to_async(get_random_posts)(4)
+        return self.render_to_response(self.get_context_data(**kwargs))
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['unique_authors'] = Blog.objects.values('author').distinct().count()
-        context['total_posts'] = Blog.objects.all().count()
-        context['unique_members'] = User.objects.filter(is_active=True).count()
-        context['random_posts'] = Blog.objects.all().order_by('?')[:4]
-
-        if self.request.user.is_authenticated:
-            context['is_subscribed'] = self.request.user.is_subscribed
-        else:
-            context['is_subscribed'] = False
-
+        context.update(self.site_stats)
+        context['random_posts'] = self.random_posts
         return context
 
 
@@ -42,7 +64,7 @@ class ContactsView(View):
         name = request.POST.get('name')
         phone = request.POST.get('phone')
         message = request.POST.get('message')
-        print(f'{name}: ({phone}) - {message}')
+        logger.info('Сообщение с формы контактов', extra={'name': name, 'phone': phone, 'text': message})
 
         context = {
             'title': 'Контакты'
@@ -62,50 +84,69 @@ class BlogCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class BlogListView(ListView):
+class BlogListView(AnonymousPageCacheMixin, EntitlementMixin, CursorPaginationMixin, ListView):
     """Контроллер просмотра статей"""
     model = Blog
     template_name = 'blog/blog_list.html'
     paginate_by = 9
+    ordering = ('-created_at', '-id')
+    page_cache_namespaces = ('blogs',)
     extra_context = {'title': 'Список статей'}
 
     def get_queryset(self, *args, **kwargs):
         queryset = super().get_queryset(*args, **kwargs)
-        queryset = queryset.filter(is_published=True)
+        queryset = queryset.published().for_listing()
         return queryset
 
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        await self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        self.can_edit = await sync_to_async(request.user.has_perms)(EDIT_PERMS)
+        return self.render_to_response(self.get_context_data())
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = 'Список статей'
-
-        if self.request.user.is_authenticated:
-            context['is_subscribed'] = self.request.user.is_subscribed
-        else:
-            context['is_subscribed'] = False
-
+        context['can_edit'] = self.can_edit
         return context
 
 
-class BlogDetailView(DetailView):
+class BlogDetailView(AnonymousPageCacheMixin, EntitlementMixin, DetailView):
     """Контроллер просмотра статьи"""
     model = Blog
     template_name = 'blog/blog_detail.html'
     extra_context = {'title': 'Просмотр статьи'}
 
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        self.object.views_count += 1
-        self.object.save()
-        return self.object
+    def get_page_cache_namespaces(self):
+        return (f'blog:{self.kwargs["pk"]}',)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        if self.request.user.is_authenticated:
-            context['is_subscribed'] = self.request.user.is_subscribed
-        else:
-            context['is_subscribed'] = False
+    def page_cache_hit(self, request, *args, **kwargs):
+        """Просмотр страницы из кеша тоже учитывается в счетчике"""
+        register_view(self.kwargs['pk'])
 
-        return context
+    def prepare_cached_content(self, content):
+        """Число просмотров не кешируется вместе со страницей: оно меняется при каждом просмотре"""
+        return content.replace(VIEWS_COUNT_MARKUP.format(self.object.views_count).encode(), VIEWS_COUNT_PLACEHOLDER)
+
+    def render_cached_content(self, content, *args, **kwargs):
+        """Подставляем в страницу из кеша актуальное число просмотров вместе с еще не записанными в БД"""
+        views_count = get_views_count(self.kwargs['pk'])
+        return content.replace(VIEWS_COUNT_PLACEHOLDER, VIEWS_COUNT_MARKUP.format(views_count or 0).encode())
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+    def get_queryset(self):
+        """Пользователь без доступа к платной статье получает анонс, полный текст из базы не читается"""
+        return self.get_entitlement().with_body(super().get_queryset())
+
+    async def aget_object(self):
+        """Статья через асинхронный ORM с учетом просмотра и еще не записанных в БД просмотров"""
+        obj = await aget_object_or_404(self.get_queryset(), pk=self.kwargs['pk'])
+        await sync_to_async(register_view)(obj.pk)
+        obj.views_count += await sync_to_async(get_pending_views)(obj.pk)
+        return obj
 
 
 class BlogUpdateView(LoginRequiredMixin, UpdateView):
@@ -116,35 +157,85 @@ class BlogUpdateView(LoginRequiredMixin, UpdateView):
     extra_context = {'title': 'Редактирование статьи'}
 
 
-def toggle_activity(request, pk):
-    """Функция переключения активности статьи"""
-    blog_item = get_object_or_404(Blog, pk=pk)
-    if blog_item.is_published:
-        blog_item.is_published = False
-    else:
-        blog_item.is_published = True
-    blog_item.save()
-    return redirect(reverse('blog:list'))
+class ModerationView(LoginRequiredMixin, PermissionRequiredMixin, CursorPaginationMixin, ListView):
+    """Контроллер модерации статей: список с фильтрами и массовые действия над отмеченными статьями"""
+    model = Blog
+    template_name = 'blog/toggle.html'
+    permission_required = 'blog.can_change_blog'
+    paginate_by = 50
+    ordering = ('-created_at', '-id')
+    extra_context = {'title': 'Модерация статей'}
+    # Фильтры списка: параметр запроса -> значение -> условие
+    filters = {
+        'status': {'published': {'is_published': True}, 'draft': {'is_published': False}},
+        'access': {'paid': {'is_subscribed': True}, 'free': {'is_subscribed': False}},
+    }
 
+    def get_category_id(self):
+        category = self.request.GET.get('category')
+        return int(category) if category and category.isdigit() else None
 
-def CreateBlogList(request):
-    blog_list = Blog.objects.all()
-    context = {
-        'object_list': blog_list,
+    def get_queryset(self):
+        queryset = super().get_queryset().select_related('category').only(
+            'id', 'title', 'is_published', 'is_subscribed', 'created_at', 'category__name')
+        for param, choices in self.filters.items():
+            condition = choices.get(self.request.GET.get(param))
+            if condition:
+                queryset = queryset.filter(**condition)
+        if self.get_category_id() is not None:
+            queryset = queryset.filter(category_id=self.get_category_id())
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            queryset = queryset.filter(title__icontains=query)
+        return queryset
 
-    }
-    return render(request, 'blog/toggle.html', context)
+    def post(self, request, *args, **kwargs):
+        """Массовое действие над отмеченными статьями, затем возврат к той же странице списка"""
+        action = request.POST.get('action')
+        ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()][:MODERATION_MAX_IDS]
+        if action in MODERATION_ACTIONS and ids:
+            updated = moderate_blogs(ids, action)
+            messages.success(request, f'Изменено статей: {updated}')
+        return redirect(request.get_full_path())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['categories'] = get_catalogue()
+        context['category_id'] = self.get_category_id()
+        # Фильтры для ссылок на другие страницы списка
+        params = self.request.GET.copy()
+        for param in ('page', self.cursor_kwarg):
+            params.pop(param, None)
+        context['filter_query'] = params.urlencode()
+        return context
 
 
+def redirect_back(request):
+    """Возврат на страницу модерации, с которой отправлена форма (адрес в поле next)"""
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = reverse('blog:toggle')
+    return redirect(next_url)
+
+
+@login_required
+@permission_required('blog.can_change_blog', raise_exception=True)
+@require_POST
+def toggle_activity(request, pk):
+    """Функция переключения активности статьи"""
+    if not toggle_blog_field(pk, 'is_published'):
+        raise Http404('Статья не найдена.')
+    return redirect_back(request)
+
+
+@login_required
+@permission_required('blog.can_change_blog', raise_exception=True)
+@require_POST
 def toggle_subscription(request, pk):
     """Функция переключения подписки на статью"""
-    blog_item = get_object_or_404(Blog, pk=pk)
-    if blog_item.is_subscribed:
-        blog_item.is_subscribed = False
-    else:
-        blog_item.is_subscribed = True
-    blog_item.save()
-    return redirect(reverse('blog:list'))
+    if not toggle_blog_field(pk, 'is_subscribed'):
+        raise Http404('Статья не найдена.')
+    return redirect_back(request)
 
 
 class BlogDeleteView(LoginRequiredMixin, DeleteView):
@@ -154,31 +245,62 @@ class BlogDeleteView(LoginRequiredMixin, DeleteView):
     extra_context = {'title': 'Удаление статьи'}
 
 
-class CategoryListView(ListView):
-    """Контроллер просмотра статей по категориям"""
-    model = Category
+class CategoryListView(AnonymousPageCacheMixin, ListView):
+    """Контроллер просмотра статей по категориям: категории и число статей берутся из каталога без запросов"""
     template_name = 'blog/category_list.html'
     paginate_by = 10
+    page_cache_namespaces = ('categories',)
     extra_context = {'title': 'Список статей по категориям'}
 
+    def get_queryset(self):
+        return get_catalogue().categories
+
 
-class CategoryDetailView(ListView):
+class CategoryDetailView(AnonymousPageCacheMixin, EntitlementMixin, CursorPaginationMixin, ListView):
     """Контроллер просмотра статей по категориям"""
     model = Blog
     template_name = 'blog/category_detail.html'
     context_object_name = 'blogs'
     paginate_by = 10
+    page_cache_namespaces = ('blogs', 'categories')
 
     def get_queryset(self):
         category_id = self.kwargs['pk']
-        return Blog.objects.filter(category__id=category_id, is_published=True)
+        return Blog.objects.published().for_listing().filter(category_id=category_id).order_by('-created_at', '-id')
+
+    async def get(self, request, *args, **kwargs):
+        self.category = (await sync_to_async(get_catalogue)()).get(self.kwargs['pk'])
+        if self.category is None:
+            raise Http404('Категория не найдена.')
+        self.object_list = self.get_queryset()
+        await self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        self.can_edit = await sync_to_async(request.user.has_perms)(EDIT_PERMS)
+        return self.render_to_response(self.get_context_data())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        category_id = self.kwargs['pk']
-        context['category'] = Category.objects.get(id=category_id)
-        if self.request.user.is_authenticated:
-            context['is_subscribed'] = self.request.user.is_subscribed
-        else:
-            context['is_subscribed'] = False
+        context['category'] = self.category
+        context['can_edit'] = self.can_edit
+        return context
+
+
+class SearchView(EntitlementMixin, ListView):
+    """Контроллер поиска статей"""
+    template_name = 'blog/search.html'
+    context_object_name = 'results'
+    paginate_by = 10
+    extra_context = {'title': 'Поиск статей'}
+
+    def get_category_id(self):
+        category = self.request.GET.get('category')
+        return int(category) if category and category.isdigit() else None
+
+    def get_queryset(self):
+        return search_blogs(self.request.GET.get('q'), self.get_category_id())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        context['category_id'] = self.get_category_id()
+        context['categories'] = get_catalogue()
         return context
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """Оценка числа записей таблицы по статистике PostgreSQL (pg_class.reltuples).
+
+    Оценка возможна только для запроса без условий, иначе и для других баз данных возвращается None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                       [connection.ops.quote_name(queryset.model._meta.db_table)])
+        row = cursor.fetchone()
+    # Для таблицы, по которой еще не собиралась статистика, reltuples = -1
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор списков админки: для большой таблицы без фильтров число записей оценивается без COUNT(*)"""
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+
+class ScalableAdminMixin:
+    """Миксин админки для больших таблиц: оценка числа записей и без второго COUNT(*) по всей таблице при поиске"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,31 @@
+from importlib.util import find_spec
+
+from django.core.exceptions import ImproperlyConfigured
+
+CONN_MODES = ('none', 'persistent', 'pool')
+
+
+def connection_settings(mode, max_age=60, pool_min_size=2, pool_max_size=10, pool_timeout=10):
+    """Параметры управления подключениями к PostgreSQL для режима DB_CONN_MODE.
+
+    none - новое подключение на каждый запрос, persistent - подключение потока живет max_age секунд
+    и проверяется перед повторным использованием, pool - пул подключений psycopg 3 на процесс.
+    """
+    if mode == 'none':
+        return {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}
+    if mode == 'persistent':
+        return {'CONN_MAX_AGE': max_age, 'CONN_HEALTH_CHECKS': True, 'OPTIONS': {}}
+    if mode == 'pool':
+        if find_spec('psycopg_pool') is None:
+            raise ImproperlyConfigured(
+                'Для DB_CONN_MODE=pool нужен драйвер psycopg 3 с пулом подключений: pip install "psycopg[binary,pool]"'
+            )
+        # Пул несовместим с постоянными подключениями, подключение возвращается в пул в конце запроса
+        return {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {'pool': {
+            'min_size': pool_min_size,
+            'max_size': pool_max_size,
+            'timeout': pool_timeout,
+        }}}
+    raise ImproperlyConfigured(
+        f'Неизвестный режим подключений DB_CONN_MODE={mode!r}, доступны: {", ".join(CONN_MODES)}'
+    )
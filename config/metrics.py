@@ -0,0 +1,237 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, Http404
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+SERIES_KEY = 'metrics:series'
+VALUE_KEY = 'metrics:value:{}'
+
+# Значения хранятся целыми числами (счетчики в кеше), время - в микросекундах
+MICROSECONDS = 1_000_000
+METRICS = {
+    'http_requests_total': ('counter', 'Количество запросов', 1),
+    'http_request_duration_seconds': ('histogram', 'Время обработки запроса', MICROSECONDS),
+    'http_response_size_bytes_total': ('counter', 'Суммарный размер ответов', 1),
+    'db_queries_total': ('counter', 'Количество запросов к базе данных', 1),
+    'db_query_duration_seconds_total': ('counter', 'Суммарное время запросов к базе данных', MICROSECONDS),
+    'template_render_duration_seconds_total': ('counter', 'Суммарное время отрисовки шаблонов', MICROSECONDS),
+    'n_plus_one_total': ('counter', 'Запросы с повторяющимся SQL (N+1)', 1),
+}
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Показатели одного запроса, накапливаются обертками запросов к базе и шаблонов"""
+
+    def __init__(self, track_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.sql_shapes = Counter() if track_sql else None
+
+
+def start_request_metrics(track_sql=False):
+    """Начинаем сбор показателей запроса в текущем контексте, возвращаем показатели и токен для сброса"""
+    metrics = RequestMetrics(track_sql)
+    return metrics, _current.set(metrics)
+
+
+def stop_request_metrics(token):
+    _current.reset(token)
+
+
+def sql_shape(sql):
+    """SQL без значений: числа и списки параметров IN (...) заменяются, чтобы одинаковые запросы совпадали"""
+    sql = re.sub(r'\((?:%s, )*%s\)', '(...)', sql)
+    return re.sub(r'\b\d+\b', '?', sql)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Обертка запросов к базе: время, количество и форма SQL в показателях текущего запроса"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - start
+        if metrics.sql_shapes is not None:
+            metrics.sql_shapes[sql_shape(sql)] += 1
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """Подключаем обертку запросов к каждому новому подключению к базе"""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+class Template(django_backend.Template):
+    """Шаблон, время отрисовки которого учитывается в показателях текущего запроса"""
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Шаблонизатор Django с учетом времени отрисовки шаблонов"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+def series_name(name, **labels):
+    """Имя ряда в формате Prometheus: metric{label="value",...}"""
+    if not labels:
+        return name
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for value in labels.values())
+    return name + '{' + ','.join(f'{label}="{value}"' for label, value in zip(labels, escaped)) + '}'
+
+
+class MetricsBuffer:
+    """Буфер показателей процесса, периодически переносится в общий кеш.
+
+    Показатели каждого воркера копятся в памяти и прибавляются к счетчикам в кеше не чаще
+    раза в METRICS_FLUSH_INTERVAL секунд, поэтому запрос не обращается к кешу ради метрик,
+    а конечная точка отдает сумму по всем воркерам.
+    """
+
+    def __init__(self):
+        self.values = defaultdict(int)
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, series, value):
+        with self._lock:
+            self.values[series] += value
+
+    def record_request(self, view, method, status, duration, size, metrics, n_plus_one=0):
+        """Учитываем показатели запроса, возвращаем True, если буфер пора перенести в кеш"""
+        labels = {'view': view}
+        self.add(series_name('http_requests_total', view=view, method=method, status=status), 1)
+        for bucket in settings.METRICS_DURATION_BUCKETS:
+            # Нулевое значение тоже добавляется, чтобы у гистограммы были все интервалы
+            self.add(series_name('http_request_duration_seconds_bucket', le=bucket, **labels), int(duration <= bucket))
+        self.add(series_name('http_request_duration_seconds_bucket', le='+Inf', **labels), 1)
+        self.add(series_name('http_request_duration_seconds_sum', **labels), round(duration * MICROSECONDS))
+        self.add(series_name('http_request_duration_seconds_count', **labels), 1)
+        self.add(series_name('http_response_size_bytes_total', **labels), size)
+        self.add(series_name('db_queries_total', **labels), metrics.queries)
+        self.add(series_name('db_query_duration_seconds_total', **labels), round(metrics.db_time * MICROSECONDS))
+        self.add(series_name('template_render_duration_seconds_total', **labels),
+                 round(metrics.template_time * MICROSECONDS))
+        if n_plus_one:
+            self.add(series_name('n_plus_one_total', **labels), n_plus_one)
+        return time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL
+
+    def flush(self):
+        """Прибавляем накопленные значения к счетчикам в кеше"""
+        with self._lock:
+            values, self.values = self.values, defaultdict(int)
+            self.last_flush = time.monotonic()
+        if not values:
+            return
+        keys = {series: hashlib.md5(series.encode()).hexdigest() for series in values}
+        for series, value in values.items():
+            if not value:
+                continue
+            key = VALUE_KEY.format(keys[series])
+            if not cache.add(key, value, None):
+                try:
+                    cache.incr(key, value)
+                except ValueError:
+                    cache.add(key, value, None)
+        # Список рядов проверяется при каждом переносе: ряд, потерянный при одновременной записи
+        # списка несколькими воркерами, будет добавлен снова при следующем переносе
+        index = cache.get(SERIES_KEY) or {}
+        missing = {key: series for series, key in keys.items() if key not in index}
+        if missing:
+            index.update(missing)
+            cache.set(SERIES_KEY, index, None)
+
+
+buffer = MetricsBuffer()
+
+
+def metric_of(series):
+    """Метрика ряда и множитель его значения: у гистограммы ряды _bucket, _sum и _count"""
+    name = series.split('{', 1)[0]
+    for suffix in ('_bucket', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)], 1
+    if name.endswith('_sum') and name[:-len('_sum')] in METRICS:
+        name = name[:-len('_sum')]
+    return name, METRICS.get(name, ('', '', 1))[2]
+
+
+def render_metrics():
+    """Показатели всех воркеров из кеша в текстовом формате Prometheus"""
+    index = cache.get(SERIES_KEY) or {}
+    values = cache.get_many([VALUE_KEY.format(key) for key in index])
+    grouped = defaultdict(list)
+    # Ряды идут в порядке первого появления: интервалы гистограммы - по возрастанию
+    for key, series in index.items():
+        name, scale = metric_of(series)
+        value = values.get(VALUE_KEY.format(key), 0)
+        grouped[name].append(f'{series} {value / scale if scale != 1 else value}')
+    lines = []
+    for name, (kind, description, _) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(grouped.get(name, ()))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Внутренняя конечная точка метрик: доступ по токену METRICS_TOKEN или с адресов METRICS_ALLOWED_IPS"""
+    token = settings.METRICS_TOKEN
+    authorized = token and request.headers.get('Authorization') == f'Bearer {token}'
+    if not authorized and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    buffer.flush()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись журнала одной строкой JSON вместе с полями, переданными через extra"""
+    reserved = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update({key: value for key, value in vars(record).items() if key not in self.reserved})
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
@@ -0,0 +1,94 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from config.metrics import buffer, instrument_connection, start_request_metrics, stop_request_metrics
+
+logger = logging.getLogger('config.requests')
+
+
+class RequestMetricsMiddleware:
+    """Показатели каждого запроса: время обработки, запросы к базе и их время, время отрисовки шаблонов
+    и размер ответа.
+
+    Показатели копятся в буфере для конечной точки метрик Prometheus и пишутся в журнал config.requests.
+    При METRICS_DETECT_N_PLUS_ONE запросы, в которых один и тот же SQL выполнен больше
+    METRICS_N_PLUS_ONE_THRESHOLD раз, отмечаются предупреждением в журнале.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Подключения, открытые до загрузки промежуточного слоя, обертка запросов не видела
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(sender=None, connection=connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        metrics, token = start_request_metrics(settings.METRICS_DETECT_N_PLUS_ONE)
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_request_metrics(token)
+        if self.record(request, response, metrics, time.perf_counter() - start):
+            buffer.flush()
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        metrics, token = start_request_metrics(settings.METRICS_DETECT_N_PLUS_ONE)
+        try:
+            response = await self.get_response(request)
+        finally:
+            stop_request_metrics(token)
+        if self.record(request, response, metrics, time.perf_counter() - start):
+            await sync_to_async(buffer.flush)()
+        return response
+
+    @staticmethod
+    def get_view_name(request):
+        """Имя маршрута вместо адреса, чтобы число рядов метрик не зависело от параметров в адресе"""
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match._func_path
+
+    def record(self, request, response, metrics, duration):
+        """Учитываем запрос в буфере и журнале, возвращаем True, если буфер пора перенести в кеш"""
+        view = self.get_view_name(request)
+        if view == 'metrics':
+            return False
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+
+        repeated = {}
+        if metrics.sql_shapes:
+            threshold = settings.METRICS_N_PLUS_ONE_THRESHOLD
+            repeated = {sql: count for sql, count in metrics.sql_shapes.items() if count > threshold}
+            for sql, count in repeated.items():
+                logger.warning('Повторяющийся SQL (N+1) в %s: %s раз', view, count,
+                               extra={'view': view, 'path': request.path, 'sql': sql, 'count': count})
+
+        logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'db_queries': metrics.queries,
+            'db_time_ms': round(metrics.db_time * 1000, 2),
+            'template_time_ms': round(metrics.template_time * 1000, 2),
+            'response_bytes': size,
+        })
+        return buffer.record_request(view, request.method, response.status_code, duration, size, metrics,
+                                     n_plus_one=len(repeated))
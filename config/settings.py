@@ -1,13 +1,19 @@
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
 
+from config.db import connection_settings
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 load_dotenv(BASE_DIR / '.env')
 
+# Необязательные настройки читаются как os.getenv('X') or значение_по_умолчанию: пустые ключи из .env.sample
+# означают значение по умолчанию
+
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 DEBUG = os.getenv('DEBUG', False) == 'True'
@@ -26,6 +32,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'drf_yasg',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'phonenumber_field',
     'autoslug',
 
@@ -35,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,7 +56,8 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Шаблонизатор Django с учетом времени отрисовки в метриках запросов
+        'BACKEND': 'config.metrics.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -76,6 +85,35 @@ DATABASES = {
     }
 }
 
+# Управление подключениями к базе данных (DB_CONN_MODE): none - подключение на каждый запрос,
+# persistent - постоянные подключения с проверкой перед использованием (DB_CONN_MAX_AGE секунд),
+# pool - пул подключений psycopg 3 (нужен пакет psycopg[binary,pool]) размером от DB_POOL_MIN_SIZE
+# до DB_POOL_MAX_SIZE на процесс, DB_POOL_TIMEOUT - ожидание свободного подключения в секундах
+DB_CONN_MODE = os.getenv('DB_CONN_MODE') or 'persistent'
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE') or 60)
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE') or 2)
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE') or 10)
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT') or 10)
+DATABASES['default'].update(connection_settings(DB_CONN_MODE, DB_CONN_MAX_AGE, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+                                                DB_POOL_TIMEOUT))
+
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND') or 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# Кеши в памяти процесса: данные в них не видны другим воркерам и вытесняются при переполнении
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+# Задан общий для всех процессов кеш (Redis, Memcached)
+SHARED_CACHE = CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+# Буфер просмотров статей (counters) не должен терять записи при переполнении кеша: это общий кеш (Redis без
+# вытеснения) или отдельная от default область памяти процесса без ограничения числа записей
+CACHES['counters'] = dict(CACHES['default'])
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    CACHES['counters'].update(LOCATION='counters', OPTIONS={'MAX_ENTRIES': sys.maxsize})
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -122,34 +160,117 @@ LOGIN_URL = '/users/'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     )
 }
+# Токены содержат утверждения о подписке и правах (users.tokens), по токену обновления они перечитываются из базы
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "users.tokens.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.tokens.ClaimsTokenRefreshSerializer",
+    "TOKEN_USER_CLASS": "users.tokens.ClaimsTokenUser",
 }
+# Запросы на чтение к API доверяют утверждениям токена и не читают пользователя из базы. Отзыв таких токенов доступа
+# хранится только в кеше, поэтому утверждениям доверяем лишь при общем кеше Redis без вытеснения ключей
+# (maxmemory-policy noeviction, как в docker-compose.yaml); иначе пользователь всегда читается из базы
+JWT_TRUST_CLAIMS = (CACHES['default']['BACKEND'] == 'django.core.cache.backends.redis.RedisCache'
+                    and (os.getenv('JWT_TRUST_CLAIMS') or 'True') == 'True')
 
 PHONENUMBER_DEFAULT_REGION = 'RU'  # Для России
 PHONENUMBER_DEFAULT_FORMAT = 'E164'
 
 
-# LOGGING = {
-#     'version': 1,
-#     'disable_existing_loggers': False,
-#     'handlers': {
-#         'console': {
-#             'level': 'DEBUG',
-#             'class': 'logging.StreamHandler',
-#         },
-#     },
-#     'loggers': {
-#         'django': {
-#             'handlers': ['console'],
-#             'level': 'DEBUG',
-#             'propagate': True,
-#         },
-#     },
-# }
+# Журнал: записи JSON в консоль, LOG_LEVEL - уровень журналов приложения (config.requests - журнал запросов)
+LOG_LEVEL = os.getenv('LOG_LEVEL') or 'INFO'
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'config.metrics.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'config': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        'blog': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        'users': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
 
 STRIPE_API_KEY = os.getenv('STRIPE_API_KEY')
+
+# Буфер просмотров статей: запись в БД по достижении порога или по истечении интервала (в секундах)
+VIEWS_FLUSH_THRESHOLD = int(os.getenv('VIEWS_FLUSH_THRESHOLD') or 100)
+VIEWS_FLUSH_INTERVAL = int(os.getenv('VIEWS_FLUSH_INTERVAL') or 60)
+
+# Пул случайных статей для главной страницы: размер, число случайных диапазонов и время жизни (в секундах)
+RANDOM_POSTS_POOL_SIZE = int(os.getenv('RANDOM_POSTS_POOL_SIZE') or 200)
+RANDOM_POSTS_POOL_CHUNKS = int(os.getenv('RANDOM_POSTS_POOL_CHUNKS') or 10)
+RANDOM_POSTS_POOL_TTL = int(os.getenv('RANDOM_POSTS_POOL_TTL') or 300)
+
+# Режим пагинации списков статей: 'page' (номера страниц) или 'cursor' (курсорная пагинация без COUNT и OFFSET)
+BLOG_PAGINATION_MODE = os.getenv('BLOG_PAGINATION_MODE') or 'page'
+
+# Время хранения закешированных страниц и фрагментов страниц (в секундах)
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT') or 300)
+
+# Списки админки: для таблиц PostgreSQL больше порога число записей без фильтров берется из статистики (pg_class)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.getenv('ADMIN_ESTIMATED_COUNT_THRESHOLD') or 100_000)
+
+# Движок поиска статей: 'postgres', 'python' или пусто для выбора по типу БД
+BLOG_SEARCH_BACKEND = os.getenv('BLOG_SEARCH_BACKEND', '')
+
+# Уменьшенные копии изображений статей и аватаров: ширины (в пикселях через запятую) и качество сжатия
+RESPONSIVE_IMAGE_WIDTHS = [int(width) for width in
+                           (os.getenv('RESPONSIVE_IMAGE_WIDTHS') or '320,640,1024').split(',')]
+RESPONSIVE_IMAGE_QUALITY = int(os.getenv('RESPONSIVE_IMAGE_QUALITY') or 80)
+
+# Клиент Stripe: пусто - библиотека stripe, либо путь к классу заглушки (users.stripe_stub.StubStripeClient)
+STRIPE_CLIENT = os.getenv('STRIPE_CLIENT', '')
+# Цена подписки в Stripe ищется по lookup_key и хранится в памяти процесса и в кеше (в секундах)
+STRIPE_PRICE_LOOKUP_KEY = os.getenv('STRIPE_PRICE_LOOKUP_KEY') or 'subscription_rub_500'
+STRIPE_PRICE_TTL = int(os.getenv('STRIPE_PRICE_TTL') or 3600)
+# Секрет подписи вебхуков Stripe (whsec_...)
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+
+# Отправка SMS: класс отправки (users.sms.ConsoleSmsBackend, users.sms.FileSmsBackend), файл для FileSmsBackend,
+# число попыток отправки и задержка перед первой повторной попыткой (в секундах, далее удваивается)
+SMS_BACKEND = os.getenv('SMS_BACKEND') or 'users.sms.ConsoleSmsBackend'
+SMS_FILE_PATH = os.getenv('SMS_FILE_PATH') or os.path.join(BASE_DIR, 'sms.log')
+SMS_MAX_ATTEMPTS = int(os.getenv('SMS_MAX_ATTEMPTS') or 5)
+SMS_RETRY_DELAY = int(os.getenv('SMS_RETRY_DELAY') or 30)
+
+# Квоты запросов кодов подтверждения (количество/период: s, m, h, d) по IP клиента и номеру телефона
+RATE_LIMITS = {
+    'otp_issue_ip': os.getenv('RATE_LIMIT_OTP_ISSUE_IP') or '20/h',
+    'otp_issue_phone': os.getenv('RATE_LIMIT_OTP_ISSUE_PHONE') or '3/10m',
+    'otp_verify_ip': os.getenv('RATE_LIMIT_OTP_VERIFY_IP') or '60/h',
+    'otp_verify_phone': os.getenv('RATE_LIMIT_OTP_VERIFY_PHONE') or '10/10m',
+}
+# Блокировка проверки кодов для номера после нескольких неверных кодов (время блокировки в секундах)
+OTP_MAX_FAILED_ATTEMPTS = int(os.getenv('OTP_MAX_FAILED_ATTEMPTS') or 5)
+OTP_LOCKOUT_SECONDS = int(os.getenv('OTP_LOCKOUT_SECONDS') or 900)
+
+# Хранилище кодов подтверждения (users.otp.DatabaseOTPStore - в отдельной таблице; users.otp.CacheOTPStore -
+# в кеше, по умолчанию только при общем кеше: в кеше процесса код, выданный одним воркером, не найдет другой)
+# и время действия кода в секундах
+OTP_STORE = os.getenv('OTP_STORE') or ('users.otp.CacheOTPStore' if SHARED_CACHE else 'users.otp.DatabaseOTPStore')
+OTP_TTL = int(os.getenv('OTP_TTL') or 300)
+
+
+# Метрики запросов: конечная точка /metrics/ в формате Prometheus доступна с заголовком Authorization: Bearer
+# METRICS_TOKEN или с адресов METRICS_ALLOWED_IPS (по умолчанию - ни с каких: за прокси адрес клиента совпадает
+# с адресом прокси, поэтому разрешать адреса стоит только при прямом доступе к приложению); показатели воркера
+# переносятся в общий кеш раз в METRICS_FLUSH_INTERVAL секунд. При METRICS_DETECT_N_PLUS_ONE (по умолчанию
+# в режиме DEBUG) запросы с одинаковым SQL, выполненным больше METRICS_N_PLUS_ONE_THRESHOLD раз, отмечаются в журнале
+METRICS_ALLOWED_IPS = [ip for ip in (os.getenv('METRICS_ALLOWED_IPS') or '').split(',') if ip]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL') or 10)
+METRICS_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_DETECT_N_PLUS_ONE = (os.getenv('METRICS_DETECT_N_PLUS_ONE') or str(DEBUG)) == 'True'
+METRICS_N_PLUS_ONE_THRESHOLD = int(os.getenv('METRICS_N_PLUS_ONE_THRESHOLD') or 10)
@@ -0,0 +1,22 @@
+"""
+Настройки для запуска тестов без PostgreSQL: python manage.py test --settings=config.test_settings
+"""
+
+from config.settings import *  # noqa: F401,F403
+from config.settings import BASE_DIR, SECRET_KEY, LOGGING
+
+SECRET_KEY = SECRET_KEY or 'test-secret-key-long-enough-for-jwt-hmac'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_db.sqlite3',
+    }
+}
+
+BLOG_SEARCH_BACKEND = 'python'
+SMS_BACKEND = 'users.sms.LocMemSmsBackend'
+
+# Журнал запросов не выводится при прогоне тестов
+for logger in LOGGING['loggers'].values():
+    logger['level'] = 'ERROR'
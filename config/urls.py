@@ -12,6 +12,8 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
 from config import settings
+from config.metrics import metrics_view
+from users.api_views import TokenRevokeView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -32,6 +34,9 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('blog.urls', namespace='blog')),
     path('users/', include('users.urls', namespace='users')),
+    path('api/v1/', include('blog.api_urls', namespace='api')),
     path('token/', TokenObtainPairView.as_view(), name='token'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/revoke/', TokenRevokeView.as_view(), name='token_revoke'),
+    path('metrics/', metrics_view, name='metrics'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
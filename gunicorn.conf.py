@@ -0,0 +1,40 @@
+"""
+Настройки gunicorn для запуска в контейнере: gunicorn -c gunicorn.conf.py
+
+SERVER_MODE=asgi (по умолчанию) - воркеры uvicorn с приложением config.asgi, асинхронные контроллеры
+обслуживают медленных клиентов без блокировки воркера; SERVER_MODE=wsgi - потоковые воркеры с config.wsgi.
+"""
+import multiprocessing
+import os
+
+from config.settings import SHARED_CACHE
+
+SERVER_MODE = os.getenv('SERVER_MODE') or 'asgi'
+if SERVER_MODE not in ('asgi', 'wsgi'):
+    raise ValueError(f'Неизвестный режим SERVER_MODE={SERVER_MODE!r}, доступны: asgi, wsgi')
+
+bind = os.getenv('GUNICORN_BIND') or '0.0.0.0:8000'
+# Кеш в памяти процесса не виден другим воркерам: счетчики, коды подтверждения и сброс кешей разойдутся между ними
+workers = int(os.getenv('WEB_CONCURRENCY') or (multiprocessing.cpu_count() * 2 + 1 if SHARED_CACHE else 1))
+if workers > 1 and not SHARED_CACHE:
+    raise ValueError(f'WEB_CONCURRENCY={workers} требует общего кеша: задайте CACHE_BACKEND (Redis, Memcached) '
+                     'или запустите один воркер')
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'config.wsgi:application'
+    worker_class = 'gthread'
+    # Синхронные контроллеры под WSGI держат поток на все время запроса
+    threads = int(os.getenv('GUNICORN_THREADS') or 4)
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT') or 30)
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT') or 30)
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE') or 5)
+# Перезапуск воркера после N запросов ограничивает рост памяти, разброс не дает воркерам перезапуститься одновременно
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS') or 1000)
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER') or 100)
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL') or 'info'
@@ -1,16 +1,34 @@
 from django.contrib import admin
 
-from users.models import User, Payment
+from config.admin import ScalableAdminMixin
+from users.models import User, Payment, StripePrice, SmsOutbox
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'email', 'phone')
+    # Поиск по началу номера и точному адресу почты использует индексы в PostgreSQL
+    search_fields = ('phone__startswith', '=email')
     exclude = ('is_subscribed',)
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'amount', 'status', 'created_at')
     list_filter = ('status',)
+    list_select_related = ('user',)
+    search_fields = ('stripe_session_id__exact', 'user__phone__startswith')
+    autocomplete_fields = ('user',)
+    ordering = ('-created_at',)
+
+
+@admin.register(StripePrice)
+class StripePriceAdmin(admin.ModelAdmin):
+    list_display = ('id', 'lookup_key', 'stripe_price_id', 'unit_amount', 'currency', 'created_at')
+
+
+@admin.register(SmsOutbox)
+class SmsOutboxAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'phone', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
     ordering = ('-created_at',)
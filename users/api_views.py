@@ -0,0 +1,8 @@
+from rest_framework_simplejwt.views import TokenViewBase
+
+from users.tokens import TokenRevokeSerializer
+
+
+class TokenRevokeView(TokenViewBase):
+    """Отзыв токена доступа или обновления до истечения его срока"""
+    serializer_class = TokenRevokeSerializer
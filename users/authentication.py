@@ -0,0 +1,34 @@
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from users.tokens import CLAIMS, REVOKED_MESSAGE, ClaimsTokenUser, is_issued_before_revocation, is_revoked
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """Аутентификация по JWT без чтения пользователя из базы для запросов на чтение.
+
+    При JWT_TRUST_CLAIMS запросы GET, HEAD и OPTIONS с токеном, содержащим утверждения о подписке и правах,
+    получают пользователя из токена. Остальные запросы и токены без утверждений загружают пользователя из базы
+    и отклоняют токены, выданные до его отметки tokens_valid_after. Отозванные в кеше токены отклоняются всегда
+    (см. users.tokens.is_revoked).
+    """
+
+    def authenticate(self, request):
+        self.trust_claims = settings.JWT_TRUST_CLAIMS and request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken(REVOKED_MESSAGE)
+        return token
+
+    def get_user(self, validated_token):
+        if self.trust_claims and all(claim in validated_token for claim in CLAIMS):
+            return ClaimsTokenUser(validated_token)
+        user = super().get_user(validated_token)
+        if is_issued_before_revocation(validated_token, user):
+            raise InvalidToken(REVOKED_MESSAGE)
+        return user
@@ -0,0 +1,71 @@
+from django.db.models import BooleanField, Case, F, Q, TextField, Value, When
+
+
+class Entitlement:
+    """Снимок подписки пользователя: решает, доступен ли ему полный текст статьи"""
+
+    def __init__(self, user_id=None, is_subscribed=False, is_superuser=False):
+        self.user_id = user_id
+        self.is_subscribed = is_subscribed
+        self.is_superuser = is_superuser
+
+    @property
+    def reads_all(self):
+        """Доступны ли пользователю все платные статьи"""
+        return self.is_subscribed or self.is_superuser
+
+    def can_read(self, blog):
+        """Доступен ли полный текст статьи: бесплатная статья, подписка, автор статьи или суперпользователь"""
+        if not blog.is_subscribed or self.reads_all:
+            return True
+        return self.user_id is not None and blog.author_id == self.user_id
+
+    def teaser_condition(self):
+        """Условие запроса для статей, которые пользователь видит только анонсом"""
+        condition = Q(is_subscribed=True)
+        if self.user_id is not None:
+            condition &= ~Q(author_id=self.user_id)
+        return condition
+
+    def with_body(self, queryset):
+        """Статьи с текстом в поле body и признаком is_teaser.
+
+        Недоступные статьи получают готовый анонс вместо полного текста, колонка content не загружается.
+        """
+        if self.reads_all:
+            return queryset.annotate(body=F('content'), is_teaser=Value(False, output_field=BooleanField()))
+        condition = self.teaser_condition()
+        return queryset.defer('content').annotate(
+            body=Case(When(condition, then=F('excerpt')), default=F('content'), output_field=TextField()),
+            is_teaser=Case(When(condition, then=Value(True)), default=Value(False), output_field=BooleanField()),
+        )
+
+
+ANONYMOUS = Entitlement()
+
+
+def get_entitlement(user):
+    """Снимок подписки пользователя запроса, запоминается на объекте пользователя.
+
+    Пользователь запроса уже загружен из базы (сессия, токен без доверия утверждениям) или несет утверждения
+    о подписке в токене, поэтому снимок строится по его полям без запросов к базе и кешу.
+    """
+    if not user.is_authenticated:
+        return ANONYMOUS
+    entitlement = getattr(user, '_entitlement', None)
+    if entitlement is None:
+        entitlement = Entitlement(user.pk, bool(user.is_subscribed), user.is_superuser)
+        user._entitlement = entitlement
+    return entitlement
+
+
+class EntitlementMixin:
+    """Миксин контроллеров со статьями: снимок подписки пользователя и признак подписки в контексте шаблона"""
+
+    def get_entitlement(self):
+        return get_entitlement(self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['is_subscribed'] = self.get_entitlement().reads_all
+        return context
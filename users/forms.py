@@ -42,7 +42,7 @@ class UserRegisterForm(StyleFormMixin, UserCreationForm):
         return phone
 
     def save(self, commit=True):
-        """Сохраняем пользователя. Генерация OTP происходит в сигнале."""
+        """Сохраняем пользователя. Код подтверждения выдает контроллер регистрации."""
         user = super().save(commit=False)
         if commit:
             user.save()  # Сохраняем пользователя без отправки SMS
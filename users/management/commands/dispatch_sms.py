@@ -0,0 +1,32 @@
+import time
+from collections import Counter
+
+from django.core.management import BaseCommand
+
+from users.services import dispatch_sms_outbox
+from users.sms import get_sms_backend
+
+
+class Command(BaseCommand):
+    """Команда отправки SMS из очереди"""
+    help = 'Отправка SMS из очереди пачками с повтором неудачных попыток'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Размер пачки сообщений')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Проверять очередь каждые N секунд (0 - отправить накопленное и завершиться)')
+
+    def handle(self, *args, **options):
+        backend = get_sms_backend()
+        total = Counter()
+        while True:
+            stats = dispatch_sms_outbox(backend, options['batch_size'])
+            total.update(stats)
+            if stats:
+                continue
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Отправлено: {total["sent"]}, будет повторено: {total["retry"]}, с ошибкой: {total["failed"]}'
+        ))
@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from users.otp import get_otp_store
+
+
+class Command(BaseCommand):
+    """Команда удаления истекших кодов подтверждения"""
+    help = 'Удаление истекших кодов подтверждения из хранилища OTP_STORE'
+
+    def handle(self, *args, **options):
+        deleted = get_otp_store().purge()
+        self.stdout.write(self.style.SUCCESS(f'Удалено истекших кодов: {deleted}'))
@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from users.ratelimit import get_ratelimit_stats
+
+
+class Command(BaseCommand):
+    """Команда вывода счетчиков пропущенных и отклоненных запросов кодов подтверждения"""
+
+    def handle(self, *args, **options):
+        for scope, stats in get_ratelimit_stats().items():
+            self.stdout.write(f'{scope}: пропущено {stats["allowed"]}, отклонено {stats["denied"]}')
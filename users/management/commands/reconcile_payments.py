@@ -0,0 +1,78 @@
+import time
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+
+from blog.services import invalidate_site_stat
+from users.models import User, Payment
+from users.services import reconcile_pending_payments
+from users.stripe_stub import StubStripeClient
+
+
+class Command(BaseCommand):
+    """Команда сверки ожидающих платежей со Stripe"""
+    help = 'Проверка статуса ожидающих платежей в Stripe и обновление платежей и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пачки платежей')
+        parser.add_argument('--workers', type=int, default=8, help='Количество потоков для запросов к Stripe')
+        parser.add_argument('--rate', type=float, default=20, help='Не больше запросов к Stripe в секунду')
+        parser.add_argument('--retries', type=int, default=3, help='Повторов запроса при временной ошибке')
+        parser.add_argument('--min-age', type=int, default=10, help='Проверять платежи старше, минут')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Повторять сверку через указанное число секунд (0 - выполнить один раз)')
+        parser.add_argument('--fake', action='store_true', help='Использовать заглушку Stripe вместо API')
+        parser.add_argument('--fake-latency', type=float, default=0.05, help='Задержка ответа заглушки, секунд')
+        parser.add_argument('--fake-error-rate', type=float, default=0.01, help='Доля ответов заглушки с ошибкой')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Создать указанное число тестовых платежей (только с --fake, изменения откатываются)')
+
+    def handle(self, *args, **options):
+        client = StubStripeClient(options['fake_latency'], options['fake_error_rate']) if options['fake'] else None
+        if options['seed']:
+            if not options['fake']:
+                self.stderr.write('Тестовые платежи создаются только вместе с --fake')
+                return
+            with transaction.atomic():
+                self.seed(options['seed'])
+                self.reconcile(client, options)
+                transaction.set_rollback(True)
+            # Сигналы успели учесть тестового пользователя в статистике сайта
+            invalidate_site_stat('unique_members')
+            return
+
+        while True:
+            self.reconcile(client, options)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def reconcile(self, client, options):
+        """Выполняем сверку и выводим ее результат и скорость"""
+        start = time.perf_counter()
+        stats = reconcile_pending_payments(
+            client,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            rate=options['rate'],
+            retries=options['retries'],
+            min_age=timedelta(minutes=options['min_age']),
+        )
+        elapsed = time.perf_counter() - start
+        total = sum(stats.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено платежей: {total} за {elapsed:.2f} с ({total / elapsed if elapsed else 0:.0f} в секунду). '
+            f'Оплачено: {stats["paid"]}, отменено: {stats["failed"]}, ожидают: {stats["pending"]}, '
+            f'ошибок Stripe: {stats["error"]}'
+        ))
+
+    def seed(self, count):
+        """Создаем ожидающие платежи тестового пользователя"""
+        user = User.objects.create(phone='+70000000000', name='Reconcile benchmark')
+        Payment.objects.bulk_create(
+            (Payment(user=user, amount=500, stripe_session_id=f'cs_seed_{i}') for i in range(count)),
+            batch_size=5000,
+        )
+        Payment.objects.filter(user=user).update(created_at=now() - timedelta(days=1))
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_user_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lookup_key', models.CharField(max_length=200, unique=True, verbose_name='Ключ цены')),
+                ('stripe_price_id', models.CharField(max_length=255, verbose_name='ID цены Stripe')),
+                ('currency', models.CharField(max_length=3, verbose_name='Валюта')),
+                ('unit_amount', models.PositiveIntegerField(verbose_name='Стоимость в копейках')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Цена Stripe',
+                'verbose_name_plural': 'Цены Stripe',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# Поиск в админке по началу номера телефона (phone::text LIKE '...%') и по адресу почты (UPPER(email::text) = ...)
+CREATE_INDEXES_SQL = [
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS users_user_phone_prefix_idx
+        ON users_user ((phone::text) text_pattern_ops);
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS users_user_email_upper_idx
+        ON users_user (UPPER(email::text));
+    """,
+]
+
+DROP_INDEXES_SQL = [
+    'DROP INDEX CONCURRENTLY IF EXISTS users_user_phone_prefix_idx;',
+    'DROP INDEX CONCURRENTLY IF EXISTS users_user_email_upper_idx;',
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    """Индексы для поиска пользователей в админке (только для PostgreSQL, без блокировки записи в таблицу)"""
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in CREATE_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in DROP_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('users', '0009_otp_store'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
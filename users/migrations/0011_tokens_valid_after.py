@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='tokens_valid_after',
+            field=models.DateTimeField(blank=True, help_text='Токены, выданные раньше, отозваны', null=True, verbose_name='Токены действительны после'),
+        ),
+    ]
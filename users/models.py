@@ -1,7 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.timezone import now
-from users.utils import generate_otp, send_mock_sms, verify_otp
 
 from phonenumber_field.modelfields import PhoneNumberField
 
@@ -19,10 +18,8 @@ class User(AbstractUser):
                                help_text='Введите ник в Telegram', **NULLABLE)
     avatar = models.ImageField(upload_to='users/', verbose_name='Аватар', help_text='Выберите изображение', **NULLABLE)
     is_subscribed = models.BooleanField(default=False, verbose_name='Подписка')
-    otp_code = models.CharField(max_length=6, verbose_name='Код подтверждения', help_text='Код для подтверждения',
-                                **NULLABLE)
-    otp_created_at = models.DateTimeField(verbose_name='Время генерации OTP', **NULLABLE)
-    is_otp_sent = models.BooleanField(default=False, verbose_name='OTP отправлен')
+    tokens_valid_after = models.DateTimeField(verbose_name='Токены действительны после',
+                                              help_text='Токены, выданные раньше, отозваны', **NULLABLE)
 
     USERNAME_FIELD = 'phone'
     REQUIRED_FIELDS = []
@@ -34,25 +31,6 @@ class User(AbstractUser):
     def __str__(self):
         return f'{self.phone} - {self.name}'
 
-    def generate_otp(self):
-        """Генерация и сохранение OTP"""
-        self.otp_code = generate_otp()
-        self.otp_created_at = now()
-        self.save()
-
-    def send_mock_sms(self):
-        """Имитация отправки SMS"""
-        print(f'Отправлено SMS на {self.phone}: Ваш код подтверждения: {self.otp_code}')
-        send_mock_sms(self.phone, self.otp_code)
-
-    def verify_otp(self, input_otp):
-        """Проверка кода подтверждения."""
-        is_valid, message = verify_otp(self.otp_code, self.otp_created_at, input_otp)
-        if is_valid:
-            self.otp_code = None  # Код подтвержден, сбрасываем его
-            self.save()
-        return is_valid, message
-
 
 class Payment(models.Model):
     """Класс платежей"""
@@ -60,7 +38,7 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Сумма платежа')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания',
                                       help_text='Дата создания платежа')
-    stripe_session_id = models.CharField(max_length=255, verbose_name='ID сессии Stripe')
+    stripe_session_id = models.CharField(max_length=255, db_index=True, verbose_name='ID сессии Stripe')
     status = models.CharField(max_length=50, choices=[('pending', 'Ожидание'),
                                                       ('paid', 'Оплачено'), ('failed', 'Ошибка')], default='pending',
                               verbose_name='Статус платежа')
@@ -68,6 +46,73 @@ class Payment(models.Model):
     class Meta:
         verbose_name = 'Платеж'
         verbose_name_plural = 'Платежи'
+        indexes = [models.Index(fields=['status', 'created_at'], name='payment_status_created_at_idx')]
 
     def __str__(self):
         return f'Платеж {self.id} - {self.user} - {self.amount} руб.'
+
+
+class StripePrice(models.Model):
+    """Класс цен Stripe, сохраненных локально по lookup_key"""
+    lookup_key = models.CharField(max_length=200, unique=True, verbose_name='Ключ цены')
+    stripe_price_id = models.CharField(max_length=255, verbose_name='ID цены Stripe')
+    currency = models.CharField(max_length=3, verbose_name='Валюта')
+    unit_amount = models.PositiveIntegerField(verbose_name='Стоимость в копейках')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Цена Stripe'
+        verbose_name_plural = 'Цены Stripe'
+
+    def __str__(self):
+        return f'{self.lookup_key} - {self.stripe_price_id}'
+
+
+class StripeEvent(models.Model):
+    """Класс обработанных событий Stripe, защищает от повторной обработки одного события"""
+    event_id = models.CharField(max_length=255, unique=True, verbose_name='ID события Stripe')
+    type = models.CharField(max_length=100, verbose_name='Тип события')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата обработки')
+
+    class Meta:
+        verbose_name = 'Событие Stripe'
+        verbose_name_plural = 'События Stripe'
+
+    def __str__(self):
+        return f'{self.type} - {self.event_id}'
+
+
+class SmsOutbox(models.Model):
+    """Класс очереди исходящих SMS: сообщения записываются вместе с данными и отправляются отдельным процессом"""
+    STATUS_CHOICES = [('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Ошибка')]
+
+    phone = models.CharField(max_length=20, verbose_name='Номер телефона')
+    text = models.CharField(max_length=500, verbose_name='Текст сообщения')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток отправки')
+    next_attempt_at = models.DateTimeField(default=now, verbose_name='Следующая попытка')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    sent_at = models.DateTimeField(verbose_name='Дата отправки', **NULLABLE)
+
+    class Meta:
+        verbose_name = 'Исходящее SMS'
+        verbose_name_plural = 'Исходящие SMS'
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='sms_status_next_attempt_idx')]
+
+    def __str__(self):
+        return f'SMS {self.id} - {self.phone} - {self.status}'
+
+
+class OneTimeCode(models.Model):
+    """Класс кодов подтверждения для хранилища DatabaseOTPStore"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='+', verbose_name='Пользователь')
+    code = models.CharField(max_length=6, verbose_name='Код подтверждения')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Действует до')
+
+    class Meta:
+        verbose_name = 'Код подтверждения'
+        verbose_name_plural = 'Коды подтверждения'
+
+    def __str__(self):
+        return f'Код пользователя {self.user_id}'
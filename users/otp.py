@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+
+from users.models import OneTimeCode
+from users.utils import generate_otp
+
+OTP_KEY = 'otp:{}'
+MISSING_MESSAGE = 'Код подтверждения не был сгенерирован или срок его действия истёк.'
+INVALID_MESSAGE = 'Неверный код подтверждения.'
+VALID_MESSAGE = 'Код подтвержден успешно.'
+
+
+class BaseOTPStore:
+    """Хранилище кодов подтверждения пользователей, код действует OTP_TTL секунд"""
+
+    def issue(self, user_id):
+        """Генерируем и сохраняем новый код пользователя взамен прежнего"""
+        code = generate_otp()
+        self.save(user_id, code)
+        return code
+
+    def verify(self, user_id, input_otp):
+        """Проверяем код, верный код удаляется и повторно не принимается"""
+        code = self.get(user_id)
+        if not code:
+            return False, MISSING_MESSAGE
+        if code != input_otp:
+            return False, INVALID_MESSAGE
+        self.delete(user_id)
+        return True, VALID_MESSAGE
+
+    def save(self, user_id, code):
+        raise NotImplementedError
+
+    def get(self, user_id):
+        raise NotImplementedError
+
+    def delete(self, user_id):
+        raise NotImplementedError
+
+    def purge(self):
+        """Удаляем истекшие коды, возвращаем их количество"""
+        return 0
+
+
+class CacheOTPStore(BaseOTPStore):
+    """Коды в кеше: истекают сами по времени жизни ключа"""
+
+    def save(self, user_id, code):
+        cache.set(OTP_KEY.format(user_id), code, settings.OTP_TTL)
+
+    def get(self, user_id):
+        return cache.get(OTP_KEY.format(user_id))
+
+    def delete(self, user_id):
+        cache.delete(OTP_KEY.format(user_id))
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    """Коды в отдельной небольшой таблице, истекшие удаляются командой purge_otp"""
+
+    def save(self, user_id, code):
+        OneTimeCode.objects.update_or_create(user_id=user_id, defaults={
+            'code': code,
+            'expires_at': now() + timedelta(seconds=settings.OTP_TTL),
+        })
+
+    def get(self, user_id):
+        return OneTimeCode.objects.filter(user_id=user_id, expires_at__gt=now()).values_list('code', flat=True).first()
+
+    def delete(self, user_id):
+        OneTimeCode.objects.filter(user_id=user_id).delete()
+
+    def purge(self):
+        deleted, _ = OneTimeCode.objects.filter(expires_at__lte=now()).delete()
+        return deleted
+
+
+def get_otp_store():
+    """Хранилище кодов из настройки OTP_STORE"""
+    return import_string(settings.OTP_STORE)()
@@ -0,0 +1,94 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+WINDOW_KEY = 'ratelimit:{}:{}:{}'
+STATS_KEY = 'ratelimit:stats:{}:{}'
+FAILURES_KEY = 'ratelimit:failures:{}'
+LOCKOUT_KEY = 'ratelimit:lockout:{}'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Квота вида '5/10m' в количество запросов и длину окна в секундах"""
+    limit, period = rate.split('/')
+    unit = period[-1]
+    return int(limit), int(period[:-1] or 1) * PERIODS[unit]
+
+
+def _incr(key, timeout):
+    """Атомарное увеличение счетчика в кеше со временем жизни"""
+    if cache.add(key, 1, timeout):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Ключ истек между add и incr
+        cache.add(key, 1, timeout)
+        return 1
+
+
+def hit(scope, key, rate=None):
+    """Учитываем запрос в скользящем окне и возвращаем, укладывается ли он в квоту.
+
+    Окно приближается двумя соседними фиксированными окнами: счетчик предыдущего окна берется
+    с весом оставшейся в нем доли времени. Запрос сначала атомарно учитывается в текущем окне,
+    и решение принимается по полученному значению, поэтому параллельные запросы не проходят сверх квоты.
+    Отклоненные запросы из счетчика вычитаются и в квоте не учитываются.
+    """
+    limit, period = parse_rate(rate or settings.RATE_LIMITS[scope])
+    now = time.time()
+    window = int(now // period)
+    current_key = WINDOW_KEY.format(scope, key, window)
+    count = _incr(current_key, period * 2)
+    weight = 1 - (now % period) / period
+    # Оценка числа запросов в окне до текущего
+    estimate = cache.get(WINDOW_KEY.format(scope, key, window - 1), 0) * weight + count - 1
+
+    allowed = estimate < limit
+    if not allowed:
+        try:
+            cache.decr(current_key)
+        except ValueError:
+            # Окно истекло после увеличения счетчика
+            pass
+    _incr(STATS_KEY.format(scope, 'allowed' if allowed else 'denied'), None)
+    return allowed
+
+
+def is_allowed(scope, request, phone=None):
+    """Проверяем квоты области по IP клиента и, если указан, по номеру телефона"""
+    allowed = hit(f'{scope}_ip', request.META.get('REMOTE_ADDR', ''))
+    if phone:
+        allowed = hit(f'{scope}_phone', str(phone)) and allowed
+    return allowed
+
+
+def is_locked_out(phone):
+    """Заблокирована ли проверка кодов для номера после неудачных попыток"""
+    return cache.get(LOCKOUT_KEY.format(phone)) is not None
+
+
+def register_failure(phone):
+    """Учитываем неудачную проверку кода, после OTP_MAX_FAILED_ATTEMPTS попыток блокируем номер"""
+    failures = _incr(FAILURES_KEY.format(phone), settings.OTP_LOCKOUT_SECONDS)
+    if failures >= settings.OTP_MAX_FAILED_ATTEMPTS:
+        cache.set(LOCKOUT_KEY.format(phone), 1, settings.OTP_LOCKOUT_SECONDS)
+        cache.delete(FAILURES_KEY.format(phone))
+        _incr(STATS_KEY.format('otp_lockout', 'denied'), None)
+    return failures
+
+
+def reset_failures(phone):
+    """Сбрасываем счетчик неудачных проверок после верного кода"""
+    cache.delete(FAILURES_KEY.format(phone))
+
+
+def get_ratelimit_stats():
+    """Счетчики пропущенных и отклоненных запросов по областям квот"""
+    scopes = [*settings.RATE_LIMITS, 'otp_lockout']
+    keys = {(scope, result): STATS_KEY.format(scope, result) for scope in scopes for result in ('allowed', 'denied')}
+    values = cache.get_many(list(keys.values()))
+    return {scope: {result: values.get(keys[scope, result], 0) for result in ('allowed', 'denied')}
+            for scope in scopes}
@@ -1,30 +1,131 @@
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+
 import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+from django.utils.module_loading import import_string
+
 from config.settings import STRIPE_API_KEY
-from users.models import Payment
+from users.models import User, Payment, StripePrice, StripeEvent, SmsOutbox
+from users.otp import get_otp_store
+from users.sms import get_sms_backend
+from users.tokens import revoke_user_tokens
 
 stripe.api_key = STRIPE_API_KEY
 
+SUBSCRIPTION_CURRENCY = 'rub'
+SUBSCRIPTION_UNIT_AMOUNT = 50000  # Стоимость подписки в копейках (500 рублей = 50000 копеек)
+SUBSCRIPTION_PRODUCT = {'name': 'Subscription'}
+PRICE_CACHE_KEY = 'stripe:price:{}'
+
+
+@lru_cache(maxsize=None)
+def get_stripe_client():
+    """Клиент Stripe: библиотека stripe или заглушка из настройки STRIPE_CLIENT"""
+    if settings.STRIPE_CLIENT:
+        return import_string(settings.STRIPE_CLIENT)()
+    return stripe
+
+
+class PriceRegistry:
+    """Реестр цен Stripe: цена ищется по lookup_key один раз и хранится в БД, в кеше и в памяти процесса"""
+
+    def __init__(self, client=None):
+        self._client = client
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self._client or get_stripe_client()
+
+    def get_price_id(self, lookup_key=None):
+        """ID цены подписки или None, если Stripe недоступен и цена еще не сохранена"""
+        lookup_key = lookup_key or settings.STRIPE_PRICE_LOOKUP_KEY
+        price_id, expires_at = self._memo.get(lookup_key, (None, 0))
+        if price_id and expires_at > time.monotonic():
+            return price_id
+
+        with self._lock:
+            cache_key = PRICE_CACHE_KEY.format(lookup_key)
+            price_id = cache.get(cache_key)
+            if not price_id:
+                price_id = StripePrice.objects.filter(lookup_key=lookup_key).values_list(
+                    'stripe_price_id', flat=True).first()
+            if not price_id:
+                try:
+                    price_id = self.resolve(lookup_key)
+                except stripe.StripeError:
+                    return None
+            cache.set(cache_key, price_id, settings.STRIPE_PRICE_TTL)
+            self._memo[lookup_key] = (price_id, time.monotonic() + settings.STRIPE_PRICE_TTL)
+            return price_id
+
+    def resolve(self, lookup_key):
+        """Находим цену в Stripe по lookup_key (или создаем ее) и сохраняем локально"""
+        prices = self.client.Price.list(lookup_keys=[lookup_key], active=True, limit=1)
+        if prices['data']:
+            price = prices['data'][0]
+        else:
+            price = self.client.Price.create(
+                currency=SUBSCRIPTION_CURRENCY,
+                unit_amount=SUBSCRIPTION_UNIT_AMOUNT,
+                product_data=SUBSCRIPTION_PRODUCT,
+                lookup_key=lookup_key,
+            )
+        StripePrice.objects.update_or_create(lookup_key=lookup_key, defaults={
+            'stripe_price_id': price['id'],
+            'currency': price['currency'],
+            'unit_amount': price['unit_amount'],
+        })
+        return price['id']
+
+    def invalidate(self, lookup_key=None):
+        """Забываем сохраненную цену, при следующем обращении она будет найдена в Stripe заново"""
+        lookup_key = lookup_key or settings.STRIPE_PRICE_LOOKUP_KEY
+        with self._lock:
+            self._memo.pop(lookup_key, None)
+            cache.delete(PRICE_CACHE_KEY.format(lookup_key))
+            StripePrice.objects.filter(lookup_key=lookup_key).delete()
 
-def create_stripe_price():
-    """Создаем стоимость в Stripe"""
-    price = stripe.Price.create(
-        currency="rub",
-        unit_amount=50000,  # Стоимость подписки в копейках (500 рублей = 50000 копеек)
-        product_data={"name": "Subscription"},
-    )
-    return price
+
+price_registry = PriceRegistry()
+
+
+def get_subscription_price():
+    """Цена подписки для сессии оплаты без обращения к Stripe, если она уже известна"""
+    price_id = price_registry.get_price_id()
+    return {'id': price_id} if price_id else None
 
 
 def create_stripe_session(price):
-    """Создаем сессию на оплату в Stripe"""
-    session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        line_items=[
-            {
-                "price": price.get('id'),
-                "quantity": 1,
+    """Создаем сессию на оплату в Stripe.
+
+    Если цену получить не удалось, стоимость передается в самой сессии (price_data).
+    """
+    if price:
+        line_item = {"price": price.get('id'), "quantity": 1}
+    else:
+        line_item = {
+            "price_data": {
+                "currency": SUBSCRIPTION_CURRENCY,
+                "unit_amount": SUBSCRIPTION_UNIT_AMOUNT,
+                "product_data": SUBSCRIPTION_PRODUCT,
             },
-        ],
+            "quantity": 1,
+        }
+    session = get_stripe_client().checkout.Session.create(
+        payment_method_types=["card"],
+        line_items=[line_item],
         mode="payment",
         success_url="http://localhost:8000/users/subscribe/success/",
         cancel_url="http://localhost:8000/users/subscribe/cancel/",
@@ -32,26 +133,210 @@ def create_stripe_session(price):
     return session.get('id'), session.get('url')
 
 
-def check_payment_status(user):
-    """Проверяем статус оплаты в Stripe"""
-    payment = Payment.objects.filter(user=user).last()
-    if not payment:
+# Статус платежа по событию сессии оплаты, None - по полю payment_status самой сессии
+SESSION_EVENT_STATUSES = {
+    'checkout.session.completed': None,
+    'checkout.session.async_payment_succeeded': 'paid',
+    'checkout.session.async_payment_failed': 'failed',
+    'checkout.session.expired': 'failed',
+}
+
+
+def parse_stripe_event(payload, signature):
+    """Проверяем подпись вебхука Stripe и возвращаем событие, при неверной подписи - ValueError"""
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise ValueError('Не задан STRIPE_WEBHOOK_SECRET')
+    try:
+        return stripe.Webhook.construct_event(payload, signature, settings.STRIPE_WEBHOOK_SECRET)
+    except stripe.SignatureVerificationError as e:
+        raise ValueError('Неверная подпись вебхука Stripe') from e
+
+
+def handle_stripe_event(event):
+    """Обновляем платеж и подписку по событию сессии оплаты в одной транзакции.
+
+    Каждое событие обрабатывается один раз: повторно доставленные события пропускаются.
+    Возвращает True, если событие было обработано.
+    """
+    if event['type'] not in SESSION_EVENT_STATUSES:
         return False
+    session = event['data']['object']
+    status = SESSION_EVENT_STATUSES[event['type']]
+    if status is None:
+        status = 'paid' if session['payment_status'] == 'paid' else 'pending'
 
-    session = stripe.checkout.Session.retrieve(payment.stripe_session_id)
-    payment_status = session.get('payment_status')
+    with transaction.atomic():
+        _, created = StripeEvent.objects.get_or_create(event_id=event['id'], defaults={'type': event['type']})
+        if not created:
+            return False
+        payment = (Payment.objects.select_for_update().select_related('user')
+                   .filter(stripe_session_id=session['id']).first())
+        # Оплаченный платеж не откатывается событиями, пришедшими не по порядку
+        if payment is None or payment.status == 'paid':
+            return True
+        payment.status = status
+        payment.save(update_fields=['status'])
+        if status == 'paid' and not payment.user.is_subscribed:
+            payment.user.is_subscribed = True
+            payment.user.save(update_fields=['is_subscribed'])
+    return True
 
-    if payment_status == 'paid':
-        payment.status = 'paid'
-    elif payment_status == 'failed':
-        payment.status = 'failed'
-    else:
-        payment.status = 'pending'
 
-    payment.save()
+RETRYABLE_STRIPE_ERRORS = (stripe.RateLimitError, stripe.APIConnectionError, stripe.APIError)
+
+
+class RateLimiter:
+    """Ограничение частоты запросов из нескольких потоков: не больше rate запросов в секунду"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Ждем, пока можно будет выполнить следующий запрос"""
+        with self._lock:
+            start = max(self.next_at, time.monotonic())
+            self.next_at = start + self.interval
+        delay = start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def retrieve_session(client, session_id, limiter, retries=3, backoff=0.5):
+    """Сессия оплаты из Stripe с повтором временных ошибок, при неудаче - None"""
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            return client.checkout.Session.retrieve(session_id)
+        except RETRYABLE_STRIPE_ERRORS:
+            if attempt == retries:
+                return None
+            # Экспоненциальная задержка со случайной добавкой, чтобы потоки не повторяли запросы одновременно
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+        except stripe.StripeError:
+            return None
+
+
+def session_payment_status(session):
+    """Статус платежа по сессии оплаты: оплачена, истекла или еще ожидает оплаты"""
+    if session['payment_status'] == 'paid':
+        return 'paid'
+    if session.get('status') == 'expired':
+        return 'failed'
+    return 'pending'
+
+
+def iter_pending_payments(batch_size, min_age):
+    """Ожидающие платежи пачками по (created_at, id) без OFFSET: (дата, ID, пользователь, сессия)"""
+    pending = Payment.objects.filter(status='pending', created_at__lte=now() - min_age).order_by('created_at', 'id')
+    batch = pending
+    while True:
+        rows = list(batch.values_list('created_at', 'id', 'user_id', 'stripe_session_id')[:batch_size])
+        if not rows:
+            return
+        yield rows
+        created_at, payment_id = rows[-1][:2]
+        # Избыточная граница created_at__gte дает индексу (status, created_at) точку входа вместо просмотра с начала
+        batch = pending.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=payment_id),
+                               created_at__gte=created_at)
+
+
+def apply_payment_statuses(rows, sessions, stats):
+    """Массово обновляем статусы платежей пачки и подписки оплативших пользователей"""
+    updates = {'paid': [], 'failed': []}
+    subscribers = set()
+    for (_, payment_id, user_id, _), session in zip(rows, sessions):
+        status = session_payment_status(session) if session else 'error'
+        stats[status] += 1
+        if status in updates:
+            updates[status].append(payment_id)
+        if status == 'paid':
+            subscribers.add(user_id)
+
+    with transaction.atomic():
+        for status, ids in updates.items():
+            if ids:
+                # Платежи, уже обновленные вебхуком, не трогаем
+                Payment.objects.filter(pk__in=ids, status='pending').update(status=status)
+        if subscribers:
+            User.objects.filter(pk__in=subscribers, is_subscribed=False).update(is_subscribed=True)
+    # Массовое обновление идет без сигналов - токены с устаревшей подпиской отзываем явно
+    if subscribers:
+        revoke_user_tokens(*subscribers)
+
+
+def reconcile_pending_payments(client=None, batch_size=500, workers=8, rate=20, retries=3, backoff=0.5,
+                               min_age=timedelta(minutes=10), window=4):
+    """Сверяем ожидающие платежи со Stripe пачками и массово обновляем статусы и подписки.
+
+    Запросы к Stripe выполняются параллельно в пуле потоков с ограничением частоты (rate в секунду).
+    Одновременно в работе до window пачек, чтобы повторы запросов одной пачки не задерживали следующие.
+    Платежи моложе min_age не проверяются - пользователь, скорее всего, еще на странице оплаты.
+    Возвращает количество платежей по результату проверки.
+    """
+    client = client or get_stripe_client()
+    limiter = RateLimiter(rate)
+    stats = Counter()
+    in_flight = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for rows in iter_pending_payments(batch_size, min_age):
+            futures = [executor.submit(retrieve_session, client, row[3], limiter, retries, backoff) for row in rows]
+            in_flight.append((rows, futures))
+            if len(in_flight) >= window:
+                rows, futures = in_flight.popleft()
+                apply_payment_statuses(rows, [future.result() for future in futures], stats)
+        while in_flight:
+            rows, futures = in_flight.popleft()
+            apply_payment_statuses(rows, [future.result() for future in futures], stats)
+    return stats
+
+
+OTP_SMS_TEXT = 'Ваш код подтверждения: {code}'
+
+
+def queue_sms(phone, text):
+    """Ставим SMS в очередь отправки, отправит его команда dispatch_sms"""
+    return SmsOutbox.objects.create(phone=str(phone), text=text)
+
+
+def issue_otp(user):
+    """Генерируем новый код подтверждения в хранилище OTP_STORE и ставим SMS с ним в очередь"""
+    code = get_otp_store().issue(user.pk)
+    return queue_sms(user.phone, OTP_SMS_TEXT.format(code=code))
+
 
-    if payment.status == 'paid':
-        user.is_subscribed = True
-        user.save()
+def dispatch_sms_outbox(backend=None, batch_size=100):
+    """Отправляем пачку SMS из очереди.
 
-    return payment.status == 'paid'
+    Строки блокируются на время отправки (SKIP LOCKED), поэтому несколько процессов отправки
+    не отправят одно сообщение дважды. Неотправленные сообщения повторяются с удвоением задержки
+    до SMS_MAX_ATTEMPTS попыток. Возвращает количество сообщений по результату отправки.
+    """
+    backend = backend or get_sms_backend()
+    stats = Counter()
+    with transaction.atomic():
+        batch = list(
+            SmsOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now())
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not batch:
+            return stats
+        results = backend.send_messages([(sms.phone, sms.text) for sms in batch])
+        sent_at = now()
+        for sms, error in zip(batch, results):
+            sms.attempts += 1
+            if error is None:
+                sms.status, sms.sent_at, sms.last_error = 'sent', sent_at, ''
+            else:
+                sms.last_error = str(error)
+                if sms.attempts >= settings.SMS_MAX_ATTEMPTS:
+                    sms.status = 'failed'
+                else:
+                    sms.next_attempt_at = sent_at + timedelta(
+                        seconds=settings.SMS_RETRY_DELAY * 2 ** (sms.attempts - 1))
+            stats[sms.status if sms.status != 'pending' else 'retry'] += 1
+        SmsOutbox.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return stats
@@ -1,16 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save
 from django.dispatch import receiver
-from .models import User, Payment
 
+from blog.images import generate_variants_on_save
 
-@receiver(post_save, sender=User)
-def send_sms_after_registration(sender, instance, created, **kwargs):
-    """Отправка SMS после регистрации нового пользователя"""
-    if created and not instance.is_otp_sent:
-        instance.generate_otp()
-        instance.send_mock_sms()
-        instance.is_otp_sent = True
-        instance.save()
+from .models import Payment, User
+from .tokens import CLAIMS, CREDENTIAL_FIELDS, revoke_all_user_tokens, revoke_user_tokens
 
 
 @receiver(post_save, sender=Payment)
@@ -19,3 +13,45 @@ def update_subscription(sender, instance, created, **kwargs):
     if created and instance.status == 'paid':
         instance.user.is_subscribed = True
         instance.user.save()
+
+
+@receiver(post_save, sender=User)
+def reset_user_entitlement(sender, instance, **kwargs):
+    """Сбрасываем запомненный на пользователе снимок подписки при изменении подписки или прав"""
+    instance.__dict__.pop('_entitlement', None)
+
+
+@receiver(post_init, sender=User)
+def remember_token_fields(sender, instance, **kwargs):
+    """Запоминаем поля пользователя, которые записываются в его токены или проверяются при их обновлении"""
+    instance._token_fields = {field: instance.__dict__.get(field) for field in (*CLAIMS, *CREDENTIAL_FIELDS)}
+
+
+@receiver(post_save, sender=User)
+def revoke_outdated_tokens(sender, instance, created, **kwargs):
+    """Отзываем токены доступа с устаревшими утверждениями, а после смены пароля или блокировки - все токены"""
+    fields = {field: instance.__dict__.get(field) for field in instance._token_fields}
+    changed = {field for field, value in instance._token_fields.items()
+               if value is not None and value != fields[field]}
+    if not created and changed & set(CREDENTIAL_FIELDS):
+        instance.tokens_valid_after = revoke_all_user_tokens(instance.pk)
+    elif not created and changed:
+        revoke_user_tokens(instance.pk)
+    instance._token_fields = fields
+
+
+@receiver(post_init, sender=User)
+def remember_avatar(sender, instance, **kwargs):
+    """Запоминаем аватар на момент загрузки, чтобы не пересоздавать копии без его замены"""
+    value = instance.__dict__.get('avatar')
+    instance._variants_image = value if isinstance(value, str) else None
+
+
+@receiver(post_save, sender=User)
+def create_avatar_variants(sender, instance, raw=False, **kwargs):
+    """Создаем уменьшенные копии загруженного аватара"""
+    if raw or 'avatar' in instance.get_deferred_fields():
+        return
+    if instance.avatar and instance.avatar.name != instance._variants_image:
+        generate_variants_on_save(instance.avatar.name, instance.avatar.storage)
+    instance._variants_image = instance.avatar.name or None
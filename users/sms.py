@@ -0,0 +1,63 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class BaseSmsBackend:
+    """Базовый класс отправки SMS: наследник реализует send()"""
+
+    def send(self, phone, text):
+        """Отправляем одно сообщение, при ошибке - исключение"""
+        raise NotImplementedError
+
+    def send_messages(self, messages):
+        """Отправляем пачку сообщений (phone, text), для каждого возвращаем None или ошибку"""
+        results = []
+        for phone, text in messages:
+            try:
+                self.send(phone, text)
+            except Exception as e:
+                results.append(e)
+            else:
+                results.append(None)
+        return results
+
+
+class ConsoleSmsBackend(BaseSmsBackend):
+    """Вывод SMS в журнал users.sms вместо отправки"""
+
+    def send(self, phone, text):
+        if not phone:
+            raise ValueError('Номер телефона отсутствует.')
+        logger.info('Отправлено SMS на %s: %s', phone, text)
+
+
+class FileSmsBackend(BaseSmsBackend):
+    """Запись SMS в файл SMS_FILE_PATH вместо отправки"""
+
+    def send_messages(self, messages):
+        results = [None if phone else ValueError('Номер телефона отсутствует.') for phone, _ in messages]
+        with open(settings.SMS_FILE_PATH, 'a', encoding='utf-8') as file:
+            file.writelines(f'{phone}\t{text}\n' for (phone, text), error in zip(messages, results) if error is None)
+        return results
+
+
+class LocMemSmsBackend(BaseSmsBackend):
+    """Сохранение SMS в памяти процесса для тестов: отправленные сообщения в LocMemSmsBackend.outbox"""
+    outbox = []
+    _lock = threading.Lock()
+
+    def send(self, phone, text):
+        if not phone:
+            raise ValueError('Номер телефона отсутствует.')
+        with self._lock:
+            self.outbox.append((phone, text))
+
+
+def get_sms_backend():
+    """Класс отправки SMS из настройки SMS_BACKEND"""
+    return import_string(settings.SMS_BACKEND)()
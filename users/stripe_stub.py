@@ -0,0 +1,69 @@
+import itertools
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from types import SimpleNamespace
+
+import stripe
+
+
+class StubStripeClient:
+    """Локальная заглушка клиента Stripe для тестов и запуска без доступа к Stripe.
+
+    Повторяет используемую часть интерфейса библиотеки stripe (Price, checkout.Session)
+    и считает обращения к каждому методу в calls. Для нагрузочных проверок можно задать
+    задержку ответа (latency, в секундах) и долю ответов с ошибкой лимита запросов (error_rate).
+    Неизвестные сессии получают статус, вычисляемый по их ID.
+    """
+
+    def __init__(self, latency=0, error_rate=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.prices = {}
+        self.sessions = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.Price = SimpleNamespace(list=self.list_prices, create=self.create_price)
+        self.checkout = SimpleNamespace(Session=SimpleNamespace(create=self.create_session,
+                                                                retrieve=self.retrieve_session))
+
+    def _next_id(self, prefix):
+        with self._lock:
+            return f'{prefix}_stub_{next(self._ids)}'
+
+    def list_prices(self, lookup_keys=(), active=None, limit=10, **kwargs):
+        self.calls['Price.list'] += 1
+        data = [price for price in self.prices.values()
+                if price['lookup_key'] in lookup_keys and (active is None or price['active'] == active)]
+        return {'object': 'list', 'data': data[:limit]}
+
+    def create_price(self, currency, unit_amount, product_data=None, lookup_key=None, **kwargs):
+        self.calls['Price.create'] += 1
+        price = {'id': self._next_id('price'), 'object': 'price', 'active': True, 'currency': currency,
+                 'unit_amount': unit_amount, 'lookup_key': lookup_key}
+        self.prices[price['id']] = price
+        return price
+
+    def create_session(self, line_items, success_url, cancel_url, **kwargs):
+        self.calls['checkout.Session.create'] += 1
+        session_id = self._next_id('cs')
+        session = {'id': session_id, 'object': 'checkout.session', 'line_items': line_items,
+                   'payment_status': 'unpaid', 'status': 'open', 'url': f'https://checkout.stripe.test/{session_id}'}
+        self.sessions[session_id] = session
+        return session
+
+    def retrieve_session(self, session_id, **kwargs):
+        with self._lock:
+            self.calls['checkout.Session.retrieve'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise stripe.RateLimitError('Too many requests')
+        if session_id in self.sessions:
+            return self.sessions[session_id]
+        payment_status, status = (('paid', 'complete'), ('unpaid', 'expired'), ('unpaid', 'open'))[
+            zlib.crc32(session_id.encode()) % 3]
+        return {'id': session_id, 'object': 'checkout.session', 'payment_status': payment_status, 'status': status}
@@ -1,9 +1,33 @@
-from django.test import TestCase
-from users.models import User, Payment
+import hashlib
+import hmac
+import json
+import time
+from datetime import timedelta
+from io import StringIO
+
+import stripe
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from blog.models import Blog, Category
+from users.models import User, Payment, StripePrice, StripeEvent, SmsOutbox, OneTimeCode
 from django.utils.timezone import now
 from unittest.mock import patch
 
-from users.services import check_payment_status, create_stripe_session, create_stripe_price
+from users.services import create_stripe_session, PriceRegistry, get_stripe_client, \
+    price_registry, reconcile_pending_payments, dispatch_sms_outbox, iter_pending_payments, handle_stripe_event, \
+    retrieve_session, RateLimiter
+from users.entitlements import get_entitlement
+from users.tokens import ClaimsRefreshToken, is_revoked
+from users.otp import CacheOTPStore, DatabaseOTPStore, get_otp_store, INVALID_MESSAGE, MISSING_MESSAGE
+from users.ratelimit import _incr, hit, parse_rate, get_ratelimit_stats
+from users.sms import ConsoleSmsBackend, LocMemSmsBackend
+from users.stripe_stub import StubStripeClient
 
 
 class PaymentModelTests(TestCase):
@@ -79,42 +103,6 @@ class UserModelTests(TestCase):
         self.assertIsNone(self.user.email)
         self.assertIsNone(self.user.tg_nick)
 
-    @patch('users.models.generate_otp', return_value='123456')
-    def test_generate_otp(self, mock_generate_otp):
-        """Тест метода generate_otp."""
-        self.user.generate_otp()
-        self.assertEqual(self.user.otp_code, '123456')
-        self.assertIsNotNone(self.user.otp_created_at)
-
-    @patch('users.models.send_mock_sms')
-    def test_send_mock_sms(self, mock_send_mock_sms):
-        """Тест метода send_mock_sms."""
-        self.user.otp_code = '123456'
-        self.user.send_mock_sms()
-        mock_send_mock_sms.assert_called_once_with(self.user.phone, '123456')
-
-    @patch('users.models.verify_otp', return_value=(True, 'OTP verified successfully'))
-    def test_verify_otp_success(self, mock_verify_otp):
-        """Тест успешной проверки OTP."""
-        self.user.otp_code = '123456'
-        self.user.otp_created_at = now()
-        self.user.save()
-        is_valid, message = self.user.verify_otp('123456')
-        self.assertTrue(is_valid)
-        self.assertEqual(message, 'OTP verified successfully')
-        self.assertIsNone(self.user.otp_code)
-
-    @patch('users.models.verify_otp', return_value=(False, 'OTP is invalid or expired'))
-    def test_verify_otp_failure(self, mock_verify_otp):
-        """Тест неуспешной проверки OTP."""
-        self.user.otp_code = '123456'
-        self.user.otp_created_at = now()
-        self.user.save()
-        is_valid, message = self.user.verify_otp('654321')
-        self.assertFalse(is_valid)
-        self.assertEqual(message, 'OTP is invalid or expired')
-        self.assertEqual(self.user.otp_code, '123456')
-
     def test_initial_subscription_status(self):
         """Проверка, что подписка изначально отключена."""
         self.assertFalse(self.user.is_subscribed)
@@ -160,17 +148,22 @@ class StripeServiceTests(TestCase):
             status="pending"
         )
 
+    @patch("users.services.stripe.Price.list")
     @patch("users.services.stripe.Price.create")
-    def test_create_stripe_price(self, mock_price_create):
-        mock_price_create.return_value = {"id": "price_test_id", "currency": "rub"}
-        price = create_stripe_price()
-        self.assertEqual(price["id"], "price_test_id")
-        self.assertEqual(price["currency"], "rub")
+    def test_price_registry_creates_price(self, mock_price_create, mock_price_list):
+        cache.clear()
+        mock_price_list.return_value = {"data": []}
+        mock_price_create.return_value = {"id": "price_test_id", "currency": "rub", "unit_amount": 50000}
+        registry = PriceRegistry(stripe)
+        self.assertEqual(registry.get_price_id("subscription_test"), "price_test_id")
+        self.assertEqual(registry.get_price_id("subscription_test"), "price_test_id")
         mock_price_create.assert_called_once_with(
             currency="rub",
             unit_amount=50000,
             product_data={"name": "Subscription"},
+            lookup_key="subscription_test",
         )
+        self.assertEqual(StripePrice.objects.get(lookup_key="subscription_test").stripe_price_id, "price_test_id")
 
     @patch("users.services.stripe.checkout.Session.create")
     def test_create_stripe_session(self, mock_session_create):
@@ -186,30 +179,550 @@ class StripeServiceTests(TestCase):
             cancel_url="http://localhost:8000/users/subscribe/cancel/",
         )
 
-    @patch("users.services.stripe.checkout.Session.retrieve")
-    def test_check_payment_status_paid(self, mock_session_retrieve):
-        mock_session_retrieve.return_value = {"payment_status": "paid"}
-        status = check_payment_status(self.user)
+    def session_event(self, event_type, payment_status):
+        return {"id": "evt_test", "type": event_type,
+                "data": {"object": {"id": "test_session_id", "payment_status": payment_status}}}
+
+    def test_handle_event_paid(self):
+        self.assertTrue(handle_stripe_event(self.session_event("checkout.session.completed", "paid")))
         self.payment.refresh_from_db()
         self.user.refresh_from_db()
-        self.assertTrue(status)
         self.assertEqual(self.payment.status, "paid")
         self.assertTrue(self.user.is_subscribed)
 
-    @patch("users.services.stripe.checkout.Session.retrieve")
-    def test_check_payment_status_failed(self, mock_session_retrieve):
-        mock_session_retrieve.return_value = {"payment_status": "failed"}
-        status = check_payment_status(self.user)
+    def test_handle_event_failed(self):
+        self.assertTrue(handle_stripe_event(self.session_event("checkout.session.async_payment_failed", "unpaid")))
         self.payment.refresh_from_db()
-        self.assertFalse(status)
+        self.user.refresh_from_db()
         self.assertEqual(self.payment.status, "failed")
         self.assertFalse(self.user.is_subscribed)
 
-    @patch("users.services.stripe.checkout.Session.retrieve")
-    def test_check_payment_status_pending(self, mock_session_retrieve):
-        mock_session_retrieve.return_value = {"payment_status": "pending"}
-        status = check_payment_status(self.user)
+    def test_handle_event_pending(self):
+        self.assertTrue(handle_stripe_event(self.session_event("checkout.session.completed", "unpaid")))
         self.payment.refresh_from_db()
-        self.assertFalse(status)
+        self.user.refresh_from_db()
         self.assertEqual(self.payment.status, "pending")
         self.assertFalse(self.user.is_subscribed)
+        self.assertFalse(handle_stripe_event(self.session_event("customer.created", "unpaid")))
+
+    def test_retrieve_session(self):
+        client = StubStripeClient()
+        session = client.create_session([], "", "")
+        self.assertEqual(retrieve_session(client, session["id"], RateLimiter(0)), session)
+
+    def test_retrieve_session_retries(self):
+        client = StubStripeClient()
+        session = client.create_session([], "", "")
+        with patch.object(client.checkout.Session, "retrieve",
+                          side_effect=[stripe.RateLimitError("Too many requests"), session]) as mock_retrieve:
+            self.assertEqual(retrieve_session(client, session["id"], RateLimiter(0), backoff=0), session)
+        self.assertEqual(mock_retrieve.call_count, 2)
+
+    def test_retrieve_session_gives_up(self):
+        client = StubStripeClient(error_rate=1)
+        self.assertIsNone(retrieve_session(client, "cs_test", RateLimiter(0), retries=1, backoff=0))
+        self.assertEqual(client.calls["checkout.Session.retrieve"], 2)
+        with patch.object(client.checkout.Session, "retrieve", side_effect=stripe.InvalidRequestError("No", None)):
+            self.assertIsNone(retrieve_session(client, "cs_test", RateLimiter(0), backoff=0))
+
+
+class PriceRegistryTests(TestCase):
+    """Тесты реестра цен Stripe."""
+
+    def setUp(self):
+        cache.clear()
+        self.client_stub = StubStripeClient()
+        self.registry = PriceRegistry(self.client_stub)
+
+    def test_price_created_once(self):
+        """Тест на создание цены при первом обращении и использование сохраненной цены далее"""
+        price_id = self.registry.get_price_id()
+        self.assertEqual(self.registry.get_price_id(), price_id)
+        self.assertEqual(self.client_stub.calls['Price.create'], 1)
+        self.assertEqual(StripePrice.objects.get().stripe_price_id, price_id)
+
+        # Новый процесс с пустым кешем берет цену из БД, не обращаясь к Stripe
+        cache.clear()
+        self.assertEqual(PriceRegistry(self.client_stub).get_price_id(), price_id)
+        self.assertEqual(sum(self.client_stub.calls.values()), 2)
+
+    def test_existing_price_found_by_lookup_key(self):
+        """Тест на поиск уже существующей в Stripe цены по lookup_key"""
+        price = self.client_stub.create_price('rub', 50000, lookup_key='subscription_rub_500')
+        self.assertEqual(self.registry.get_price_id('subscription_rub_500'), price['id'])
+        self.assertEqual(self.client_stub.calls['Price.create'], 1)
+
+    def test_stripe_unavailable(self):
+        """Тест на сессию со стоимостью в price_data, если Stripe недоступен"""
+        with patch.object(self.client_stub, 'Price') as price_api:
+            price_api.list.side_effect = stripe.StripeError('Network error')
+            self.assertIsNone(self.registry.get_price_id())
+        with patch('users.services.stripe.checkout.Session.create') as mock_session_create:
+            mock_session_create.return_value = {'id': 'session_test_id', 'url': 'http://test_url'}
+            create_stripe_session(None)
+        line_item = mock_session_create.call_args.kwargs['line_items'][0]
+        self.assertEqual(line_item['price_data']['unit_amount'], 50000)
+
+    @override_settings(STRIPE_CLIENT='users.stripe_stub.StubStripeClient')
+    def test_checkout_reuses_price(self):
+        """Тест на одно создание цены при нескольких оплатах"""
+        get_stripe_client.cache_clear()
+        self.addCleanup(get_stripe_client.cache_clear)
+        price_registry.invalidate()
+        self.addCleanup(price_registry.invalidate)
+        user = User.objects.create(phone='+71234567890', name='Test User')
+        self.client.force_login(user)
+        for _ in range(2):
+            response = self.client.get(reverse('users:create_payment'))
+            self.assertEqual(response.status_code, 302)
+        calls = get_stripe_client().calls
+        self.assertEqual(calls['Price.create'], 1)
+        self.assertEqual(calls['checkout.Session.create'], 2)
+        self.assertEqual(Payment.objects.filter(user=user).count(), 2)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeWebhookTests(TestCase):
+    """Тесты вебхука Stripe."""
+
+    def setUp(self):
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.payment = Payment.objects.create(user=self.user, amount=500, stripe_session_id='cs_test')
+
+    def post_event(self, event_type, event_id='evt_1', payment_status='paid', secret='whsec_test'):
+        """Отправляем подписанное событие сессии оплаты"""
+        payload = json.dumps({
+            'id': event_id,
+            'object': 'event',
+            'type': event_type,
+            'data': {'object': {'id': 'cs_test', 'object': 'checkout.session', 'payment_status': payment_status}},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(reverse('users:stripe_webhook'), payload, content_type='application/json',
+                                HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}')
+
+    def test_completed_event(self):
+        """Тест на оплату платежа и оформление подписки по событию"""
+        self.assertEqual(self.post_event('checkout.session.completed').status_code, 200)
+        self.payment.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(self.payment.status, 'paid')
+        self.assertTrue(self.user.is_subscribed)
+
+    def test_duplicate_event(self):
+        """Тест на однократную обработку повторно доставленного события"""
+        self.post_event('checkout.session.completed', payment_status='unpaid')
+        Payment.objects.filter(pk=self.payment.pk).update(status='failed')
+        self.assertEqual(self.post_event('checkout.session.completed', payment_status='unpaid').status_code, 200)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'failed')
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+    def test_expired_after_paid(self):
+        """Тест на то, что оплаченный платеж не откатывается событием, пришедшим позже"""
+        self.post_event('checkout.session.completed')
+        self.post_event('checkout.session.expired', event_id='evt_2')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'paid')
+
+    def test_invalid_signature(self):
+        """Тест на отклонение события с неверной подписью"""
+        self.assertEqual(self.post_event('checkout.session.completed', secret='whsec_other').status_code, 400)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+
+    def test_success_page_reads_local_state(self):
+        """Тест на страницу после оплаты без обращения к Stripe"""
+        self.client.force_login(self.user)
+        with patch('users.services.stripe.checkout.Session.retrieve') as mock_session_retrieve:
+            response = self.client.get(reverse('users:subscribe_success'))
+        mock_session_retrieve.assert_not_called()
+        self.assertContains(response, 'Платеж обрабатывается')
+        self.post_event('checkout.session.completed')
+        self.assertContains(self.client.get(reverse('users:subscribe_success')), 'Оплата прошла успешно')
+
+
+class ReconcilePaymentsTests(TestCase):
+    """Тесты сверки ожидающих платежей со Stripe."""
+
+    def setUp(self):
+        self.stub = StubStripeClient()
+        self.user = User.objects.create(phone='+71234567890', name='Test User')
+        self.payments = {}
+        for payment_status, status in (('paid', 'complete'), ('unpaid', 'expired'), ('unpaid', 'open')):
+            session = self.stub.create_session([], '', '')
+            session.update(payment_status=payment_status, status=status)
+            self.payments[status] = Payment.objects.create(user=self.user, amount=500,
+                                                           stripe_session_id=session['id'])
+
+    def reconcile(self, **kwargs):
+        return reconcile_pending_payments(self.stub, batch_size=2, workers=2, rate=0, backoff=0,
+                                          min_age=timedelta(0), **kwargs)
+
+    def test_reconcile(self):
+        """Тест на обновление статусов платежей и подписки пачками"""
+        stats = self.reconcile()
+        self.assertEqual(stats, {'paid': 1, 'failed': 1, 'pending': 1})
+        statuses = {key: Payment.objects.get(pk=payment.pk).status for key, payment in self.payments.items()}
+        self.assertEqual(statuses, {'complete': 'paid', 'expired': 'failed', 'open': 'pending'})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_subscribed)
+
+    def test_reconcile_revokes_access_tokens(self):
+        """Тест на отзыв токенов доступа с устаревшей подпиской после массового обновления подписок"""
+        cache.clear()
+        access = ClaimsRefreshToken.for_user(self.user).access_token
+        access.set_iat(at_time=now() - timedelta(seconds=5))
+        self.reconcile()
+        self.assertTrue(is_revoked(access))
+
+    def test_batches_bounded_by_index(self):
+        """Тест на пачки платежей без повторов и с границей по created_at в запросе следующей пачки"""
+        Payment.objects.update(created_at=now() - timedelta(hours=1))
+        with CaptureQueriesContext(connection) as queries:
+            batches = list(iter_pending_payments(2, timedelta(0)))
+        self.assertEqual(sorted(row[1] for rows in batches for row in rows),
+                         sorted(payment.pk for payment in self.payments.values()))
+        self.assertIn('"users_payment"."created_at" >= ', queries[1]['sql'])
+
+    def test_min_age(self):
+        """Тест на пропуск недавно созданных платежей"""
+        stats = reconcile_pending_payments(self.stub, rate=0, min_age=timedelta(minutes=10))
+        self.assertEqual(sum(stats.values()), 0)
+        self.assertEqual(self.stub.calls['checkout.Session.retrieve'], 0)
+
+    def test_retry_errors(self):
+        """Тест на повтор запросов при ошибках Stripe и сохранение платежей в ожидании"""
+        self.stub.error_rate = 1
+        stats = self.reconcile(retries=2)
+        self.assertEqual(stats, {'error': 3})
+        self.assertEqual(self.stub.calls['checkout.Session.retrieve'], 9)
+        self.assertEqual(Payment.objects.filter(status='pending').count(), 3)
+
+
+class SmsOutboxTests(TestCase):
+    """Тесты очереди SMS."""
+
+    def setUp(self):
+        cache.clear()
+        LocMemSmsBackend.outbox.clear()
+
+    def test_registration_queues_sms(self):
+        """Тест на регистрацию одной записью пользователя и постановку SMS в очередь без отправки"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('users:register'), {
+                'phone': '+79161234567', 'password1': 'Str0ngPassw0rd!', 'password2': 'Str0ngPassw0rd!',
+            })
+        self.assertEqual(response.status_code, 302)
+        user = User.objects.get(phone='+79161234567')
+        self.assertFalse(any(query['sql'].startswith('UPDATE "users_user"') for query in queries))
+        sms = SmsOutbox.objects.get()
+        self.assertIn(get_otp_store().get(user.pk), sms.text)
+        self.assertEqual(LocMemSmsBackend.outbox, [])
+
+        stats = dispatch_sms_outbox()
+        self.assertEqual(stats, {'sent': 1})
+        self.assertEqual(LocMemSmsBackend.outbox, [('+79161234567', sms.text)])
+        self.assertEqual(SmsOutbox.objects.get().status, 'sent')
+        self.assertEqual(dispatch_sms_outbox(), {})
+
+    @override_settings(SMS_MAX_ATTEMPTS=2, SMS_RETRY_DELAY=0)
+    def test_retry_and_fail(self):
+        """Тест на повтор отправки и отметку ошибки после последней попытки"""
+        SmsOutbox.objects.create(phone='', text='Ваш код подтверждения: 123456')
+        self.assertEqual(dispatch_sms_outbox(), {'retry': 1})
+        self.assertEqual(dispatch_sms_outbox(), {'failed': 1})
+        sms = SmsOutbox.objects.get()
+        self.assertEqual(sms.attempts, 2)
+        self.assertIn('Номер телефона отсутствует', sms.last_error)
+
+    def test_console_backend_logs(self):
+        """Тест на запись SMS консольного способа отправки в журнал"""
+        with self.assertLogs('users.sms', 'INFO') as logs:
+            ConsoleSmsBackend().send_messages([('+79161234567', 'Код: 123456')])
+        self.assertEqual(logs.records[0].getMessage(), 'Отправлено SMS на +79161234567: Код: 123456')
+
+    def test_password_reset_queues_sms(self):
+        """Тест на постановку SMS в очередь при сбросе пароля"""
+        User.objects.create(phone='+79161234567', name='Test User')
+        response = self.client.post(reverse('users:password_reset_request'), {'phone': '+79161234567'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(SmsOutbox.objects.count(), 1)
+        self.assertEqual(LocMemSmsBackend.outbox, [])
+
+
+class RateLimitTests(TestCase):
+    """Тесты ограничения частоты запросов кодов подтверждения."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone='+79161234567', name='Test User')
+
+    def test_parse_rate(self):
+        """Тест на разбор квоты"""
+        self.assertEqual(parse_rate('5/10m'), (5, 600))
+        self.assertEqual(parse_rate('100/h'), (100, 3600))
+
+    def test_hit(self):
+        """Тест на отклонение запросов сверх квоты и подсчет отклоненных"""
+        results = [hit('otp_issue_phone', '+79161234567', '3/m') for _ in range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertTrue(hit('otp_issue_phone', '+79160000000', '3/m'))
+        self.assertEqual(get_ratelimit_stats()['otp_issue_phone'], {'allowed': 4, 'denied': 2})
+
+    def test_hit_counts_before_check(self):
+        """Тест на решение по значению счетчика после увеличения, а не по прочитанному до него"""
+        key = 'ratelimit:otp_issue_phone:+79161234567:100'
+        cache.set(key, 2, 120)
+
+        def concurrent_incr(key_, timeout):
+            if key_ == key:
+                # Другой процесс учел свой запрос между проверкой и увеличением счетчика
+                cache.incr(key_)
+            return _incr(key_, timeout)
+
+        with patch('users.ratelimit.time.time', return_value=6000), \
+                patch('users.ratelimit._incr', side_effect=concurrent_incr):
+            self.assertFalse(hit('otp_issue_phone', '+79161234567', '3/m'))
+        # Отклоненный запрос из счетчика вычтен, запрос другого процесса остался
+        self.assertEqual(cache.get(key), 3)
+
+    def test_rejected_not_counted(self):
+        """Тест на то, что отклоненные запросы не продлевают блокировку"""
+        with patch('users.ratelimit.time.time', return_value=6000):
+            for _ in range(5):
+                hit('otp_issue_phone', '+79161234567', '3/m')
+            self.assertEqual(cache.get('ratelimit:otp_issue_phone:+79161234567:100'), 3)
+
+    @override_settings(RATE_LIMITS={**settings.RATE_LIMITS, 'otp_issue_phone': '2/h'})
+    def test_password_reset_limit(self):
+        """Тест на ответ 429 и отсутствие новых SMS после превышения квоты"""
+        url = reverse('users:password_reset_request')
+        statuses = [self.client.post(url, {'phone': '+79161234567'}).status_code for _ in range(3)]
+        self.assertEqual(statuses, [302, 302, 429])
+        self.assertEqual(SmsOutbox.objects.count(), 2)
+
+    @override_settings(OTP_MAX_FAILED_ATTEMPTS=3)
+    def test_verify_lockout(self):
+        """Тест на блокировку проверки кода после нескольких неверных попыток"""
+        get_otp_store().save(self.user.pk, '123456')
+        url = reverse('users:otp_verify', kwargs={'action': 'register', 'pk': self.user.pk})
+        for _ in range(3):
+            self.assertEqual(self.client.post(url, {'otp': '000000'}).status_code, 200)
+        response = self.client.post(url, {'otp': '123456'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(get_otp_store().get(self.user.pk), '123456')
+
+
+class OTPStoreTests(TestCase):
+    """Тесты хранилищ кодов подтверждения."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone='+79161234567', name='Test User')
+
+    def check_store(self, store):
+        """Общая проверка выдачи, проверки и однократности кода"""
+        with CaptureQueriesContext(connection) as queries:
+            code = store.issue(self.user.pk)
+            self.assertEqual(store.verify(self.user.pk, '000000' if code != '000000' else '111111'),
+                             (False, INVALID_MESSAGE))
+            self.assertTrue(store.verify(self.user.pk, code)[0])
+        self.assertFalse(any('users_user' in query['sql'] for query in queries))
+        self.assertEqual(store.verify(self.user.pk, code), (False, MISSING_MESSAGE))
+
+    def test_cache_store(self):
+        """Тест хранилища в кеше"""
+        self.check_store(CacheOTPStore())
+
+    def test_database_store(self):
+        """Тест хранилища в отдельной таблице"""
+        self.check_store(DatabaseOTPStore())
+
+    @override_settings(OTP_TTL=0)
+    def test_cache_store_expiry(self):
+        """Тест на истечение кода в кеше по времени жизни ключа"""
+        store = CacheOTPStore()
+        code = store.issue(self.user.pk)
+        self.assertEqual(store.verify(self.user.pk, code), (False, MISSING_MESSAGE))
+
+    def test_database_store_expiry_and_purge(self):
+        """Тест на отклонение истекшего кода и удаление истекших кодов командой purge_otp"""
+        store = DatabaseOTPStore()
+        code = store.issue(self.user.pk)
+        OneTimeCode.objects.update(expires_at=now() - timedelta(seconds=1))
+        self.assertEqual(store.verify(self.user.pk, code), (False, MISSING_MESSAGE))
+        other = User.objects.create(phone='+79160000000', name='Other User')
+        store.issue(other.pk)
+        with override_settings(OTP_STORE='users.otp.DatabaseOTPStore'):
+            out = StringIO()
+            call_command('purge_otp', stdout=out)
+        self.assertIn('Удалено истекших кодов: 1', out.getvalue())
+        self.assertEqual(list(OneTimeCode.objects.values_list('user_id', flat=True)), [other.pk])
+
+    def test_register_and_verify(self):
+        """Тест на подтверждение регистрации кодом из SMS"""
+        self.client.post(reverse('users:register'), {
+            'phone': '+79167654321', 'password1': 'Str0ngPassw0rd!', 'password2': 'Str0ngPassw0rd!',
+        })
+        user = User.objects.get(phone='+79167654321')
+        code = SmsOutbox.objects.get().text.rsplit(' ', 1)[-1]
+        url = reverse('users:otp_verify', kwargs={'action': 'register', 'pk': user.pk})
+        self.client.post(url, {'otp': code})
+        user.refresh_from_db()
+        self.assertTrue(user.is_active)
+
+
+class EntitlementTests(TestCase):
+    """Тесты доступа к платным статьям."""
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create(phone='+79161234567', name='Reader')
+        self.author = User.objects.create(phone='+79161234568', name='Author')
+        self.paid = Blog.objects.create(title='Paid', content='Full paid content. ' * 30, author=self.author,
+                                        category=Category.objects.create(name='Category'), is_subscribed=True)
+        self.url = reverse('blog:detail', args=[self.paid.pk])
+
+    def test_teaser_for_anonymous(self):
+        """Тест на анонс вместо полного текста для анонимного пользователя"""
+        response = self.client.get(self.url)
+        self.assertTrue(response.context['blog'].is_teaser)
+        self.assertEqual(response.context['blog'].body, self.paid.excerpt)
+        self.assertNotIn('content', response.context['blog'].__dict__)
+        self.assertContains(response, reverse('users:subscribe'))
+
+    def test_full_text_for_subscriber_and_author(self):
+        """Тест на полный текст для подписчика и автора статьи"""
+        self.reader.is_subscribed = True
+        self.reader.save()
+        for user in (self.reader, self.author):
+            self.client.force_login(user)
+            blog = self.client.get(self.url).context['blog']
+            self.assertFalse(blog.is_teaser)
+            self.assertEqual(blog.body, self.paid.content)
+
+    def test_session_user_without_queries(self):
+        """Тест на снимок подписки загруженного пользователя без запросов к базе и кешу"""
+        with self.assertNumQueries(0):
+            entitlement = get_entitlement(self.reader)
+        self.assertIs(get_entitlement(self.reader), entitlement)
+        self.assertTrue(entitlement.can_read(Blog(is_subscribed=False)))
+        self.assertFalse(entitlement.can_read(self.paid))
+
+    def test_snapshot_reset_on_payment(self):
+        """Тест на новый снимок подписки пользователя после оплаты"""
+        self.assertFalse(get_entitlement(self.reader).is_subscribed)
+        Payment.objects.create(user=self.reader, amount=500, status='paid', stripe_session_id='cs_test')
+        self.assertTrue(get_entitlement(self.reader).is_subscribed)
+
+
+class JWTClaimsTests(TestCase):
+    """Тесты токенов с утверждениями о подписке."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(phone='+79161234568', name='Author')
+        self.user = User.objects.create(phone='+79161234567', name='Reader', is_subscribed=True,
+                                        password=make_password('secret-password'))
+        self.paid = Blog.objects.create(title='Paid', content='Paid content', author=self.author,
+                                        category=Category.objects.create(name='Category'), is_subscribed=True)
+        self.url = reverse('api:blog_detail', args=[self.paid.pk])
+
+    def issue(self, seconds_ago=0):
+        """Пара токенов, выданная указанное число секунд назад"""
+        refresh = ClaimsRefreshToken.for_user(self.user)
+        access = refresh.access_token
+        for token in (refresh, access):
+            token.set_iat(at_time=now() - timedelta(seconds=seconds_ago))
+        return refresh, access
+
+    def get(self, access):
+        return self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_obtain_pair_with_claims(self):
+        """Тест на утверждения о подписке и правах в выданном токене"""
+        response = self.client.post(reverse('token'), {'phone': '+79161234567', 'password': 'secret-password'})
+        access = ClaimsRefreshToken(response.json()['refresh']).access_token
+        self.assertEqual((access['is_subscribed'], access['is_staff'], access['is_superuser']), (True, False, False))
+
+    @override_settings(JWT_TRUST_CLAIMS=True)
+    def test_read_without_user_query(self):
+        """Тест на запрос к API без чтения пользователя из базы"""
+        _, access = self.issue()
+        with self.assertNumQueries(1):
+            response = self.get(access)
+        self.assertEqual(response.json()['content'], 'Paid content')
+
+    def test_read_with_user_query_on_local_cache(self):
+        """Тест на чтение пользователя из базы, когда отзыв токенов хранится в кеше процесса"""
+        self.assertFalse(settings.JWT_TRUST_CLAIMS)
+        _, access = self.issue()
+        with self.assertNumQueries(2):
+            response = self.get(access)
+        self.assertEqual(response.json()['content'], 'Paid content')
+
+    def test_revoke_token(self):
+        """Тест на отзыв токена доступа"""
+        _, access = self.issue()
+        response = self.client.post(reverse('token_revoke'), {'token': str(access)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(access).status_code, 401)
+
+    def test_revoke_refresh_token(self):
+        """Тест на отзыв токена обновления в черном списке, который не зависит от кеша"""
+        refresh, _ = self.issue()
+        response = self.client.post(reverse('token_revoke'), {'token': str(refresh)})
+        self.assertEqual(response.status_code, 200)
+        cache.clear()
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.post(reverse('token_revoke'), {'token': str(refresh)}).status_code, 401)
+
+    @patch('users.tokens.api_settings.ROTATE_REFRESH_TOKENS', True)
+    def test_rotation_blacklists_refresh(self):
+        """Тест на отзыв использованного токена обновления при выдаче нового"""
+        refresh, _ = self.issue()
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        rotated = response.json()['refresh']
+        self.assertTrue(ClaimsRefreshToken(rotated)['is_subscribed'])
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': str(refresh)}).status_code, 401)
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': rotated}).status_code, 200)
+
+    def test_subscription_change_revokes_access(self):
+        """Тест на отзыв токена доступа после отмены подписки и новые утверждения при обновлении"""
+        refresh, access = self.issue(seconds_ago=5)
+        self.user.is_subscribed = False
+        self.user.save()
+        self.assertEqual(self.get(access).status_code, 401)
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        access = response.json()['access']
+        self.assertTrue(self.get(access).json()['is_locked'])
+
+    def test_password_change_revokes_refresh(self):
+        """Тест на отзыв токенов после смены пароля, который хранится в базе и переживает очистку кеша"""
+        refresh, access = self.issue(seconds_ago=5)
+        self.user.set_password('new-password')
+        self.user.save()
+        self.assertIsNotNone(User.objects.get(pk=self.user.pk).tokens_valid_after)
+        cache.clear()
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.get(access).status_code, 401)
+
+        response = self.client.post(reverse('token'), {'phone': '+79161234567', 'password': 'new-password'})
+        response = self.client.post(reverse('token_refresh'), {'refresh': response.json()['refresh']})
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivation_revokes_refresh(self):
+        """Тест на отзыв токена обновления после блокировки и повторной активации пользователя"""
+        refresh, _ = self.issue(seconds_ago=5)
+        self.user.is_active = False
+        self.user.save()
+        self.user.is_active = True
+        self.user.save()
+        cache.clear()
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 401)
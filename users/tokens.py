@@ -0,0 +1,145 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.timezone import now
+from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
+
+from users.models import User
+
+# Утверждения о подписке и правах пользователя, которые запись в токене избавляет от чтения пользователя из базы
+CLAIMS = ('is_subscribed', 'is_staff', 'is_superuser')
+# Поля, при изменении которых отзываются и токены обновления: после смены пароля или блокировки нужен новый вход
+CREDENTIAL_FIELDS = ('is_active', 'password')
+
+REVOKED_TOKEN_KEY = 'jwt:revoked:{}'
+REVOKED_USER_KEY = 'jwt:revoked_user:{}'
+
+REVOKED_MESSAGE = 'Токен отозван.'
+
+
+def user_claims(user):
+    return {claim: getattr(user, claim) for claim in CLAIMS}
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Токен обновления с утверждениями о подписке и правах, они копируются в выдаваемые по нему токены доступа"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class ClaimsTokenUser(TokenUser):
+    """Пользователь из токена доступа: подписка и права берутся из утверждений токена без запроса к базе"""
+
+    @cached_property
+    def is_subscribed(self):
+        """Подписка из токена, None - токен выдан без утверждений"""
+        return self.token.get('is_subscribed')
+
+
+def revoke_token(token):
+    """Запрещаем токен доступа до истечения его срока действия"""
+    ttl = int(token['exp'] - time.time())
+    if ttl > 0:
+        cache.set(REVOKED_TOKEN_KEY.format(token[api_settings.JTI_CLAIM]), True, ttl)
+
+
+def revoke_user_tokens(*user_ids):
+    """Запрещаем токены доступа, выданные пользователям до текущей секунды.
+
+    Отзыв токенов доступа заставляет клиента получить новый токен по токену обновления, с новыми утверждениями.
+    Время выдачи в токене хранится с точностью до секунды, поэтому токены, выданные в ту же секунду,
+    что и отзыв (например, новый токен доступа сразу после изменения подписки), остаются действительными.
+    """
+    timeout = int(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds())
+    revoked_at = int(time.time())
+    cache.set_many({REVOKED_USER_KEY.format(user_id): revoked_at for user_id in user_ids}, timeout)
+
+
+def revoke_all_user_tokens(*user_ids):
+    """Запрещаем все токены пользователей, выданные до текущей секунды (после смены пароля или блокировки).
+
+    Отметка tokens_valid_after хранится в базе и проверяется везде, где пользователь читается из базы: при обновлении
+    токена и при аутентификации без доверия утверждениям. Для запросов с доверием утверждениям отзываем и токены
+    доступа в кеше. Возвращает новую отметку.
+    """
+    valid_after = now().replace(microsecond=0)
+    User.objects.filter(pk__in=user_ids).update(tokens_valid_after=valid_after)
+    revoke_user_tokens(*user_ids)
+    return valid_after
+
+
+def is_revoked(token):
+    """Отозван ли токен доступа сам по себе или вместе с токенами пользователя"""
+    token_key = REVOKED_TOKEN_KEY.format(token.get(api_settings.JTI_CLAIM))
+    user_key = REVOKED_USER_KEY.format(token.get(api_settings.USER_ID_CLAIM))
+    values = cache.get_many([token_key, user_key])
+    if values.get(token_key):
+        return True
+    revoked_at = values.get(user_key)
+    return revoked_at is not None and token.get('iat', 0) < revoked_at
+
+
+def is_issued_before_revocation(token, user):
+    """Выдан ли токен до отметки tokens_valid_after пользователя"""
+    return user.tokens_valid_after is not None and token.get('iat', 0) < user.tokens_valid_after.timestamp()
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Выдача пары токенов с утверждениями о подписке и правах"""
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Новый токен доступа по токену обновления: подписка и права перечитываются из базы"""
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        # Отдельно отозванные токены обновления отклоняются по черному списку token_blacklist при разборе токена
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(pk=refresh.get(api_settings.USER_ID_CLAIM)).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        if is_issued_before_revocation(refresh, user):
+            raise InvalidToken(REVOKED_MESSAGE)
+
+        claims = user_claims(user)
+        access = refresh.access_token
+        for claim, value in claims.items():
+            access[claim] = value
+        data = {'access': str(access)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            for claim, value in claims.items():
+                refresh[claim] = value
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    """Отзыв токена доступа (в кеше до истечения срока) или обновления (в черном списке token_blacklist)"""
+    token = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if token.get(api_settings.TOKEN_TYPE_CLAIM) == ClaimsRefreshToken.token_type:
+            ClaimsRefreshToken(attrs['token']).blacklist()
+        else:
+            revoke_token(token)
+        return {}
@@ -3,7 +3,7 @@ from django.contrib.auth.views import LoginView, LogoutView
 from users.apps import UsersConfig
 from users.views import ProfileView, CreateUserView, UserDeleteView, UserOTPVerifyView, UserDeleteConfirmationView, \
     PasswordResetRequestView, NewPasswordView, SubscribeView, CreatePaymentView, \
-    SubscribeSuccessView, SubscribeCancelView
+    SubscribeSuccessView, SubscribeCancelView, StripeWebhookView
 
 app_name = UsersConfig.name
 urlpatterns = [
@@ -20,4 +20,5 @@ urlpatterns = [
     path('create-payment/', CreatePaymentView.as_view(), name='create_payment'),
     path('subscribe/success/', SubscribeSuccessView.as_view(), name='subscribe_success'),
     path('subscribe/cancel/', SubscribeCancelView.as_view(), name='subscribe_cancel'),
+    path('stripe/webhook/', StripeWebhookView.as_view(), name='stripe_webhook'),
 ]
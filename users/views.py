@@ -8,11 +8,27 @@ from django.contrib import messages
 from users.forms import UserRegisterForm, OTPVerificationForm, UserLoginForm, UserProfileForm, PasswordResetRequestForm, \
     NewPasswordForm
 from users.models import User, Payment
-from users.services import create_stripe_price, create_stripe_session, check_payment_status
-from django.http import HttpResponseForbidden
+from users.otp import get_otp_store
+from users.ratelimit import is_allowed, is_locked_out, register_failure, reset_failures
+from users.services import get_subscription_price, create_stripe_session, parse_stripe_event, handle_stripe_event, \
+    issue_otp
+from django.db import transaction
+from django.http import HttpResponseForbidden, HttpResponse, HttpResponseBadRequest
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
 
 
-class CreateUserView(CreateView):
+class RateLimitedFormMixin:
+    """Миксин отказа в обработке формы при превышении квоты запросов"""
+
+    def rate_limited(self, form, message='Слишком много запросов. Попробуйте позже.'):
+        form.add_error(None, message)
+        response = self.form_invalid(form)
+        response.status_code = 429
+        return response
+
+
+class CreateUserView(RateLimitedFormMixin, CreateView):
     """Контроллер создания пользователя"""
     model = User
     template_name = 'users/register.html'
@@ -22,14 +38,18 @@ class CreateUserView(CreateView):
 
     def form_valid(self, form):
         """Сохраняем пользователя и перенаправляем на страницу подтверждения OTP"""
+        if not is_allowed('otp_issue', self.request, form.cleaned_data['phone']):
+            return self.rate_limited(form)
         user = form.save(commit=False)
         user.is_active = False  # Устанавливаем пользователя неактивным
-        user.save()  # Сохранили пользователя, сигнал `post_save` вызовет отправку OTP
+        with transaction.atomic():
+            user.save()
+            issue_otp(user)
         messages.info(self.request, 'Введите OTP для подтверждения.')
         return redirect('users:otp_verify', action='register', pk=user.pk)
 
 
-class UserOTPVerifyView(FormView):
+class UserOTPVerifyView(RateLimitedFormMixin, FormView):
     """Подтверждение OTP после регистрации"""
     template_name = 'users/otp_verify.html'
     form_class = OTPVerificationForm
@@ -38,11 +58,19 @@ class UserOTPVerifyView(FormView):
         user = get_object_or_404(User, pk=self.kwargs['pk'])
         otp = form.cleaned_data['otp']
 
+        # Проверка квот и блокировки до проверки кода, чтобы код нельзя было подобрать перебором
+        if is_locked_out(user.phone):
+            return self.rate_limited(form, 'Слишком много неверных кодов. Попробуйте позже.')
+        if not is_allowed('otp_verify', self.request, user.phone):
+            return self.rate_limited(form)
+
         # Проверка OTP
-        otp_valid, otp_message = user.verify_otp(otp)
+        otp_valid, otp_message = get_otp_store().verify(user.pk, otp)
         if not otp_valid:
+            register_failure(user.phone)
             form.add_error('otp', otp_message)
             return self.form_invalid(form)
+        reset_failures(user.phone)
 
         # Если OTP верный, проверяем действие
         action = self.kwargs.get('action')
@@ -97,22 +125,21 @@ class UserDeleteConfirmationView(View):
         return render(request, 'users/confirm_delete.html', {'user': user})
 
 
-class PasswordResetRequestView(FormView):
+class PasswordResetRequestView(RateLimitedFormMixin, FormView):
     """Контроллер запроса на сброс пароля"""
     template_name = 'users/password_reset_request.html'
     form_class = PasswordResetRequestForm
 
     def form_valid(self, form):
         phone = form.cleaned_data['phone']
+        if not is_allowed('otp_issue', self.request, phone):
+            return self.rate_limited(form)
         user = User.objects.filter(phone=phone).first()
         if not user:
             form.add_error('phone', 'Пользователь с таким номером не найден.')
             return self.form_invalid(form)
 
-        user.generate_otp()
-        user.send_mock_sms()
-        user.is_otp_sent = True
-        user.save()
+        issue_otp(user)
         messages.info(self.request, 'OTP отправлен на ваш номер телефона.')
         return redirect('users:otp_verify', action='password_reset', pk=user.pk)
 
@@ -154,8 +181,7 @@ class CreatePaymentView(View, HttpResponseForbidden):
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return HttpResponseForbidden("Вы должны быть авторизованы для выполнения этой операции.")
-        price = create_stripe_price()
-        session_id, session_url = create_stripe_session(price)
+        session_id, session_url = create_stripe_session(get_subscription_price())
 
         Payment.objects.create(
             user=request.user,
@@ -167,12 +193,29 @@ class CreatePaymentView(View, HttpResponseForbidden):
 
 
 class SubscribeSuccessView(TemplateView):
+    """Контроллер страницы после оплаты: статус берется из БД, его обновляет вебхук Stripe"""
     template_name = "users/payment_success.html"
 
-    def get(self, request, *args, **kwargs):
-        user = request.user
-        check_payment_status(user)
-        return super().get(request, *args, **kwargs)
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user = self.request.user
+        context['is_subscribed'] = user.is_authenticated and user.is_subscribed
+        if user.is_authenticated and not user.is_subscribed:
+            context['payment_status'] = user.payments.order_by('-created_at').values_list('status', flat=True).first()
+        return context
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class StripeWebhookView(View):
+    """Контроллер вебхука Stripe: события оплаты обновляют платежи и подписки"""
+
+    def post(self, request, *args, **kwargs):
+        try:
+            event = parse_stripe_event(request.body, request.META.get('HTTP_STRIPE_SIGNATURE', ''))
+        except ValueError:
+            return HttpResponseBadRequest()
+        handle_stripe_event(event)
+        return HttpResponse(status=200)
 
 
 class SubscribeCancelView(TemplateView):